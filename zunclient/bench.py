@@ -0,0 +1,422 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""zun-bench, a load generator measuring client side throughput.
+
+Worker threads share one client and run a weighted mix of container
+operations through the regular managers, against zun-api or a fake one
+started in a separate process::
+
+    zun-bench --fake --mix show=4,list=1,action=2 --concurrency 32
+
+The report gives the operations per second, latency percentiles and
+errors of each operation, and the CPU time the client spent per
+operation.
+"""
+
+import argparse
+import collections
+import json
+import random
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+from zunclient import client as zun_client
+from zunclient.common import cliutils
+from zunclient.common import utils as zun_utils
+from zunclient import exceptions
+
+OPERATIONS = ['create', 'list', 'show', 'action', 'delete']
+DEFAULT_MIX = 'create=1,list=1,show=4,action=2,delete=1'
+NAME_PREFIX = 'zun-bench-'
+# Parameters required by some actions, the defaults of the zun CLI
+ACTION_PARAMS = {'stop': {'timeout': 10}, 'restart': {'timeout': 10}}
+
+
+def parse_mix(mix):
+    """Parse 'op=weight,...' into a dict of weights."""
+    weights = {}
+    for item in mix.split(','):
+        op, _, weight = item.partition('=')
+        op = op.strip()
+        if op not in OPERATIONS:
+            raise exceptions.CommandError(
+                'Unknown operation %s, must be one of %s' %
+                (op, ', '.join(OPERATIONS)))
+        try:
+            weights[op] = float(weight or 1)
+        except ValueError:
+            raise exceptions.CommandError('Invalid weight for %s' % op)
+    if not any(weights.values()):
+        raise exceptions.CommandError('The mix has no operations')
+    return weights
+
+
+class OperationStats(object):
+    """Latencies and errors of one kind of operation."""
+
+    def __init__(self):
+        self.latencies = []
+        self.errors = collections.Counter()
+
+    @property
+    def count(self):
+        return len(self.latencies) + sum(self.errors.values())
+
+    def as_dict(self, elapsed):
+        ms = [latency * 1000 for latency in self.latencies]
+        return {'ops': self.count,
+                'ops_per_sec': self.count / elapsed if elapsed else 0.0,
+                'errors': dict(self.errors),
+                'p50_ms': zun_utils.percentile(ms, 50) or 0.0,
+                'p90_ms': zun_utils.percentile(ms, 90) or 0.0,
+                'p99_ms': zun_utils.percentile(ms, 99) or 0.0,
+                'max_ms': max(ms or [0.0])}
+
+
+class LoadGenerator(object):
+    """Run a weighted mix of operations from several threads.
+
+    :param zun: the client shared by the workers
+    :param mix: dict of operation weights, see OPERATIONS
+    :param action: the lifecycle action run by the 'action' operation
+    """
+
+    def __init__(self, zun, mix, concurrency=8, duration=None,
+                 operations=None, image='cirros', action='stop', seed=None):
+        self.zun = zun
+        self.ops = [op for op in OPERATIONS if mix.get(op)]
+        self.weights = [mix[op] for op in self.ops]
+        self.concurrency = concurrency
+        self.duration = duration
+        self.operations = operations
+        self.image = image
+        self.action = action
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = dict((op, OperationStats()) for op in OPERATIONS)
+        self.containers = []
+        self.busy = collections.Counter()
+        self.started = 0
+        self.elapsed = 0.0
+        self.cpu = 0.0
+
+    def _next_op(self):
+        """Return the next operation to run, or None when done."""
+        with self.lock:
+            if self.operations is not None and \
+                    self.started >= self.operations:
+                return None
+            self.started += 1
+            op = self.random.choices(self.ops, self.weights)[0]
+            target = None
+            if op == 'delete':
+                # Do not delete a container another worker is using
+                idle = [i for i, container in enumerate(self.containers)
+                        if not self.busy[container]]
+                if idle:
+                    target = self.containers.pop(self.random.choice(idle))
+            elif op in ('show', 'action') and self.containers:
+                target = self.random.choice(self.containers)
+                self.busy[target] += 1
+            # Operations on a container need one we created
+            if op in ('show', 'action', 'delete') and target is None:
+                op = 'create'
+            return op, target
+
+    def _run_op(self, op, target):
+        if op == 'create':
+            container = self.zun.containers.create(
+                name=NAME_PREFIX + uuid.uuid4().hex[:12], image=self.image)
+            with self.lock:
+                self.containers.append(container.uuid)
+        elif op == 'list':
+            self.zun.containers.list()
+        elif op == 'show':
+            self.zun.containers.get(target)
+        elif op == 'action':
+            getattr(self.zun.containers, self.action)(
+                target, **ACTION_PARAMS.get(self.action, {}))
+        elif op == 'delete':
+            self.zun.containers.delete(target, force=True)
+
+    def _worker(self, deadline):
+        while deadline is None or time.monotonic() < deadline:
+            item = self._next_op()
+            if item is None:
+                return
+            op, target = item
+            start = time.perf_counter()
+            error = None
+            try:
+                self._run_op(op, target)
+            except Exception as e:
+                error = _error_name(e)
+            latency = time.perf_counter() - start
+            with self.lock:
+                if op in ('show', 'action'):
+                    self.busy[target] -= 1
+                if error:
+                    self.stats[op].errors[error] += 1
+                else:
+                    self.stats[op].latencies.append(latency)
+
+    def run(self):
+        deadline = None
+        if self.duration:
+            deadline = time.monotonic() + self.duration
+        workers = [threading.Thread(target=self._worker, args=(deadline,))
+                   for _ in range(self.concurrency)]
+        cpu = time.process_time()
+        start = time.perf_counter()
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.elapsed = time.perf_counter() - start
+        self.cpu = time.process_time() - cpu
+        return self.report()
+
+    def cleanup(self):
+        """Delete the containers created by the run."""
+        results = self.zun.containers.bulk('delete', self.containers,
+                                           concurrency=self.concurrency,
+                                           force=True)
+        self.containers = [r.id for r in results if r.error is not None]
+        return len(results) - len(self.containers)
+
+    def report(self):
+        total = sum(stats.count for stats in self.stats.values())
+        compression = getattr(self.zun.http_client, 'compression_stats',
+                              None)
+        return {
+            'compression': compression.as_dict() if compression else {},
+            'elapsed': self.elapsed, 'concurrency': self.concurrency,
+            'ops': total,
+            'ops_per_sec': total / self.elapsed if self.elapsed else 0.0,
+            'cpu_ms_per_op': self.cpu * 1000 / total if total else 0.0,
+            'cpu_percent': (self.cpu / self.elapsed * 100
+                            if self.elapsed else 0.0),
+            'operations': dict((op, stats.as_dict(self.elapsed))
+                               for op, stats in self.stats.items()
+                               if stats.count)}
+
+
+def _error_name(error):
+    code = getattr(error, 'http_status', None)
+    name = type(error).__name__
+    return '%s (HTTP %s)' % (name, code) if code else name
+
+
+def print_report(report, out=None):
+    out = out or sys.stdout
+    out.write('%-8s %8s %9s %7s %9s %9s %9s %9s\n' % (
+        'op', 'ops', 'ops/s', 'errors', 'p50 ms', 'p90 ms', 'p99 ms',
+        'max ms'))
+    for op in OPERATIONS:
+        stats = report['operations'].get(op)
+        if not stats:
+            continue
+        out.write('%-8s %8d %9.1f %7d %9.2f %9.2f %9.2f %9.2f\n' % (
+            op, stats['ops'], stats['ops_per_sec'],
+            sum(stats['errors'].values()), stats['p50_ms'], stats['p90_ms'],
+            stats['p99_ms'], stats['max_ms']))
+    out.write('%-8s %8d %9.1f\n' % (
+        'total', report['ops'], report['ops_per_sec']))
+    out.write('\n%d threads for %.1fs, client CPU %.3f ms/op (%.0f%% of '
+              'one core)\n' % (report['concurrency'], report['elapsed'],
+                               report['cpu_ms_per_op'],
+                               report['cpu_percent']))
+    compression = report.get('compression')
+    if compression and compression['bytes_saved']:
+        out.write('compression saved %d bytes, %d responses and %d '
+                  'requests compressed\n' % (
+                      compression['bytes_saved'],
+                      compression['responses_compressed'],
+                      compression['requests_compressed']))
+    errors = [(op, name, count)
+              for op, stats in sorted(report['operations'].items())
+              for name, count in sorted(stats['errors'].items())]
+    if errors:
+        out.write('\nerrors:\n')
+        for op, name, count in errors:
+            out.write('  %-8s %-40s %d\n' % (op, name, count))
+
+
+class FakeServerProcess(object):
+    """A fake zun-api run in a child process.
+
+    Running it out of process keeps its CPU time out of the measurements
+    of the client.
+    """
+
+    def __init__(self, containers=0, latency=0, compression=False):
+        command = [sys.executable, '-m', 'zunclient.fakeserver',
+                   '--containers', str(containers),
+                   '--latency', str(latency)]
+        if compression:
+            command.append('--compression')
+        self.process = subprocess.Popen(command, stdout=subprocess.PIPE,
+                                        universal_newlines=True)
+        line = self.process.stdout.readline()
+        if not line:
+            self.process.wait()
+            raise exceptions.CommandError('The fake zun-api did not start')
+        self.url = line.split()[-1]
+
+    def stop(self):
+        self.process.terminate()
+        self.process.wait()
+
+
+def make_client(args):
+    kwargs = {}
+    if args.transport:
+        kwargs['transport'] = args.transport
+    if args.compress_requests:
+        kwargs['compress_requests'] = True
+    if args.endpoint and args.token:
+        return zun_client.Client(args.api_version, auth_token=args.token,
+                                 endpoint_override=args.endpoint, **kwargs)
+    if not args.os_auth_url:
+        raise exceptions.CommandError(
+            'You must provide an auth url with --os-auth-url or '
+            'env[OS_AUTH_URL], an --endpoint and --token, or use --fake')
+    return zun_client.Client(
+        args.api_version, auth_url=args.os_auth_url,
+        username=args.os_username, password=args.os_password,
+        project_name=args.os_project_name,
+        user_domain_name=args.os_user_domain_name,
+        project_domain_name=args.os_project_domain_name,
+        region_name=args.os_region_name or None,
+        endpoint_override=args.endpoint or None, **kwargs)
+
+
+def get_parser():
+    env = cliutils.env
+    parser = argparse.ArgumentParser(
+        prog='zun-bench', description=__doc__.splitlines()[0])
+    parser.add_argument('--mix', default=DEFAULT_MIX,
+                        help='Weights of the operations to run, among %s '
+                             '(default: %s).' % (', '.join(OPERATIONS),
+                                                 DEFAULT_MIX))
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help='Number of worker threads (default: 8).')
+    limit = parser.add_mutually_exclusive_group()
+    limit.add_argument('--duration', type=float,
+                       help='Seconds to run for (default: 30).')
+    limit.add_argument('--operations', type=int,
+                       help='Number of operations to run.')
+    parser.add_argument('--image', default='cirros',
+                        help='Image of the containers created.')
+    parser.add_argument('--action', default='stop',
+                        choices=['start', 'stop', 'restart', 'pause',
+                                 'unpause', 'kill', 'rebuild'],
+                        help='Action run by the action operation '
+                             '(default: stop).')
+    parser.add_argument('--seed', type=int,
+                        help='Seed of the operation mix, for repeatable '
+                             'runs.')
+    parser.add_argument('--keep', action='store_true',
+                        help='Do not delete the containers created.')
+    parser.add_argument('--json', action='store_true',
+                        help='Print the report as JSON.')
+    parser.add_argument('--fake', action='store_true',
+                        help='Run against a local fake zun-api.')
+    parser.add_argument('--fake-containers', type=int, default=0,
+                        help='Containers the fake zun-api starts with.')
+    parser.add_argument('--fake-latency', type=float, default=0,
+                        help='Seconds the fake zun-api adds to every '
+                             'request.')
+    parser.add_argument('--fake-compression', action='store_true',
+                        help='Let the fake zun-api compress responses and '
+                             'take gzipped requests.')
+    parser.add_argument('--compress-requests', action='store_true',
+                        help='Gzip large request bodies, for servers '
+                             'taking them.')
+    parser.add_argument('--transport',
+                        help='Transport sending the requests: requests '
+                             '(default), http.client, http2, unix:<path>, '
+                             'or with '
+                             '--fake, memory to call the fake zun-api in '
+                             'process, whose CPU time then counts as the '
+                             'client\'s.')
+    parser.add_argument('--api-version', default='1.latest')
+    parser.add_argument('--endpoint', default=env('ZUN_URL'),
+                        help='URL of zun-api, skipping the catalog.')
+    parser.add_argument('--token', default=env('OS_TOKEN'))
+    parser.add_argument('--os-auth-url', default=env('OS_AUTH_URL'))
+    parser.add_argument('--os-username', default=env('OS_USERNAME'))
+    parser.add_argument('--os-password', default=env('OS_PASSWORD'))
+    parser.add_argument('--os-project-name',
+                        default=env('OS_PROJECT_NAME', 'OS_TENANT_NAME'))
+    parser.add_argument('--os-user-domain-name',
+                        default=env('OS_USER_DOMAIN_NAME',
+                                    default='default'))
+    parser.add_argument('--os-project-domain-name',
+                        default=env('OS_PROJECT_DOMAIN_NAME',
+                                    default='default'))
+    parser.add_argument('--os-region-name', default=env('OS_REGION_NAME'))
+    return parser
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    try:
+        mix = parse_mix(args.mix)
+        fake = None
+        if args.fake and args.transport == 'memory':
+            # Only import the fake server when it is asked for
+            from zunclient.fakeserver import server
+            memory = server.FakeZunServer(latency=args.fake_latency,
+                                          compression=args.fake_compression)
+            for _ in range(args.fake_containers):
+                memory.add_container(status='Running')
+            args.endpoint, args.token = memory.url, 'fake-token'
+            args.transport = memory.memory_transport()
+            fake = memory
+        elif args.fake:
+            fake = FakeServerProcess(args.fake_containers, args.fake_latency,
+                                     args.fake_compression)
+            args.endpoint, args.token = fake.url, 'fake-token'
+        elif args.transport == 'memory':
+            raise exceptions.CommandError(
+                'The memory transport needs --fake')
+        try:
+            generator = LoadGenerator(
+                make_client(args), mix, concurrency=args.concurrency,
+                duration=(args.duration or 30
+                          if args.operations is None else None),
+                operations=args.operations, image=args.image,
+                action=args.action, seed=args.seed)
+            report = generator.run()
+            if not args.keep and generator.containers:
+                generator.cleanup()
+        finally:
+            if fake:
+                fake.stop()
+    except exceptions.CommandError as e:
+        print('ERROR: %s' % e, file=sys.stderr)
+        return 1
+    if args.json:
+        print(json.dumps(report, indent=2, sort_keys=True))
+    else:
+        print_report(report)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,277 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Recording API traffic to a cassette and replaying it.
+
+A cassette is a JSON lines file, gzipped when its name ends with .gz. The
+first line describes the recording, every other line is one request with
+its response and how long the server took to answer it. Tokens,
+passwords and the tokens of the websocket URLs in JSON bodies are
+redacted before anything is written.
+
+A CassetteAdapter is a requests transport adapter. It is given to a
+client with ``transport=``, which mounts it for every URL on the session
+of the client, so that keystone requests are recorded and replayed along
+with those to zun::
+
+    with cassette.Cassette('list.jsonl.gz', mode='record') as tape:
+        zun = client.Client('1', session=sess,
+                            transport=cassette.CassetteAdapter(tape))
+        zun.containers.list(all_projects=True)
+
+Replaying answers requests in the order they were recorded for each
+method and URL, from the cassette only, and repeats the last answer when a
+request is made more often than it was recorded. Replays are therefore
+deterministic and need no network; with a speed they also wait for the
+recorded server time, divided by the speed.
+"""
+
+import base64
+import collections
+import gzip
+import json
+import re
+import threading
+import time
+import urllib.parse as urlparse
+
+from requests import adapters
+
+from zunclient.common import transports
+from zunclient import exceptions
+
+FORMAT_VERSION = 1
+REDACTED = '<redacted>'
+SENSITIVE_HEADERS = ('authorization', 'x-auth-token', 'x-subject-token',
+                     'x-service-token', 'cookie', 'set-cookie')
+SENSITIVE_KEYS = ('password', 'secret', 'token_id', 'auth_token')
+# The token query parameter of the websocket URLs of attach and exec
+URL_TOKEN = re.compile(r'([?&]token=)[^&#\s]+')
+# Headers describing a body which is stored decoded and whole
+TRANSFER_HEADERS = ('content-encoding', 'content-length',
+                    'transfer-encoding')
+MODES = ('record', 'replay')
+
+
+def _open(path, mode):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def redact_headers(headers):
+    return dict((k, REDACTED if k.lower() in SENSITIVE_HEADERS else v)
+                for k, v in headers.items())
+
+
+def _redact_json(value):
+    if isinstance(value, dict):
+        return dict((k, REDACTED if k.lower() in SENSITIVE_KEYS and
+                     isinstance(v, str) else _redact_json(v))
+                    for k, v in value.items())
+    if isinstance(value, list):
+        return [_redact_json(v) for v in value]
+    if isinstance(value, str):
+        return URL_TOKEN.sub(r'\1' + REDACTED, value)
+    return value
+
+
+def redact_body(body):
+    """Return a text body with its secrets redacted.
+
+    Only JSON bodies are redacted, anything else is returned as is.
+    """
+    if not body:
+        return body
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return body
+    redacted = _redact_json(data)
+    return body if redacted == data else json.dumps(redacted)
+
+
+def _encode_body(body):
+    """Return a body as a text field, and whether it is base64 encoded."""
+    if body is None or isinstance(body, str):
+        return body, False
+    try:
+        return body.decode('utf-8'), False
+    except UnicodeDecodeError:
+        return base64.b64encode(body).decode('ascii'), True
+
+
+def _decode_body(interaction):
+    body = interaction['body']
+    if body is None:
+        return b''
+    if interaction.get('base64'):
+        return base64.b64decode(body)
+    return body.encode('utf-8')
+
+
+def request_key(method, url):
+    """Key requests by method, path and sorted query, ignoring the host.
+
+    A cassette recorded against one endpoint can so be replayed against
+    another.
+    """
+    parts = urlparse.urlsplit(url)
+    query = urlparse.urlencode(sorted(urlparse.parse_qsl(
+        parts.query, keep_blank_values=True)))
+    path = parts.path.rstrip('/') or '/'
+    return '%s %s%s' % (method.upper(), path, '?' + query if query else '')
+
+
+class Cassette(object):
+    """The interactions recorded in one file.
+
+    :param path: file of the cassette, gzipped if it ends with .gz
+    :param mode: 'record' to write a new cassette, 'replay' to read one
+    :param speed: in replay, wait for the recorded server time divided by
+        speed; None answers at once
+    """
+
+    def __init__(self, path, mode='replay', speed=None):
+        if mode not in MODES:
+            raise exceptions.InvalidAttribute(
+                'Invalid cassette mode %s, must be one of %s' %
+                (mode, ', '.join(MODES)))
+        self.path = path
+        self.mode = mode
+        self.speed = speed
+        self.lock = threading.Lock()
+        self.interactions = []
+        self.started = None
+        self._file = None
+        self._queues = collections.defaultdict(collections.deque)
+        self._last = {}
+        if mode == 'replay':
+            self.load()
+        else:
+            self._file = _open(path, 'w')
+            self._write({'version': FORMAT_VERSION,
+                         'recorded_at': time.strftime(
+                             '%Y-%m-%dT%H:%M:%SZ', time.gmtime())})
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _write(self, record):
+        self._file.write(json.dumps(record, sort_keys=True,
+                                    separators=(',', ':')) + '\n')
+        self._file.flush()
+
+    def load(self):
+        with _open(self.path, 'r') as f:
+            lines = [json.loads(line) for line in f if line.strip()]
+        if not lines or lines[0].get('version') != FORMAT_VERSION:
+            raise exceptions.InvalidAttribute(
+                '%s is not a cassette of version %d' %
+                (self.path, FORMAT_VERSION))
+        self.interactions = lines[1:]
+        for interaction in self.interactions:
+            self._queues[request_key(interaction['method'],
+                                     interaction['url'])].append(interaction)
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def record(self, request, response, content, started, elapsed):
+        """Append a request and its response to the cassette."""
+        body, encoded = _encode_body(content)
+        request_body = None
+        # Streamed and binary uploads are not kept
+        if isinstance(request.body, (bytes, str)):
+            request_body, binary = _encode_body(request.body)
+            if binary:
+                request_body = None
+        headers = dict((k, v) for k, v in response.headers.items()
+                       if k.lower() not in TRANSFER_HEADERS)
+        interaction = {
+            'method': request.method, 'url': request.url,
+            'request_headers': redact_headers(request.headers),
+            'request_body': redact_body(request_body),
+            'status': response.status_code, 'reason': response.reason,
+            'headers': redact_headers(headers),
+            'body': body if encoded else redact_body(body),
+            'base64': encoded, 'elapsed': round(elapsed, 6)}
+        with self.lock:
+            if self.started is None:
+                self.started = started
+            interaction['offset'] = round(started - self.started, 6)
+            self.interactions.append(interaction)
+            self._write(interaction)
+
+    def play(self, method, url):
+        """Return the next recorded interaction for a request.
+
+        Raise NoRecordedResponse if the request was never recorded.
+        """
+        key = request_key(method, url)
+        with self.lock:
+            queue = self._queues.get(key)
+            if queue:
+                self._last[key] = queue.popleft()
+            interaction = self._last.get(key)
+        if interaction is None:
+            raise exceptions.NoRecordedResponse(
+                'No response recorded in %s for %s' % (self.path, key))
+        if self.speed:
+            time.sleep(interaction['elapsed'] / self.speed)
+        return interaction
+
+
+class CassetteAdapter(adapters.BaseAdapter):
+    """A requests transport adapter recording to or replaying a cassette.
+
+    :param cassette: the Cassette to record to or replay
+    :param adapter: in record mode, the transport sending the requests
+        (default: the requests one)
+    """
+
+    # Mounted for every URL, so that the requests to keystone are recorded
+    # and replayed too
+    whole_session = True
+
+    def __init__(self, cassette, adapter=None):
+        super(CassetteAdapter, self).__init__()
+        self.cassette = cassette
+        self.adapter = adapter
+        if cassette.mode == 'record' and adapter is None:
+            self.adapter = transports.get_transport('requests')
+
+    def send(self, request, **kwargs):
+        if self.cassette.mode == 'record':
+            started = time.time()
+            start = time.perf_counter()
+            response = self.adapter.send(request, **kwargs)
+            content = response.content
+            self.cassette.record(request, response, content, started,
+                                 time.perf_counter() - start)
+            return response
+        return self._build_response(
+            request, self.cassette.play(request.method, request.url))
+
+    def _build_response(self, request, interaction):
+        return transports.build_response(
+            self, request, interaction['status'], interaction['reason'],
+            interaction['headers'], _decode_body(interaction))
+
+    def close(self):
+        if self.adapter:
+            self.adapter.close()
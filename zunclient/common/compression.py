@@ -0,0 +1,164 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compression of request and response bodies.
+
+The clients ask for gzip or deflate responses with Accept-Encoding and
+decode them chunk by chunk as they are read, so a large list never exists
+compressed and decoded at once in full.
+
+Request bodies are only compressed when a client is created with
+``compress_requests=True``, as zun-api itself does not decode them; a
+proxy in front of it may. Bodies of at least MIN_REQUEST_SIZE bytes, such
+as those of ``put_archive``, are then sent gzipped. A server answering 415
+Unsupported Media Type gets the body again uncompressed, and no further
+compressed bodies from that client.
+"""
+
+import gzip
+import threading
+import zlib
+
+ACCEPT_ENCODING = 'gzip, deflate'
+ENCODINGS = ('gzip', 'x-gzip', 'deflate')
+MIN_REQUEST_SIZE = 64 * 1024
+# Fast compression, most of the gain of JSON and base64 comes at level 1
+COMPRESS_LEVEL = 1
+
+
+class Decoder(object):
+    """Decode a gzip or deflate body chunk by chunk.
+
+    :param encoding: value of the Content-Encoding header; bodies in any
+        other encoding are passed through
+    """
+
+    def __init__(self, encoding=None):
+        self.encoding = (encoding or '').strip().lower()
+        self._raw_deflate = False
+        self._obj = None
+        if self.encoding in ('gzip', 'x-gzip'):
+            self._obj = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif self.encoding == 'deflate':
+            self._obj = zlib.decompressobj()
+            self._pending = b''
+
+    def decompress(self, chunk):
+        if self._obj is None:
+            return chunk
+        if self.encoding != 'deflate' or self._raw_deflate:
+            return self._obj.decompress(chunk)
+        try:
+            data = self._obj.decompress(chunk)
+        except zlib.error:
+            if self._pending is None:
+                raise
+            # Some servers send a raw deflate stream, without zlib header
+            self._raw_deflate = True
+            self._obj = zlib.decompressobj(-zlib.MAX_WBITS)
+            chunk, self._pending = self._pending + chunk, None
+            return self._obj.decompress(chunk)
+        if self._pending is not None:
+            self._pending = None if data else self._pending + chunk
+        return data
+
+    def flush(self):
+        return self._obj.flush() if self._obj is not None else b''
+
+    def iter(self, chunks):
+        """Yield the decoded data of an iterable of chunks."""
+        for chunk in chunks:
+            data = self.decompress(chunk)
+            if data:
+                yield data
+        data = self.flush()
+        if data:
+            yield data
+
+
+def decode(encoding, content):
+    """Return a whole body decoded from its Content-Encoding."""
+    return b''.join(Decoder(encoding).iter([content]))
+
+
+def compress(body):
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    return gzip.compress(body, COMPRESS_LEVEL)
+
+
+def compress_body(body, min_size=MIN_REQUEST_SIZE):
+    """Return a request body gzipped, or None if not worth it.
+
+    Bodies smaller than min_size, or which do not shrink, are sent as is.
+    """
+    if body is None:
+        return None
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    if len(body) < min_size:
+        return None
+    data = compress(body)
+    return data if len(data) < len(body) else None
+
+
+def compressed_headers(headers, data):
+    """Return a copy of request headers describing a gzipped body."""
+    headers = dict(headers or {})
+    headers['Content-Encoding'] = 'gzip'
+    headers['Content-Length'] = str(len(data))
+    return headers
+
+
+class CompressionStats(object):
+    """Bytes saved by the compression of the bodies of a client."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests_compressed = 0
+        self.request_bytes = 0
+        self.request_bytes_sent = 0
+        self.responses_compressed = 0
+        self.response_bytes = 0
+        self.response_bytes_received = 0
+
+    def request(self, size, sent):
+        with self.lock:
+            self.requests_compressed += 1
+            self.request_bytes += size
+            self.request_bytes_sent += sent
+
+    def response(self, size, received):
+        with self.lock:
+            self.responses_compressed += 1
+            self.response_bytes += size
+            self.response_bytes_received += received
+
+    @property
+    def bytes_saved(self):
+        return (self.request_bytes - self.request_bytes_sent +
+                self.response_bytes - self.response_bytes_received)
+
+    def as_dict(self):
+        with self.lock:
+            return {'requests_compressed': self.requests_compressed,
+                    'request_bytes': self.request_bytes,
+                    'request_bytes_sent': self.request_bytes_sent,
+                    'responses_compressed': self.responses_compressed,
+                    'response_bytes': self.response_bytes,
+                    'response_bytes_received': self.response_bytes_received,
+                    'bytes_saved': self.bytes_saved}
+
+    def __str__(self):
+        return ('%d bytes saved, %d compressed requests, %d compressed '
+                'responses' % (self.bytes_saved, self.requests_compressed,
+                               self.responses_compressed))
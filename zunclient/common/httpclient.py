@@ -26,8 +26,11 @@ import urllib.parse as urlparse
 
 from keystoneauth1 import adapter
 from oslo_utils import importutils
+import requests
 
 from zunclient import api_versions
+from zunclient.common import compression
+from zunclient.common import transports
 from zunclient import exceptions
 
 osprofiler_web = importutils.try_import("osprofiler.web")
@@ -67,12 +70,23 @@ def _extract_error_json(body):
 
 
 class HTTPClient(object):
+    """HTTP client based on http.client.
+
+    A new connection is made for every request, so the client holds no
+    per-request state and may be shared between threads.
+    """
 
     def __init__(self, endpoint, api_version=DEFAULT_API_VERSION, **kwargs):
         self.endpoint = endpoint
         self.auth_token = kwargs.get('token')
         self.auth_ref = kwargs.get('auth_ref')
         self.api_version = api_version or api_versions.APIVersion()
+        self.rate_limiter = kwargs.get('rate_limiter')
+        self.compress_requests = kwargs.get('compress_requests', False)
+        self.compression_stats = compression.CompressionStats()
+        self.transport = kwargs.get('transport')
+        if isinstance(self.transport, str):
+            self.transport = transports.get_transport(self.transport)
         self.connection_params = self.get_connection_params(endpoint, **kwargs)
 
     @staticmethod
@@ -159,18 +173,25 @@ class HTTPClient(object):
         # Copy the kwargs so we can reuse the original in case of redirects
         kwargs['headers'] = copy.deepcopy(kwargs.get('headers', {}))
         kwargs['headers'].setdefault('User-Agent', USER_AGENT)
+        kwargs['headers'].setdefault('Accept-Encoding',
+                                     compression.ACCEPT_ENCODING)
         api_versions.update_headers(kwargs["headers"], self.api_version)
 
         if self.auth_token:
             kwargs['headers'].setdefault('X-Auth-Token', self.auth_token)
 
+        if self.rate_limiter:
+            self.rate_limiter.wait(method)
         self.log_curl_request(method, url, kwargs)
-        conn = self.get_connection()
 
         try:
             conn_url = self._make_connection_url(url)
-            conn.request(method, conn_url, **kwargs)
-            resp = conn.getresponse()
+            if self.transport:
+                resp = self._transport_request(method, conn_url, **kwargs)
+            else:
+                conn = self.get_connection()
+                conn.request(method, conn_url, **kwargs)
+                resp = conn.getresponse()
         except socket.gaierror as e:
             message = ("Error finding address for %(url)s: %(e)s"
                        % dict(url=url, e=e))
@@ -181,7 +202,7 @@ class HTTPClient(object):
                        % dict(endpoint=endpoint, e=e))
             raise exceptions.ConnectionRefused(message)
 
-        body_iter = ResponseBodyIterator(resp)
+        body_iter = ResponseBodyIterator(resp, self.compression_stats)
 
         # Read body into string if it isn't obviously image data
         body_str = None
@@ -214,15 +235,56 @@ class HTTPClient(object):
 
         return resp, body_iter
 
+    def _transport_request(self, method, conn_url, headers=None, body=None):
+        """Send a request through the requests adapter of the client."""
+        parts = urlparse.urlparse(self.endpoint)
+        request = requests.Request(
+            method, '%s://%s%s' % (parts.scheme, parts.netloc, conn_url),
+            headers=headers, data=body).prepare()
+        params = self.connection_params[2]
+        verify = not params.get('insecure') and (params.get('ca_file') or
+                                                 True)
+        cert = params.get('cert_file')
+        if cert and params.get('key_file'):
+            cert = (cert, params['key_file'])
+        try:
+            response = self.transport.send(
+                request, timeout=params['timeout'], verify=verify,
+                cert=cert)
+        except requests.exceptions.ConnectionError as e:
+            raise socket.error(str(e))
+        return TransportResponse(response)
+
     def json_request(self, method, url, **kwargs):
-        kwargs.setdefault('headers', {})
+        kwargs['headers'] = dict(kwargs.get('headers') or {})
         kwargs['headers'].setdefault('Content-Type', 'application/json')
         kwargs['headers'].setdefault('Accept', 'application/json')
 
         if 'body' in kwargs:
             kwargs['body'] = jsonutils.dumps(kwargs['body'])
 
-        resp, body_iter = self._http_request(url, method, **kwargs)
+        data = None
+        if self.compress_requests:
+            data = compression.compress_body(kwargs.get('body'))
+        if data is None:
+            resp, body_iter = self._http_request(url, method, **kwargs)
+        else:
+            try:
+                resp, body_iter = self._http_request(
+                    url, method, **dict(
+                        kwargs, body=data,
+                        headers=compression.compressed_headers(
+                            kwargs['headers'], data)))
+            except exceptions.UnsupportedMediaType:
+                # The server does not take compressed bodies, stop sending
+                # them
+                LOG.debug('Compressed request refused, compression of '
+                          'requests disabled')
+                self.compress_requests = False
+                resp, body_iter = self._http_request(url, method, **kwargs)
+            else:
+                self.compression_stats.request(len(kwargs['body']),
+                                               len(data))
         content_type = resp.getheader('content-type', None)
 
         if resp.status == 204 or resp.status == 205 or content_type is None:
@@ -240,7 +302,7 @@ class HTTPClient(object):
         return resp, body
 
     def raw_request(self, method, url, **kwargs):
-        kwargs.setdefault('headers', {})
+        kwargs['headers'] = dict(kwargs.get('headers') or {})
         kwargs['headers'].setdefault('Content-Type',
                                      'application/octet-stream')
         return self._http_request(url, method, **kwargs)
@@ -310,12 +372,21 @@ class VerifiedHTTPSConnection(http_client.HTTPSConnection):
 
 
 class SessionClient(adapter.LegacyJsonAdapter):
-    """HTTP client based on Keystone client session."""
+    """HTTP client based on Keystone client session.
+
+    Requests are sent through the connection pool of the session. The
+    client copies whatever it changes in the arguments of a request, so it
+    may be shared between threads.
+    """
 
     def __init__(self, user_agent=USER_AGENT, logger=LOG,
-                 api_version=DEFAULT_API_VERSION, *args, **kwargs):
+                 api_version=DEFAULT_API_VERSION, rate_limiter=None,
+                 compress_requests=False, *args, **kwargs):
         self.user_agent = USER_AGENT
         self.api_version = api_version or api_versions.APIVersion()
+        self.rate_limiter = rate_limiter
+        self.compress_requests = compress_requests
+        self.compression_stats = compression.CompressionStats()
         super(SessionClient, self).__init__(*args, **kwargs)
 
     def _http_request(self, url, method, **kwargs):
@@ -329,6 +400,8 @@ class SessionClient(adapter.LegacyJsonAdapter):
         # Copy the kwargs so we can reuse the original in case of redirects
         kwargs['headers'] = copy.deepcopy(kwargs.get('headers', {}))
         kwargs['headers'].setdefault('User-Agent', self.user_agent)
+        kwargs['headers'].setdefault('Accept-Encoding',
+                                     compression.ACCEPT_ENCODING)
         api_versions.update_headers(kwargs["headers"], self.api_version)
 
         # NOTE(kevinz): osprofiler_web.get_trace_id_headers does not add any
@@ -336,12 +409,16 @@ class SessionClient(adapter.LegacyJsonAdapter):
         if osprofiler_web:
             kwargs['headers'].update(osprofiler_web.get_trace_id_headers())
 
-        endpoint_filter = kwargs.setdefault('endpoint_filter', {})
+        endpoint_filter = dict(kwargs.get('endpoint_filter') or {})
+        kwargs['endpoint_filter'] = endpoint_filter
         endpoint_filter.setdefault('interface', self.interface)
         endpoint_filter.setdefault('service_type', self.service_type)
         endpoint_filter.setdefault('region_name', self.region_name)
+        if self.rate_limiter:
+            self.rate_limiter.wait(method)
         resp = self.session.request(url, method,
                                     raise_exc=False, **kwargs)
+        self._record_compression(resp)
 
         if 400 <= resp.status_code < 600:
             error_json = _extract_error_json(resp.content)
@@ -356,15 +433,49 @@ class SessionClient(adapter.LegacyJsonAdapter):
             raise exceptions.from_response(resp, method=method, url=url)
         return resp
 
+    def _record_compression(self, resp):
+        encoding = resp.headers.get('Content-Encoding', '').lower()
+        if encoding not in compression.ENCODINGS:
+            return
+        # The size on the wire, urllib3 counts the bytes it decoded
+        received = resp.headers.get('Content-Length')
+        if received is None and hasattr(resp.raw, 'tell'):
+            received = resp.raw.tell()
+        if received is not None:
+            self.compression_stats.response(len(resp.content),
+                                            int(received))
+
     def json_request(self, method, url, **kwargs):
-        kwargs.setdefault('headers', {})
+        # Never modify the headers of the caller, they may be shared
+        kwargs['headers'] = dict(kwargs.get('headers') or {})
         kwargs['headers'].setdefault('Content-Type', 'application/json')
         kwargs['headers'].setdefault('Accept', 'application/json')
 
         if 'body' in kwargs:
             kwargs['data'] = jsonutils.dumps(kwargs.pop('body'))
 
-        resp = self._http_request(url, method, **kwargs)
+        data = None
+        if self.compress_requests:
+            data = compression.compress_body(kwargs.get('data'))
+        if data is None:
+            resp = self._http_request(url, method, **kwargs)
+        else:
+            try:
+                resp = self._http_request(
+                    url, method, **dict(
+                        kwargs, data=data,
+                        headers=compression.compressed_headers(
+                            kwargs['headers'], data)))
+            except exceptions.UnsupportedMediaType:
+                # The server does not take compressed bodies, stop sending
+                # them
+                LOG.debug('Compressed request refused, compression of '
+                          'requests disabled')
+                self.compress_requests = False
+                resp = self._http_request(url, method, **kwargs)
+            else:
+                self.compression_stats.request(len(kwargs['data']),
+                                               len(data))
         body = resp.content
         content_type = resp.headers.get('content-type', None)
         status = resp.status_code
@@ -381,17 +492,54 @@ class SessionClient(adapter.LegacyJsonAdapter):
         return resp, body
 
     def raw_request(self, method, url, **kwargs):
-        kwargs.setdefault('headers', {})
+        kwargs['headers'] = dict(kwargs.get('headers') or {})
         kwargs['headers'].setdefault('Content-Type',
                                      'application/octet-stream')
         return self._http_request(url, method, **kwargs)
 
 
+class TransportResponse(object):
+    """A requests response seen as an http.client one, for HTTPClient."""
+
+    def __init__(self, response):
+        self.response = response
+        self.status = response.status_code
+        self.reason = response.reason
+        self.version = 11
+        # The transport decoded the body already, whatever its
+        # Content-Encoding
+        self.decoded = True
+        self._body = io.BytesIO(response.content)
+
+    def getheader(self, name, default=None):
+        return self.response.headers.get(name, default)
+
+    def getheaders(self):
+        return list(self.response.headers.items())
+
+    def read(self, amt=None):
+        return self._body.read(amt)
+
+
 class ResponseBodyIterator(object):
-    """A class that acts as an iterator over an HTTP response."""
+    """A class that acts as an iterator over an HTTP response.
+
+    A gzip or deflate body is decoded chunk by chunk as it is read, and its
+    sizes recorded in stats once read in full.
+    """
 
-    def __init__(self, resp):
+    def __init__(self, resp, stats=None):
         self.resp = resp
+        self.stats = stats
+        getheader = getattr(resp, 'getheader', None)
+        encoding = getheader('content-encoding', None) if getheader else None
+        self.compressed = (encoding or '').lower() in compression.ENCODINGS
+        if getattr(resp, 'decoded', False):
+            encoding = None
+        self.decoder = compression.Decoder(encoding)
+        self.size = 0
+        self.received = 0
+        self.done = False
 
     def __iter__(self):
         while True:
@@ -401,11 +549,28 @@ class ResponseBodyIterator(object):
                 return
 
     def next(self):
-        chunk = self.resp.read(CHUNKSIZE)
-        if chunk:
-            return chunk
-        else:
-            raise StopIteration()
+        while not self.done:
+            chunk = self.resp.read(CHUNKSIZE)
+            if chunk:
+                self.received += len(chunk)
+                data = self.decoder.decompress(chunk)
+            else:
+                self.done = True
+                data = self.decoder.flush()
+                self._record()
+            if data:
+                self.size += len(data)
+                return data
+        raise StopIteration()
+
+    def _record(self):
+        if not (self.compressed and self.stats):
+            return
+        received = self.resp.getheader('content-length', None)
+        if received is None and not getattr(self.resp, 'decoded', False):
+            received = self.received
+        if received is not None:
+            self.stats.response(self.size, int(received))
 
 
 def _construct_http_client(*args, **kwargs):
@@ -413,15 +578,27 @@ def _construct_http_client(*args, **kwargs):
     auth = kwargs.pop('auth', None)
 
     if session:
+        transport = kwargs.pop('transport', None)
         service_type = kwargs.pop('service_type', 'container')
         interface = kwargs.pop('endpoint_type', None)
         region_name = kwargs.pop('region_name', None)
+        if transport:
+            session = transports.private_session(session)
+            endpoint = None
+            if not getattr(transport, 'whole_session', False):
+                endpoint = session.get_endpoint(service_type=service_type,
+                                                interface=interface,
+                                                region_name=region_name)
+            transports.mount(session, transport, endpoint)
         return SessionClient(session=session,
                              auth=auth,
                              interface=interface,
                              service_type=service_type,
                              region_name=region_name,
                              service_name=None,
-                             user_agent='python-zunclient')
+                             user_agent='python-zunclient',
+                             rate_limiter=kwargs.pop('rate_limiter', None),
+                             compress_requests=kwargs.pop(
+                                 'compress_requests', False))
     else:
         return HTTPClient(*args, **kwargs)
@@ -0,0 +1,181 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Client side rate limiting of API requests.
+
+A RateLimiter is given to a client with ``rate_limiter=`` and consulted
+before every request it sends. Reads (GET, HEAD, OPTIONS) and writes draw
+from separate token buckets, so a burst of actions does not starve the
+polling which waits for them, or the other way around::
+
+    limiter = ratelimit.RateLimiter(read_rate=20, write_rate=5)
+    zun = client.Client('1', session=sess, rate_limiter=limiter)
+"""
+
+import contextlib
+import fcntl
+import json
+import os
+import threading
+import time
+
+from oslo_log import log as logging
+
+LOG = logging.getLogger(__name__)
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class TokenBucket(object):
+    """A token bucket refilled at rate tokens per second.
+
+    ``acquire`` takes a token right away, letting the bucket go into debt
+    if it is empty, and then sleeps until the debt is paid back. Callers
+    are therefore served in the order they arrived and never hold a lock
+    while they sleep.
+
+    With a lock_file, the state of the bucket is kept in that file under
+    an exclusive flock, so that every process using the same file shares
+    the budget. Several buckets may share one file under different names.
+    """
+
+    def __init__(self, rate, burst=None, name='default', lock_file=None):
+        if rate <= 0:
+            raise ValueError('rate must be positive')
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(rate, 1))
+        self.name = name
+        self.lock_file = lock_file
+        # Only the wall clock is comparable between processes
+        self.clock = time.time if lock_file else time.monotonic
+        self.lock = threading.Lock()
+        self.tokens = self.burst
+        self.updated = self.clock()
+
+    @contextlib.contextmanager
+    def _state(self):
+        """Yield the state of the bucket as a [tokens, updated] list.
+
+        Changes made to the list are saved when the block exits.
+        """
+        with self.lock:
+            if not self.lock_file:
+                state = [self.tokens, self.updated]
+                yield state
+                self.tokens, self.updated = state
+                return
+            fd = os.open(self.lock_file, os.O_RDWR | os.O_CREAT, 0o600)
+            with os.fdopen(fd, 'r+') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    try:
+                        buckets = json.loads(f.read() or '{}')
+                    except ValueError:
+                        LOG.warning('Resetting corrupted rate limit state '
+                                    'in %s', self.lock_file)
+                        buckets = {}
+                    state = buckets.get(self.name) or [self.burst,
+                                                       self.clock()]
+                    yield state
+                    buckets[self.name] = state
+                    f.seek(0)
+                    f.truncate()
+                    f.write(json.dumps(buckets))
+                    f.flush()
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def reserve(self, tokens=1):
+        """Take tokens and return the seconds to wait before using them."""
+        with self._state() as state:
+            now = self.clock()
+            available = min(self.burst,
+                            state[0] + (now - state[1]) * self.rate)
+            state[0] = available - tokens
+            state[1] = now
+        return max(0.0, -state[0] / self.rate)
+
+    def acquire(self, tokens=1):
+        """Take tokens, sleeping until they are available.
+
+        Return the number of seconds slept.
+        """
+        delay = self.reserve(tokens)
+        if delay:
+            time.sleep(delay)
+        return delay
+
+
+class ThrottleStats(object):
+    """Counters of the requests seen by a RateLimiter for one kind."""
+
+    def __init__(self):
+        self.requests = 0
+        self.throttled = 0
+        self.throttled_time = 0.0
+
+    def as_dict(self):
+        return {'requests': self.requests, 'throttled': self.throttled,
+                'throttled_time': self.throttled_time}
+
+    def __str__(self):
+        return ('%d requests, %d throttled for %.3fs' %
+                (self.requests, self.throttled, self.throttled_time))
+
+
+class RateLimiter(object):
+    """Separate read and write budgets for the requests of a client.
+
+    :param read_rate: reads per second, or None for no limit
+    :param write_rate: writes per second, or None for no limit
+    :param read_burst: reads which may be sent at once (default: read_rate)
+    :param write_burst: writes which may be sent at once
+        (default: write_rate)
+    :param lock_file: share the budgets with other processes using the
+        same file
+    """
+
+    def __init__(self, read_rate=None, write_rate=None, read_burst=None,
+                 write_burst=None, lock_file=None):
+        self.buckets = {}
+        if read_rate:
+            self.buckets['read'] = TokenBucket(read_rate, read_burst,
+                                               'read', lock_file)
+        if write_rate:
+            self.buckets['write'] = TokenBucket(write_rate, write_burst,
+                                                'write', lock_file)
+        self.stats = {'read': ThrottleStats(), 'write': ThrottleStats()}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def kind(method):
+        return 'read' if method.upper() in READ_METHODS else 'write'
+
+    def wait(self, method):
+        """Block until a request with this HTTP method may be sent."""
+        kind = self.kind(method)
+        bucket = self.buckets.get(kind)
+        delay = bucket.acquire() if bucket else 0.0
+        stats = self.stats[kind]
+        with self.lock:
+            stats.requests += 1
+            if delay:
+                stats.throttled += 1
+                stats.throttled_time += delay
+        if delay:
+            LOG.debug('%s request throttled for %.3fs', method, delay)
+
+    def metrics(self):
+        """Return the counters of reads and writes as a dict."""
+        with self.lock:
+            return dict((kind, stats.as_dict())
+                        for kind, stats in self.stats.items())
@@ -0,0 +1,414 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Transports sending the requests of the clients.
+
+A transport is a requests transport adapter, an object with
+``send(request, **kwargs)`` returning a requests Response and ``close()``.
+A client given ``transport=`` mounts it on its keystoneauth session for
+the zun-api endpoint only, or sends through it with HTTPClient, so that
+transports can be swapped without touching the managers. A session passed
+in by the caller is copied first and left unchanged::
+
+    zun = client.Client('1', session=sess, transport='http.client')
+
+Built in transports, by name:
+
+``requests``
+    the requests adapter of keystoneauth, with TCP keepalive; the default
+``http.client``
+    pooled connections of the standard library, without urllib3
+``memory``
+    calls a function in process instead of using the network, for
+    benchmarks and tests
+``unix:<path>``
+    pooled connections to a local API proxy listening on a Unix socket
+``http2``
+    concurrent requests multiplexed on one HTTP/2 connection per host, see
+    HTTP2Transport; needs httpx with HTTP/2 support
+"""
+
+import collections
+import copy
+from http import client as http_client
+import re
+import socket
+import ssl
+import threading
+from urllib import parse as urlparse
+import zlib
+
+from keystoneauth1 import session as ksa_session
+from oslo_utils import importutils
+import requests
+from requests import adapters
+from requests import structures
+from requests import utils as requests_utils
+
+from zunclient.common import compression
+from zunclient import exceptions
+
+httpx = importutils.try_import('httpx')
+
+TRANSPORTS = ('requests', 'http.client', 'memory', 'unix', 'http2')
+# Connections kept open per host, so that concurrent requests, e.g. from
+# ContainerManager.bulk, reuse them instead of opening and discarding
+# extra ones.
+POOL_MAXSIZE = 32
+# Headers of HTTP/1.1 connections, which HTTP/2 forbids
+HOP_BY_HOP_HEADERS = ('connection', 'keep-alive', 'proxy-connection',
+                      'transfer-encoding', 'upgrade')
+# Bytes read from a connection at once, decoded as they come
+CHUNKSIZE = 64 * 1024
+# Methods which can be sent twice with the same effect, see RFC 7231
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE', 'TRACE')
+VERSION_SUFFIX = re.compile(r'/v\d+(\.\d+)?$')
+
+
+def _total_timeout(timeout):
+    """Return the longest of a (connect, read) timeout tuple."""
+    if isinstance(timeout, tuple):
+        timeouts = [t for t in timeout if t is not None]
+        return max(timeouts) if timeouts else None
+    return timeout
+
+
+def ssl_context(verify, cert=None):
+    """Return a client SSL context for the verify and cert of requests."""
+    if isinstance(verify, str):
+        context = ssl.create_default_context(cafile=verify)
+    else:
+        context = ssl.create_default_context()
+        if not verify:
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+    if cert:
+        if isinstance(cert, (tuple, list)):
+            context.load_cert_chain(*cert)
+        else:
+            context.load_cert_chain(cert)
+    return context
+
+
+def build_response(adapter, request, status, reason, headers, content):
+    """Return a requests Response made of the parts of an answer."""
+    response = requests.Response()
+    response.status_code = status
+    response.reason = reason
+    response.headers = structures.CaseInsensitiveDict(headers)
+    response.encoding = requests_utils.get_encoding_from_headers(
+        response.headers)
+    response._content = content
+    response.url = request.url
+    response.request = request
+    response.connection = adapter
+    return response
+
+
+class UnixHTTPConnection(http_client.HTTPConnection):
+    """An http.client connection to a Unix socket."""
+
+    def __init__(self, path, timeout=None):
+        http_client.HTTPConnection.__init__(self, 'localhost',
+                                            timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.path)
+        self.sock = sock
+
+
+class HTTPConnectionTransport(adapters.BaseAdapter):
+    """Send requests on pooled http.client connections.
+
+    Up to pool_maxsize idle connections are kept per host. An idempotent
+    request which fails on a connection taken from the pool, which the
+    server may have closed meanwhile, is retried once on a new one; others,
+    such as a POST which may have reached the server, are not. Compressed
+    bodies are decoded chunk by chunk as they are read.
+    """
+
+    def __init__(self, pool_maxsize=POOL_MAXSIZE):
+        super(HTTPConnectionTransport, self).__init__()
+        self.pool_maxsize = pool_maxsize
+        self.lock = threading.Lock()
+        self.pools = {}
+
+    @staticmethod
+    def _pool_key(request, verify, cert):
+        parts = requests_utils.urlparse(request.url)
+        if isinstance(cert, list):
+            cert = tuple(cert)
+        return (parts.scheme, parts.hostname, parts.port, verify, cert)
+
+    def _connect(self, key, timeout):
+        scheme, host, port, verify, cert = key
+        if scheme == 'http':
+            return http_client.HTTPConnection(host, port, timeout=timeout)
+        return http_client.HTTPSConnection(
+            host, port, timeout=timeout, context=ssl_context(verify, cert))
+
+    def _checkout(self, key):
+        with self.lock:
+            pool = self.pools.get(key)
+            return pool.pop() if pool else None
+
+    def _checkin(self, key, conn):
+        with self.lock:
+            pool = self.pools.setdefault(key, [])
+            if len(pool) < self.pool_maxsize:
+                pool.append(conn)
+                return
+        conn.close()
+
+    def send(self, request, stream=False, timeout=None, verify=True,
+             cert=None, proxies=None):
+        timeout = _total_timeout(timeout)
+        key = self._pool_key(request, verify, cert)
+        conn = self._checkout(key)
+        retry = (conn is not None and
+                 request.method.upper() in IDEMPOTENT_METHODS)
+        while True:
+            if conn is None:
+                conn = self._connect(key, timeout)
+            conn.timeout = timeout
+            try:
+                conn.request(request.method, request.path_url,
+                             body=request.body, headers=request.headers)
+                resp = conn.getresponse()
+                decoder = compression.Decoder(
+                    resp.getheader('Content-Encoding'))
+                content = b''.join(decoder.iter(
+                    iter(lambda: resp.read(CHUNKSIZE), b'')))
+            except zlib.error as e:
+                conn.close()
+                raise requests.exceptions.ContentDecodingError(
+                    e, request=request)
+            except (http_client.HTTPException, OSError) as e:
+                conn.close()
+                if retry and not isinstance(e, socket.timeout):
+                    conn, retry = None, False
+                    continue
+                if isinstance(e, socket.timeout):
+                    raise requests.exceptions.Timeout(e, request=request)
+                raise requests.exceptions.ConnectionError(e, request=request)
+            break
+        if resp.will_close:
+            conn.close()
+        else:
+            self._checkin(key, conn)
+        return build_response(self, request, resp.status, resp.reason,
+                              resp.getheaders(), content)
+
+    def close(self):
+        with self.lock:
+            pools, self.pools = self.pools, {}
+        for pool in pools.values():
+            for conn in pool:
+                conn.close()
+
+
+class UnixSocketTransport(HTTPConnectionTransport):
+    """Send every request to a local API proxy on a Unix socket.
+
+    The host of the URLs is ignored, the path and headers are sent as is.
+    """
+
+    def __init__(self, path, pool_maxsize=POOL_MAXSIZE):
+        super(UnixSocketTransport, self).__init__(pool_maxsize)
+        self.path = path
+
+    def _pool_key(self, request, verify, cert):
+        return ('unix', self.path, None, None, None)
+
+    def _connect(self, key, timeout):
+        return UnixHTTPConnection(self.path, timeout=timeout)
+
+
+class MemoryTransport(adapters.BaseAdapter):
+    """Answer requests by calling a function, without any network.
+
+    :param app: callable taking the method, path with query, headers and
+        body bytes of a request and returning the status, headers and body
+        bytes of the response
+    """
+
+    def __init__(self, app):
+        super(MemoryTransport, self).__init__()
+        self.app = app
+
+    def send(self, request, **kwargs):
+        body = request.body
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        status, headers, content = self.app(request.method,
+                                            request.path_url,
+                                            request.headers, body)
+        headers = structures.CaseInsensitiveDict(headers)
+        return build_response(self, request, status,
+                              http_client.responses.get(status, ''),
+                              headers, compression.decode(
+                                  headers.get('Content-Encoding'), content))
+
+    def close(self):
+        pass
+
+
+class HTTP2Transport(adapters.BaseAdapter):
+    """Multiplex concurrent requests on one HTTP/2 connection per host.
+
+    HTTPS endpoints negotiate HTTP/2 with ALPN and fall back to HTTP/1.1
+    when the server does not offer it. Plain HTTP endpoints use HTTP/1.1,
+    unless prior_knowledge says that they speak HTTP/2.
+
+    :param prior_knowledge: speak HTTP/2 to plain HTTP endpoints, without
+        any negotiation
+    :param max_connections: connections open per host, only HTTP/1.1 uses
+        more than one
+    """
+
+    def __init__(self, prior_knowledge=False, max_connections=POOL_MAXSIZE):
+        if httpx is None:
+            raise exceptions.InvalidAttribute(
+                'The http2 transport requires httpx with HTTP/2 support: '
+                'pip install httpx[http2]')
+        super(HTTP2Transport, self).__init__()
+        self.prior_knowledge = prior_knowledge
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   max_keepalive_connections=max_connections)
+        self.lock = threading.Lock()
+        self.clients = {}
+        # Requests sent, by HTTP version of their response
+        self.versions = {}
+
+    def _client(self, verify, cert):
+        if isinstance(cert, list):
+            cert = tuple(cert)
+        key = (verify, cert)
+        with self.lock:
+            client = self.clients.get(key)
+            if client is None:
+                try:
+                    client = httpx.Client(
+                        http2=True, http1=not self.prior_knowledge,
+                        verify=ssl_context(verify, cert), limits=self.limits)
+                except ImportError:
+                    raise exceptions.InvalidAttribute(
+                        'The http2 transport requires the h2 package: '
+                        'pip install httpx[http2]')
+                self.clients[key] = client
+            return client
+
+    def send(self, request, stream=False, timeout=None, verify=True,
+             cert=None, proxies=None):
+        client = self._client(verify, cert)
+        headers = [(k, v) for k, v in request.headers.items()
+                   if k.lower() not in HOP_BY_HOP_HEADERS]
+        try:
+            resp = client.request(request.method, request.url,
+                                  headers=headers, content=request.body,
+                                  timeout=_total_timeout(timeout))
+        except httpx.TimeoutException as e:
+            raise requests.exceptions.Timeout(e, request=request)
+        except httpx.TransportError as e:
+            raise requests.exceptions.ConnectionError(e, request=request)
+        with self.lock:
+            self.versions[resp.http_version] = self.versions.get(
+                resp.http_version, 0) + 1
+        # httpx decoded the body already, the headers are kept as they
+        # came, like those of the requests adapter
+        return build_response(self, request, resp.status_code,
+                              resp.reason_phrase, resp.headers.multi_items(),
+                              resp.content)
+
+    def close(self):
+        with self.lock:
+            clients, self.clients = self.clients, {}
+        for client in clients.values():
+            client.close()
+
+
+def endpoint_prefix(endpoint):
+    """Return the URL prefix of the requests to an API endpoint.
+
+    The API version is trimmed, so that version discovery at the root of
+    the API goes through the same transport.
+    """
+    parts = urlparse.urlsplit(endpoint)
+    path = VERSION_SUFFIX.sub('', parts.path.rstrip('/'))
+    return '%s://%s%s/' % (parts.scheme, parts.netloc, path)
+
+
+def private_session(session):
+    """Return a copy of a keystoneauth session to mount transports on.
+
+    The copy shares the auth plugin, and so the token, of the session but
+    has its own adapters: mounting on it leaves the session alone.
+    """
+    private = copy.copy(session)
+    private.session = copy.copy(session.session)
+    private.session.adapters = collections.OrderedDict(
+        session.session.adapters)
+    # The adapters are shared, closing them is up to the owner
+    private._session = None
+    return private
+
+
+def mount(session, transport, endpoint=None):
+    """Send the requests of a keystoneauth session through a transport.
+
+    The session is changed in place, so it should be one the client owns,
+    see private_session.
+
+    :param transport: a transport, or the name of a built in one
+    :param endpoint: only send the requests to this API endpoint through
+        the transport, so that those to keystone and other services keep
+        theirs. All requests go through a transport with a true
+        ``whole_session`` attribute, or when endpoint is None.
+    """
+    if isinstance(transport, str):
+        transport = get_transport(transport)
+    if endpoint and not getattr(transport, 'whole_session', False):
+        prefixes = (endpoint_prefix(endpoint),)
+    else:
+        prefixes = ('http://', 'https://')
+    for prefix in prefixes:
+        session.session.mount(prefix, transport)
+    return transport
+
+
+def get_transport(name, **kwargs):
+    """Return a built in transport by name.
+
+    :param name: one of TRANSPORTS, 'unix' taking the path of the socket
+        as ``unix:<path>`` or a path keyword argument
+    :param kwargs: arguments of the transport, e.g. app for 'memory'
+    """
+    name, _, path = name.partition(':')
+    if path:
+        kwargs['path'] = path
+    if name == 'requests':
+        return ksa_session.TCPKeepAliveAdapter(
+            pool_maxsize=kwargs.get('pool_maxsize', POOL_MAXSIZE))
+    elif name == 'http.client':
+        return HTTPConnectionTransport(**kwargs)
+    elif name == 'memory':
+        return MemoryTransport(**kwargs)
+    elif name == 'unix':
+        return UnixSocketTransport(**kwargs)
+    elif name == 'http2':
+        return HTTP2Transport(**kwargs)
+    raise exceptions.InvalidAttribute(
+        'Unknown transport %s, must be one of %s' %
+        (name, ', '.join(TRANSPORTS)))
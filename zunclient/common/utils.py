@@ -14,14 +14,27 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import argparse
 import base64
 import binascii
+import calendar
+import collections
+from contextlib import closing
+import datetime
+import hashlib
+import io
+import math
 import os
 import re
 import shlex
+import sys
+import tarfile
+import threading
+import time
 
 from oslo_serialization import jsonutils
 from oslo_utils import netutils
+from oslo_utils import strutils
 from urllib import parse
 from urllib import request
 from zunclient.common.apiclient import exceptions as apiexec
@@ -39,6 +52,12 @@ VALID_UNITS = (
     1024 * 1024 * 1024,
 )
 
+ARCHIVE_CHUNK_SIZE = 64 * K
+
+_LOG_TIMESTAMP_RE = re.compile(
+    r'^(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})(?:\.(\d{1,9}))?'
+    r'(Z|[+-]\d{2}:\d{2})$')
+
 
 def common_filters(marker=None, limit=None, sort_key=None,
                    sort_dir=None, all_projects=False):
@@ -158,6 +177,57 @@ def remove_null_parms(**kwargs):
     return new
 
 
+def print_bulk_results(results, accepted_msg, failed_msg):
+    """Print the outcome of ContainerManager.bulk for each container.
+
+    accepted_msg is formatted with the container, failed_msg with a dict
+    of container and e. Return the containers whose request was accepted.
+    """
+    accepted = []
+    for result in results:
+        if result.error is None:
+            print(accepted_msg % result.id)
+            accepted.append(result.id)
+        else:
+            print(failed_msg % {'container': result.id, 'e': result.error})
+    return accepted
+
+
+def check_concurrency(value):
+    """Parse a --concurrency value, rejecting anything below 1."""
+    try:
+        concurrency = int(value)
+    except ValueError:
+        concurrency = 0
+    if concurrency < 1:
+        raise argparse.ArgumentTypeError(
+            _("invalid concurrency value: %s (must be at least 1)") % value)
+    return concurrency
+
+
+def concurrency_arg(default):
+    """Return the (args, kwargs) defining the --concurrency option.
+
+    The zun shell passes them to cliutils.arg() and the OSC commands to
+    parser.add_argument(), so both define the option the same way.
+    """
+    return (('--concurrency',),
+            {'metavar': '<concurrency>',
+             'type': check_concurrency,
+             'default': default,
+             'help': _('Maximum number of containers to send requests for '
+                       'at once (default: %s).') % default})
+
+
+def percentile(values, percent):
+    """Return the nearest-rank percentile of values, None if empty."""
+    if not values:
+        return None
+    values = sorted(values)
+    rank = max(int(math.ceil(percent / 100.0 * len(values))), 1)
+    return values[rank - 1]
+
+
 def check_container_status(container, status):
     if getattr(container, 'status', None) == status:
         return True
@@ -193,6 +263,16 @@ def list_containers(containers):
                      sortby_index=None)
 
 
+def filter_by_labels(resources, labels):
+    """Return the resources having all of the given labels."""
+    selected = []
+    for resource in resources:
+        resource_labels = getattr(resource, 'labels', None) or {}
+        if all(resource_labels.get(k) == v for k, v in labels.items()):
+            selected.append(resource)
+    return selected
+
+
 def list_availability_zones(zones):
     columns = ('availability_zone',)
     utils.print_list(zones, columns,
@@ -221,10 +301,12 @@ def parse_mounts(mounts):
                "or use --mount size=<size>,destination=<path> to create "
                "a new volume and mount to the container, "
                "or use --mount type=bind,source=<file>,destination=<path> "
-               "to inject file into a path in the container.")
+               "to inject file into a path in the container, "
+               "adding copy=true to copy a file or directory into the "
+               "container once it is created instead.")
     parsed_mounts = []
     for mount in mounts:
-        keys = ["source", "destination", "size", "type"]
+        keys = ["source", "destination", "size", "type", "copy"]
         mount_info = {}
         for mnt in mount.split(","):
             try:
@@ -251,16 +333,51 @@ def parse_mounts(mounts):
             mnt = "type=%s" % type
             raise apiexec.CommandError(err_msg % mnt)
 
+        copy = mount_info.pop('copy', None)
+        if copy is not None:
+            if type != 'bind':
+                raise apiexec.CommandError(err_msg % mount)
+            try:
+                copy = strutils.bool_from_string(copy, strict=True)
+            except ValueError:
+                raise apiexec.CommandError(err_msg % mount)
+            if copy:
+                mount_info['copy'] = True
+
         if type == 'bind':
-            # TODO(hongbin): handle the case that 'source' is a directory
             filename = mount_info.pop('source')
-            with open(filename, 'rb') as file:
-                mount_info['source'] = file.read()
+            if os.path.isdir(filename):
+                if not copy:
+                    raise apiexec.CommandError(
+                        "Bind mount source %s is a directory, which can "
+                        "only be copied into the container with "
+                        "copy=true." % filename)
+                # NOTE: a directory cannot be injected inline, it is packed
+                # into a tar archive named after the destination and
+                # uploaded once the container has been created.
+                arcname = os.path.basename(
+                    mount_info['destination'].rstrip('/'))
+                mount_info['source'] = pack_archive(filename, arcname)
+                mount_info['directory'] = True
+            else:
+                mount_info['source'] = read_bind_source(filename)
 
         parsed_mounts.append(mount_info)
     return parsed_mounts
 
 
+def parse_container_path(location):
+    """Split a [container:]path argument of the copy command.
+
+    :returns: a tuple of (container, path). The container is None when
+              the location refers to the local filesystem.
+    """
+    if ':' in location:
+        container, path = location.split(':', 1)
+        return container, path
+    return None, location
+
+
 def parse_nets(ns):
     err_msg = ("Invalid nets argument '%s'. nets arguments must be of "
                "the form --nets <network=network, v4-fixed-ip=ip-addr,"
@@ -401,3 +518,176 @@ def decode_file_data(data):
         return base64.b64decode(data)
     except (TypeError, binascii.Error):
         raise exc.CommandError(_('Invalid Base 64 file data.'))
+
+
+def iter_decode_file_data(data, chunk_size=ARCHIVE_CHUNK_SIZE):
+    """Decode Base64 file data piece by piece.
+
+    Yields the decoded bytes in chunks of at most ``chunk_size`` bytes, so
+    that large archives can be streamed out without holding a decoded copy
+    of the whole payload.
+    """
+    step = max(chunk_size // 3, 1) * 4
+    for start in range(0, len(data), step):
+        yield decode_file_data(data[start:start + step])
+
+
+def encode_file_stream(fileobj, chunk_size=ARCHIVE_CHUNK_SIZE):
+    """Base64-encode the content of a binary file object while reading it.
+
+    The input is consumed ``chunk_size`` bytes at a time, so only the
+    encoded result is accumulated and never a raw copy of the whole input.
+    """
+    encoded = io.StringIO()
+    pending = b''
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            break
+        pending += chunk
+        # Only encode whole 3-byte groups so no padding ends up mid-stream
+        cut = len(pending) - len(pending) % 3
+        encoded.write(encode_file_data(pending[:cut]))
+        pending = pending[cut:]
+    if pending:
+        encoded.write(encode_file_data(pending))
+    return encoded.getvalue()
+
+
+class PayloadCache(object):
+    """Thread-safe LRU cache of file payloads bounded by their total size."""
+
+    def __init__(self, max_bytes=64 * M):
+        self.max_bytes = max_bytes
+        self._size = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_set(self, key, factory):
+        """Return the cached value of key, computing it with factory."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        value = factory()
+        with self._lock:
+            if key not in self._entries and len(value) <= self.max_bytes:
+                self._entries[key] = value
+                self._size += len(value)
+                while self._size > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._size -= len(evicted)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+_bind_source_cache = PayloadCache()
+_encoded_payload_cache = PayloadCache()
+_file_archive_cache = PayloadCache()
+
+
+def read_bind_source(filename):
+    """Read the content of a bind mount source file.
+
+    Reads are cached by path, modification time and size, so that a file
+    shared by many containers is only read from disk once.
+    """
+    st = os.stat(filename)
+    key = (os.path.realpath(filename), st.st_mtime_ns, st.st_size)
+
+    def _read():
+        with open(filename, 'rb') as file:
+            return file.read()
+
+    return _bind_source_cache.get_or_set(key, _read)
+
+
+def encode_bind_mount_data(data):
+    """Base64-encode a bind mount payload, caching by content hash."""
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    key = hashlib.sha256(data).digest()
+    return _encoded_payload_cache.get_or_set(
+        key, lambda: encode_file_data(data))
+
+
+def pack_archive(path, arcname):
+    """Pack a local file or directory into an in-memory tar archive."""
+    tardata = io.BytesIO()
+    with closing(tarfile.open(fileobj=tardata, mode='w')) as tar:
+        tar.add(path, arcname=arcname)
+    return tardata.getvalue()
+
+
+def pack_file_data(data, arcname):
+    """Pack bytes into an in-memory tar archive as a single file.
+
+    Archives are cached by content hash and name, so the same payload
+    copied into many containers is packed once, into the same bytes.
+    """
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+
+    def _pack():
+        tarinfo = tarfile.TarInfo(name=arcname)
+        tarinfo.size = len(data)
+        tarinfo.mode = 0o644
+        tarinfo.mtime = int(time.time())
+        tardata = io.BytesIO()
+        with closing(tarfile.open(fileobj=tardata, mode='w')) as tar:
+            tar.addfile(tarinfo, io.BytesIO(data))
+        return tardata.getvalue()
+
+    key = (hashlib.sha256(data).digest(), arcname)
+    return _file_archive_cache.get_or_set(key, _pack)
+
+
+def parse_log_timestamp(timestamp):
+    """Parse a RFC 3339 log timestamp into nanoseconds since the epoch.
+
+    Docker prints timestamps with nanosecond precision and strips trailing
+    zeros of the fraction, so they cannot be compared as strings.
+
+    :returns: an integer, or None if timestamp is not a valid timestamp.
+    """
+    match = _LOG_TIMESTAMP_RE.match(timestamp)
+    if not match:
+        return None
+    seconds, fraction, offset = match.groups()
+    value = calendar.timegm(
+        datetime.datetime.strptime(seconds, '%Y-%m-%dT%H:%M:%S').timetuple())
+    if offset != 'Z':
+        sign = 1 if offset[0] == '+' else -1
+        value -= sign * (int(offset[1:3]) * 3600 + int(offset[4:6]) * 60)
+    return value * 10 ** 9 + int((fraction or '').ljust(9, '0'))
+
+
+def split_log_line(line):
+    """Split a log line into its timestamp in nanoseconds and the message.
+
+    The timestamp is None when the line does not start with one.
+    """
+    timestamp, sep, message = line.partition(' ')
+    value = parse_log_timestamp(timestamp)
+    if value is None:
+        return None, line
+    return value, message
+
+
+def write_stream(chunks, output=None):
+    """Write an iterator of text chunks to output until it is exhausted.
+
+    Each chunk is written with a single buffered write followed by one
+    flush. Interrupting with Ctrl-C stops the stream quietly.
+    """
+    output = output or sys.stdout
+    try:
+        for chunk in chunks:
+            output.write(chunk)
+            output.flush()
+    except KeyboardInterrupt:
+        pass
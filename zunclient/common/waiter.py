@@ -0,0 +1,161 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Waiting for resources to reach a status.
+
+Polls start quickly and back off exponentially, with jitter so that many
+clients waiting at once do not poll in lockstep. Every wait has a deadline
+and fails early when a resource reaches an error status.
+"""
+
+import random
+import time
+
+from zunclient import exceptions
+
+DEFAULT_TIMEOUT = 600
+INITIAL_INTERVAL = 0.05
+MAX_INTERVAL = 2.0
+BACKOFF = 1.5
+JITTER = 0.5
+
+
+def _status(resource, field='status'):
+    return (getattr(resource, field, None) or '').lower()
+
+
+class Waiter(object):
+    """Wait for status transitions of one or many resources.
+
+    :param timeout: seconds after which the wait fails with WaitTimeout
+    :param error_status: statuses which fail the wait with
+        ResourceInErrorState
+    :param jitter: fraction of each interval which is randomized
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, error_status=('Error',),
+                 initial_interval=INITIAL_INTERVAL,
+                 max_interval=MAX_INTERVAL, backoff=BACKOFF, jitter=JITTER,
+                 status_field='status'):
+        self.timeout = timeout
+        self.error_status = {s.lower() for s in error_status}
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.jitter = jitter
+        self.status_field = status_field
+
+    def _ticks(self, on_wait=None):
+        """Yield before each poll, sleeping in between.
+
+        Raise WaitTimeout once the deadline has passed.
+        """
+        deadline = time.monotonic() + self.timeout
+        interval = self.initial_interval
+        yield
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise exceptions.WaitTimeout(
+                    "Timed out after %s seconds" % self.timeout)
+            if on_wait is not None:
+                on_wait()
+                on_wait = None
+            delay = interval * (1 - self.jitter * random.random())
+            time.sleep(min(delay, remaining))
+            interval = min(interval * self.backoff, self.max_interval)
+            yield
+
+    def _check_error(self, resource, res_id):
+        status = _status(resource, self.status_field)
+        if status in self.error_status:
+            raise exceptions.ResourceInErrorState(
+                "%s is in %s status" % (res_id, status))
+
+    def wait_for(self, get, res_id, ready, on_wait=None):
+        """Poll get(res_id) until ready(resource) is true.
+
+        on_wait is called once, the first time the resource is not ready.
+        Return the resource.
+        """
+        for _ in self._ticks(on_wait):
+            resource = get(res_id)
+            if ready(resource):
+                return resource
+            self._check_error(resource, res_id)
+
+    def wait_for_status(self, get, res_id, success_status, on_wait=None):
+        """Poll get(res_id) until its status is one of success_status."""
+        success = {s.lower() for s in success_status}
+        return self.wait_for(
+            get, res_id,
+            lambda r: _status(r, self.status_field) in success,
+            on_wait=on_wait)
+
+    def wait_for_delete(self, get, res_id, on_wait=None):
+        """Poll get(res_id) until it raises NotFound."""
+        for _ in self._ticks(on_wait):
+            try:
+                resource = get(res_id)
+            except exceptions.NotFound:
+                return
+            self._check_error(resource, res_id)
+
+    def wait_for_all(self, list_resources, res_ids, success_status=None,
+                     on_wait=None, id_field='uuid'):
+        """Wait for many resources, with one list call per poll.
+
+        Every poll calls list_resources() once and matches the resources
+        it returns to res_ids by their id_field. When success_status is
+        None, a resource is done once it is no longer listed; otherwise
+        its absence fails its wait with NotFound.
+        Return a (done, failed) pair of dicts: done maps ids to their
+        last resource (None if deleted), failed maps ids to the NotFound,
+        ResourceInErrorState or WaitTimeout which ended their wait.
+        """
+        success = (None if success_status is None
+                   else {s.lower() for s in success_status})
+        pending = list(res_ids)
+        done = {}
+        failed = {}
+        if not pending:
+            return done, failed
+        try:
+            for _ in self._ticks(on_wait):
+                listed = {getattr(r, id_field, None): r
+                          for r in list_resources()}
+                for res_id in list(pending):
+                    resource = listed.get(res_id)
+                    if resource is None:
+                        if success is None:
+                            done[res_id] = None
+                        else:
+                            failed[res_id] = exceptions.NotFound(
+                                "%s not found" % res_id)
+                        pending.remove(res_id)
+                        continue
+                    if (success is not None and
+                            _status(resource, self.status_field) in success):
+                        done[res_id] = resource
+                        pending.remove(res_id)
+                        continue
+                    try:
+                        self._check_error(resource, res_id)
+                    except exceptions.ResourceInErrorState as e:
+                        failed[res_id] = e
+                        pending.remove(res_id)
+                if not pending:
+                    break
+        except exceptions.WaitTimeout as e:
+            for res_id in pending:
+                failed[res_id] = e
+        return done, failed
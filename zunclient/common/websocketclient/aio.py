@@ -0,0 +1,278 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Asyncio clients for the attach and exec websockets of containers.
+
+The clients speak RFC 6455 over asyncio streams, so any number of
+sessions can share one event loop without a thread each::
+
+    async def run(zunclient, container):
+        async with await aio.execute(zunclient, container, 'sh') as session:
+            await session.write(b'ls\\n')
+            async for chunk in session:
+                print(chunk)
+
+Only the REST calls which set up a session, or resize its tty, go through
+the blocking client; they are run in the default executor of the loop.
+"""
+
+import asyncio
+import functools
+import ssl
+import struct
+from urllib import parse as urlparse
+
+from oslo_log import log as logging
+
+from zunclient.common.websocketclient import exceptions
+from zunclient.common.websocketclient import framing
+from zunclient.common.websocketclient import websocketclient
+
+LOG = logging.getLogger(__name__)
+
+# Largest message accepted from the server, frames announce their length
+# and are read in full
+MAX_MESSAGE_SIZE = 16 * 1024 * 1024
+
+
+class AsyncWebSocketClient(object):
+    """An asyncio websocket session with a container.
+
+    ``read`` returns the next chunk of output and ``write`` sends input,
+    waiting for the transport to drain so that writers cannot run ahead of
+    the network. The client is also an asynchronous iterator over its
+    output and an asynchronous context manager which closes it.
+
+    A message larger than ``max_message_size`` closes the session with
+    status 1009 and raises MessageTooBig.
+    """
+
+    def __init__(self, zunclient, url, id,
+                 subprotocols=("binary", "base64"),
+                 max_message_size=MAX_MESSAGE_SIZE):
+        self.cs = zunclient
+        self.url = url
+        self.id = id
+        self.subprotocols = subprotocols
+        self.max_message_size = max_message_size
+        self.reader = None
+        self.writer = None
+        self.closed = False
+        self.eof = False
+
+    async def connect(self):
+        url = urlparse.urlparse(self.url)
+        secure = url.scheme == 'wss'
+        ssl_context = None
+        if secure:
+            ssl_context = ssl.create_default_context(
+                cafile=websocketclient.WebSocketClient.get_system_ca_file())
+        LOG.debug('connecting to: %s', self.url)
+        try:
+            self.reader, self.writer = await asyncio.open_connection(
+                url.hostname, _port(url), ssl=ssl_context)
+            await self._handshake(url)
+        except (OSError, asyncio.IncompleteReadError,
+                asyncio.LimitOverrunError) as e:
+            raise exceptions.ConnectionFailed(e)
+
+    async def _handshake(self, url):
+        key = framing.new_key()
+        path = url.path or '/'
+        if url.query:
+            path += '?' + url.query
+        scheme = 'https' if url.scheme == 'wss' else 'http'
+        request = ['GET %s HTTP/1.1' % path,
+                   'Host: %s' % url.netloc,
+                   'Upgrade: websocket',
+                   'Connection: Upgrade',
+                   'Sec-WebSocket-Key: %s' % key,
+                   'Sec-WebSocket-Version: 13',
+                   'Origin: %s://%s:%s' % (scheme, url.hostname, _port(url))]
+        if self.subprotocols:
+            request.append('Sec-WebSocket-Protocol: %s' %
+                           ', '.join(self.subprotocols))
+        self.writer.write(('\r\n'.join(request) + '\r\n\r\n').encode())
+        await self.writer.drain()
+
+        response = await self.reader.readuntil(b'\r\n\r\n')
+        lines = response.decode('latin-1').split('\r\n')
+        if lines[0].split(' ')[1:2] != ['101']:
+            raise exceptions.ConnectionFailed(lines[0])
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        if headers.get('sec-websocket-accept') != framing.accept_key(key):
+            raise exceptions.ConnectionFailed('invalid handshake response')
+
+    async def _read_frame(self):
+        fin, opcode, masked, length = framing.parse_header(
+            await self.reader.readexactly(2))
+        if length in framing.EXTENDED_LENGTH:
+            fmt = framing.EXTENDED_LENGTH[length]
+            length = struct.unpack(fmt, await self.reader.readexactly(
+                struct.calcsize(fmt)))[0]
+        if length > self.max_message_size:
+            raise exceptions.MessageTooBig()
+        key = await self.reader.readexactly(4) if masked else None
+        payload = await self.reader.readexactly(length)
+        if key:
+            payload = framing.apply_mask(payload, key)
+        return fin, opcode, payload
+
+    async def _send(self, opcode, payload):
+        self.writer.write(framing.encode_frame(opcode, payload, mask=True))
+        await self.writer.drain()
+
+    async def read(self):
+        """Return the next chunk of output, or b'' once disconnected."""
+        message = []
+        size = 0
+        while not self.eof:
+            try:
+                fin, opcode, payload = await self._read_frame()
+            except (OSError, asyncio.IncompleteReadError) as e:
+                LOG.debug('connection lost: %s', e)
+                self.eof = True
+                break
+            except exceptions.MessageTooBig:
+                await self._close_too_big()
+                raise
+            if opcode == framing.OPCODE_PING:
+                await self._send(framing.OPCODE_PONG, payload)
+            elif opcode == framing.OPCODE_CLOSE:
+                self.eof = True
+                await self.close()
+            elif opcode != framing.OPCODE_PONG:
+                message.append(payload)
+                size += len(payload)
+                if size > self.max_message_size:
+                    await self._close_too_big()
+                    raise exceptions.MessageTooBig()
+                if fin and size:
+                    return b''.join(message)
+                elif fin:
+                    message = []
+        return b''
+
+    async def _close_too_big(self):
+        LOG.debug('message over %d bytes, closing', self.max_message_size)
+        self.eof = True
+        await self.close(framing.CLOSE_MESSAGE_TOO_BIG)
+
+    async def write(self, data):
+        if self.closed:
+            raise exceptions.Disconnected()
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        try:
+            await self._send(framing.OPCODE_BINARY, data)
+        except OSError as e:
+            raise exceptions.Disconnected(e)
+
+    async def close(self, status=framing.CLOSE_NORMAL):
+        if self.closed or self.writer is None:
+            return
+        self.closed = True
+        try:
+            await self._send(framing.OPCODE_CLOSE, status)
+        except OSError:
+            pass
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except OSError:
+            pass
+
+    def tty_resize(self, height, width):
+        raise NotImplementedError()
+
+    async def resize(self, height, width):
+        """Resize the tty of the session."""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.tty_resize, height, width)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        data = await self.read()
+        if not data:
+            raise StopAsyncIteration
+        return data
+
+    async def __aenter__(self):
+        if self.writer is None:
+            await self.connect()
+        return self
+
+    async def __aexit__(self, *_):
+        await self.close()
+
+
+class AsyncAttachClient(AsyncWebSocketClient):
+
+    def tty_resize(self, height, width):
+        self.cs.containers.resize(self.id, str(width), str(height))
+
+
+class AsyncExecClient(AsyncWebSocketClient):
+
+    def __init__(self, zunclient, url, exec_id, id,
+                 subprotocols=("binary", "base64"),
+                 max_message_size=MAX_MESSAGE_SIZE):
+        super(AsyncExecClient, self).__init__(
+            zunclient, url, id, subprotocols,
+            max_message_size=max_message_size)
+        self.exec_id = exec_id
+
+    def tty_resize(self, height, width):
+        self.cs.containers.execute_resize(self.id, self.exec_id,
+                                          str(width), str(height))
+
+
+def _port(url):
+    return url.port or (443 if url.scheme == 'wss' else 80)
+
+
+def _check_url(url, container_id):
+    if not (url.startswith("ws://") or url.startswith("wss://")):
+        raise exceptions.InvalidWebSocketLink(container_id)
+
+
+async def attach(zunclient, container_id,
+                 max_message_size=MAX_MESSAGE_SIZE):
+    """Return a connected AsyncAttachClient for a container."""
+    loop = asyncio.get_running_loop()
+    url = await loop.run_in_executor(None, zunclient.containers.attach,
+                                     container_id)
+    _check_url(url, container_id)
+    client = AsyncAttachClient(zunclient, url, container_id,
+                               max_message_size=max_message_size)
+    await client.connect()
+    return client
+
+
+async def execute(zunclient, container_id, command,
+                  max_message_size=MAX_MESSAGE_SIZE):
+    """Start an interactive command, return a connected AsyncExecClient."""
+    loop = asyncio.get_running_loop()
+    response = await loop.run_in_executor(None, functools.partial(
+        zunclient.containers.execute, container_id, command=command,
+        interactive=True, run=False))
+    url = response['proxy_url']
+    _check_url(url, container_id)
+    client = AsyncExecClient(zunclient, url, response['exec_id'],
+                             container_id, max_message_size=max_message_size)
+    await client.connect()
+    return client
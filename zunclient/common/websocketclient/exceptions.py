@@ -35,6 +35,10 @@ class Disconnected(ContainerWebSocketException):
     message = "Remote host closed connection"
 
 
+class MessageTooBig(Disconnected):
+    message = "Remote host sent a message over the size limit"
+
+
 class ConnectionFailed(ContainerWebSocketException):
     message = "Failed to connect to remote host"
 
@@ -0,0 +1,127 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Recording of attach and exec sessions in the asciicast v2 format."""
+
+import codecs
+import collections
+import json
+import threading
+import time
+
+from oslo_log import log as logging
+
+LOG = logging.getLogger(__name__)
+
+# Number of events buffered before recording waits for the writer thread,
+# and seconds between two passes of the writer thread.
+BUFFER_EVENTS = 64 * 1024
+FLUSH_INTERVAL = 0.2
+
+
+class SessionRecorder(object):
+    """Record the frames of a session to an asciicast v2 file.
+
+    ``record`` only timestamps the data and appends it to a buffer, so it
+    adds no I/O to the interactive loop. A background thread turns the
+    buffered events into JSON lines and writes them out. Should the writer
+    fall behind by ``buffer_events`` events, ``record`` waits for it, so
+    that no event is ever lost; it raises IOError if writing failed.
+    """
+
+    def __init__(self, path, width=80, height=24, title=None,
+                 record_input=False, buffer_events=BUFFER_EVENTS):
+        self.path = path
+        self.record_input = record_input
+        self.buffer_events = buffer_events
+        self.events = collections.deque()
+        self.cond = threading.Condition()
+        self.error = None
+        self.decoders = {}
+        self.file = open(path, 'w', encoding='utf-8')
+        header = {'version': 2, 'width': width, 'height': height,
+                  'timestamp': int(time.time())}
+        if title:
+            header['title'] = title
+        self.file.write(json.dumps(header) + '\n')
+        self.start = time.monotonic()
+        self.stopping = False
+        self.writer = threading.Thread(target=self._run)
+        self.writer.daemon = True
+        self.writer.start()
+
+    def record(self, data, kind='o'):
+        """Record data as an output ('o'), input ('i') or resize ('r')."""
+        if kind == 'i' and not self.record_input:
+            return
+        event = (time.monotonic() - self.start, kind, data)
+        with self.cond:
+            while len(self.events) >= self.buffer_events and \
+                    self.error is None:
+                # Wake the writer up and wait for it to take the events
+                self.cond.notify_all()
+                self.cond.wait(FLUSH_INTERVAL)
+            if self.error is not None:
+                raise IOError('recording to %s failed: %s' %
+                              (self.path, self.error))
+            self.events.append(event)
+
+    def _decode(self, kind, data):
+        if isinstance(data, str):
+            return data
+        # Multibyte characters may be split across frames
+        if kind not in self.decoders:
+            self.decoders[kind] = codecs.getincrementaldecoder('utf-8')(
+                errors='replace')
+        return self.decoders[kind].decode(data)
+
+    def _take_events(self):
+        with self.cond:
+            events, self.events = self.events, collections.deque()
+            self.cond.notify_all()
+        return events
+
+    def _write(self, events):
+        lines = [json.dumps([round(elapsed, 6), kind,
+                             self._decode(kind, data)])
+                 for elapsed, kind, data in events]
+        if lines:
+            self.file.write('\n'.join(lines) + '\n')
+            self.file.flush()
+
+    def _run(self):
+        try:
+            while True:
+                with self.cond:
+                    self.cond.wait_for(
+                        lambda: (self.stopping or
+                                 len(self.events) >= self.buffer_events),
+                        FLUSH_INTERVAL)
+                    stopping = self.stopping
+                self._write(self._take_events())
+                if stopping:
+                    break
+        except Exception as e:
+            LOG.error('recording to %s failed: %s', self.path, e)
+            with self.cond:
+                self.error = e
+                self.cond.notify_all()
+
+    def close(self):
+        with self.cond:
+            self.stopping = True
+            self.cond.notify_all()
+        self.writer.join()
+        self.file.close()
+        if self.error is not None:
+            raise IOError('recording to %s failed: %s' %
+                          (self.path, self.error))
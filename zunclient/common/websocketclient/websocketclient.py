@@ -16,24 +16,30 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import base64
 import errno
 import fcntl
 import os
 from oslo_log import log as logging
 import select
+import selectors
+import shlex
 import signal
 import socket
 import ssl
 import struct
 import sys
 import termios
+import threading
 import time
 import tty
 from urllib import parse as urlparse
 import websocket
 
 from zunclient.common.apiclient import exceptions as acexceptions
+from zunclient.common import utils
 from zunclient.common.websocketclient import exceptions
+from zunclient.common.websocketclient import recorder
 
 LOG = logging.getLogger(__name__)
 
@@ -41,16 +47,105 @@ DEFAULT_API_VERSION = '1'
 DEFAULT_ENDPOINT_TYPE = 'publicURL'
 DEFAULT_SERVICE_TYPE = 'container'
 
+# Size of the reads from stdin and maximum number of buffered frames
+# drained from the websocket in a single loop iteration.
+STDIN_READ_SIZE = 64 * 1024
+MAX_FRAMES_PER_CYCLE = 64
+
+# Seconds between keepalive pings, and reconnection attempts made with
+# exponential backoff when an attach session is lost.
+KEEPALIVE_INTERVAL = 30
+RECONNECT_ATTEMPTS = 5
+RECONNECT_DELAY = 1
+MAX_RECONNECT_DELAY = 30
+
+# Minimum number of seconds between two tty resize requests
+RESIZE_INTERVAL = 0.25
+
+# Exit code of a streamed exec whose exit status never arrived, like ssh
+EXIT_STATUS_UNKNOWN = 255
+
+# ANSI colours cycled through to tell containers apart
+PREFIX_COLOURS = (32, 33, 34, 35, 36, 31)
+
+
+class ConnectionLost(Exception):
+    """The websocket of a session failed with error.
+
+    Only such failures are worth a reconnection: local errors, e.g. when
+    writing to stdout, would happen again on the new connection.
+    """
+
+    def __init__(self, error):
+        super(ConnectionLost, self).__init__(error)
+        self.error = error
+
+
+def make_selector():
+    """Return a selector which can also watch stdin redirected from a file.
+
+    epoll, the default selector on Linux, refuses regular files with EPERM;
+    poll reports them as always readable.
+    """
+    if hasattr(selectors, 'PollSelector'):
+        return selectors.PollSelector()
+    return selectors.SelectSelector()
+
+
+class SessionStats(object):
+    """Traffic, latency and reconnections of a websocket session."""
+
+    def __init__(self):
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.rtts = []
+        self.reconnects = 0
+        # Seconds from the start of the session, which may include the
+        # creation of the container, to the attachment and first byte.
+        self.started = time.monotonic()
+        self.time_to_attach = None
+        self.time_to_first_byte = None
+
+    def rtt_percentile(self, percent):
+        """Return the nearest-rank percentile of the RTTs, in seconds."""
+        return utils.percentile(self.rtts, percent)
+
+    def __str__(self):
+        summary = ('%d bytes received, %d bytes sent, %d reconnect(s)' %
+                   (self.bytes_in, self.bytes_out, self.reconnects))
+        if self.time_to_attach is not None:
+            summary += ', attached after %.2fs' % self.time_to_attach
+        if self.time_to_first_byte is not None:
+            summary += ', first byte after %.2fs' % self.time_to_first_byte
+        if self.rtts:
+            summary += ', rtt p50/p90/p99 %s ms' % '/'.join(
+                '%.1f' % (self.rtt_percentile(p) * 1000)
+                for p in (50, 90, 99))
+        return summary
+
 
 class BaseClient(object):
 
+    # Whether the session can be resumed through refresh_url()
+    resumable = False
+
     def __init__(self, zunclient, url, id, escape='~',
-                 close_wait=0.5):
+                 close_wait=0.5, keepalive=KEEPALIVE_INTERVAL,
+                 reconnects=RECONNECT_ATTEMPTS, recorder=None):
         self.url = url
         self.id = id
         self.escape = escape
         self.close_wait = close_wait
         self.cs = zunclient
+        self.keepalive_interval = keepalive
+        self.reconnect_attempts = reconnects
+        self.recorder = recorder
+        self.stats = SessionStats()
+        self.ping_sent = None
+        self.last_ping = time.monotonic()
+        self.pong_seen = False
+        self.resize_pending = False
+        self.last_resize = 0
 
     def connect(self):
         raise NotImplementedError()
@@ -62,6 +157,14 @@ class BaseClient(object):
         raise NotImplementedError()
 
     def recv(self):
+        """Return received data, None for a control frame, b'' on close."""
+        raise NotImplementedError()
+
+    def ping(self, payload):
+        raise NotImplementedError()
+
+    def refresh_url(self):
+        """Return a new url to resume the session with."""
         raise NotImplementedError()
 
     def tty_resize(self, height, width):
@@ -73,27 +176,42 @@ class BaseClient(object):
         """
         raise NotImplementedError()
 
+    def pending(self):
+        """Return True if received data is buffered but not consumed yet.
+
+        Such data does not make the socket readable again, so it has to be
+        drained without waiting for the selector.
+        """
+        return False
+
     def start_loop(self):
-        self.poll = select.poll()
-        self.poll.register(sys.stdin,
-                           select.POLLIN | select.POLLHUP
-                           | select.POLLPRI | select.POLLNVAL)
-        self.poll.register(self.fileno(),
-                           select.POLLIN | select.POLLHUP |
-                           select.POLLPRI | select.POLLNVAL)
+        self.selector = make_selector()
+        self.selector.register(sys.stdin, selectors.EVENT_READ,
+                               self.handle_stdin)
+        self.selector.register(self.fileno(), selectors.EVENT_READ,
+                               self.handle_socket)
+        self.stdout = getattr(sys.stdout, 'buffer', sys.stdout)
+        self.output_pending = False
 
         self.start_of_line = False
         self.read_escape = False
         with WINCHHandler(self):
             try:
                 self.setup_tty()
-                self.run_forever()
-            except socket.error as e:
-                raise exceptions.ConnectionFailed(e)
-            except websocket.WebSocketConnectionClosedException as e:
-                raise exceptions.Disconnected(e)
+                while True:
+                    try:
+                        self.run_forever()
+                        break
+                    except ConnectionLost as e:
+                        if not self.reconnect(e.error):
+                            raise
+            except ConnectionLost as e:
+                if isinstance(e.error, socket.error):
+                    raise exceptions.ConnectionFailed(e.error)
+                raise exceptions.Disconnected(e.error)
             finally:
                 self.restore_tty()
+                self.selector.close()
 
     def run_forever(self):
         LOG.debug('starting main loop in client')
@@ -103,18 +221,23 @@ class BaseClient(object):
 
         while True:
             try:
-                for fd, event in self.poll.poll(500):
-                    if fd == self.fileno():
-                        self.handle_socket(event)
-                    elif fd == sys.stdin.fileno():
-                        self.handle_stdin(event)
-            except select.error as e:
+                for key, event in self.selector.select(
+                        self.select_timeout()):
+                    key.data(event)
+            except InterruptedError:
                 # POSIX signals interrupt select()
+                continue
+            except select.error as e:
                 no = e.errno
                 if no == errno.EINTR:
                     continue
                 else:
                     raise e
+            # Flush once per cycle rather than once per frame
+            self.flush_output()
+            if not self.quit:
+                self.send_keepalive()
+                self.maybe_resize()
 
             if self.quit and not quitting:
                 LOG.debug('entering close_wait')
@@ -125,6 +248,106 @@ class BaseClient(object):
                 LOG.debug('quitting')
                 break
 
+    def select_timeout(self):
+        if self.resize_pending:
+            return max(min(self.last_resize + RESIZE_INTERVAL -
+                           time.monotonic(), 0.5), 0)
+        return 0.5
+
+    def request_resize(self):
+        """Note that the local tty was resized.
+
+        The remote tty is resized by maybe_resize(), at most once per
+        RESIZE_INTERVAL, to the size the local tty has at that time.
+        """
+        self.resize_pending = True
+
+    def maybe_resize(self):
+        if not self.resize_pending:
+            return
+        now = time.monotonic()
+        if now - self.last_resize < RESIZE_INTERVAL:
+            return
+        self.resize_pending = False
+        self.last_resize = now
+        LOG.debug("Send command to resize the tty session")
+        self.handle_resize()
+
+    def send_keepalive(self):
+        """Ping the server every keepalive interval.
+
+        The pings keep idle connections open through load balancers. A
+        ping left unanswered for two intervals means the connection is
+        dead once the server has answered a ping; servers which never
+        answer keep being pinged.
+        """
+        if not self.keepalive_interval:
+            return
+        now = time.monotonic()
+        if self.ping_sent is not None and \
+                now - self.ping_sent > 2 * self.keepalive_interval:
+            if self.pong_seen:
+                raise ConnectionLost(
+                    websocket.WebSocketConnectionClosedException(
+                        'keepalive timed out'))
+            self.ping_sent = None
+        if self.ping_sent is None and \
+                now - self.last_ping >= self.keepalive_interval:
+            self.ping_sent = self.last_ping = now
+            self._websocket_call(self.ping,
+                                 ('%.6f' % now).encode('ascii'))
+
+    def _websocket_call(self, method, *args):
+        """Call a method using the websocket, ConnectionLost on failure."""
+        try:
+            return method(*args)
+        except (socket.error,
+                websocket.WebSocketConnectionClosedException) as e:
+            raise ConnectionLost(e)
+
+    def handle_pong(self, payload):
+        if self.ping_sent is None or \
+                payload != ('%.6f' % self.ping_sent).encode('ascii'):
+            return
+        self.stats.rtts.append(time.monotonic() - self.ping_sent)
+        self.ping_sent = None
+        self.pong_seen = True
+
+    def reconnect(self, error):
+        """Resume the session after error, return True on success.
+
+        A new url is requested for every attempt, waiting twice as long
+        after each failure.
+        """
+        if not self.resumable:
+            return False
+        for attempt in range(self.reconnect_attempts):
+            delay = min(RECONNECT_DELAY * 2 ** attempt, MAX_RECONNECT_DELAY)
+            LOG.debug('connection lost (%s), reconnecting in %ss',
+                      error, delay)
+            time.sleep(delay)
+            try:
+                url = self.refresh_url()
+                self.close_socket()
+                self.url = url
+                self._connect()
+            except Exception as e:
+                LOG.debug('reconnection failed: %s', e)
+                error = e
+                continue
+            self.selector.register(self.fileno(), selectors.EVENT_READ,
+                                   self.handle_socket)
+            self.ping_sent = None
+            self.last_ping = time.monotonic()
+            self.stats.reconnects += 1
+            return True
+        return False
+
+    def close_socket(self):
+        for key in list(self.selector.get_map().values()):
+            if key.data == self.handle_socket:
+                self.selector.unregister(key.fileobj)
+
     def setup_tty(self):
         if os.isatty(sys.stdin.fileno()):
             LOG.debug('putting tty into raw mode')
@@ -137,52 +360,72 @@ class BaseClient(object):
             termios.tcsetattr(sys.stdin, termios.TCSADRAIN,
                               self.old_settings)
 
+    def _unregister(self, fileobj):
+        try:
+            self.selector.unregister(fileobj)
+        except (KeyError, ValueError):
+            pass
+
     def handle_stdin(self, event):
-        if event in (select.POLLHUP, select.POLLNVAL):
-            LOG.debug('event %d on stdin', event)
+        data = os.read(sys.stdin.fileno(), STDIN_READ_SIZE)
 
+        if not data:
             LOG.debug('eof on stdin')
-            self.poll.unregister(sys.stdin)
+            self._unregister(sys.stdin)
             self.quit = True
-
-        data = os.read(sys.stdin.fileno(), 1024)
-
-        if not data:
             return
 
-        if self.start_of_line and data == self.escape:
+        escape = self.escape.encode('utf-8')
+        if self.start_of_line and data == escape:
             self.read_escape = True
             return
 
-        if self.read_escape and data == '.':
+        if self.read_escape and data == b'.':
             LOG.debug('exit by local escape code')
             raise exceptions.UserExit()
         elif self.read_escape:
             self.read_escape = False
-            self.send(self.escape)
+            self._websocket_call(self.send, escape)
 
-        self.send(data)
+        self._websocket_call(self.send, data)
+        if self.recorder is not None:
+            self.recorder.record(data, 'i')
 
-        if data == '\r':
+        if data == b'\r':
             self.start_of_line = True
         else:
             self.start_of_line = False
 
     def handle_socket(self, event):
-        if event in (select.POLLHUP, select.POLLNVAL):
-            self.poll.unregister(self.fileno())
-            self.quit = True
-
-        data = self.recv()
-        if not data:
-            self.poll.unregister(self.fileno())
-            self.quit = True
-            return
+        for _ in range(MAX_FRAMES_PER_CYCLE):
+            data = self._websocket_call(self.recv)
+            if data is None:
+                pass
+            elif not data:
+                self._unregister(self.fileno())
+                self.quit = True
+                return
+            else:
+                if self.stats.time_to_first_byte is None:
+                    self.stats.time_to_first_byte = (time.monotonic() -
+                                                     self.stats.started)
+                    LOG.debug('first byte after %.3fs',
+                              self.stats.time_to_first_byte)
+                if isinstance(data, str):
+                    data = data.encode('utf-8')
+                # Raw bytes go straight to stdout: decoding would break
+                # multibyte sequences split across frames and costs CPU.
+                self.stdout.write(data)
+                self.output_pending = True
+                if self.recorder is not None:
+                    self.recorder.record(data)
+            if not self.pending():
+                break
 
-        if isinstance(data, bytes):
-            data = data.decode("utf-8")
-        sys.stdout.write(data)
-        sys.stdout.flush()
+    def flush_output(self):
+        if self.output_pending:
+            self.stdout.flush()
+            self.output_pending = False
 
     def handle_resize(self):
         """send the POST to resize the tty session size in container.
@@ -195,6 +438,8 @@ class BaseClient(object):
 
         if size is not None:
             rows, cols = size
+            if self.recorder is not None:
+                self.recorder.record('%sx%s' % (cols, rows), 'r')
             try:
                 self.tty_resize(height=rows, width=cols)
             except IOError:  # Container already exited
@@ -231,11 +476,16 @@ class BaseClient(object):
 class WebSocketClient(BaseClient):
 
     def __init__(self, zunclient, url, id, escape='~',
-                 close_wait=0.5):
+                 close_wait=0.5, **kwargs):
         super(WebSocketClient, self).__init__(
-            zunclient, url, id, escape, close_wait)
+            zunclient, url, id, escape, close_wait, **kwargs)
 
     def connect(self):
+        self._connect()
+        print('connected to %s, press Enter to continue' % self.id)
+        print('type %s. to disconnect' % self.escape)
+
+    def _connect(self):
         url = self.url
         LOG.debug('connecting to: %s', url)
         try:
@@ -245,8 +495,6 @@ class WebSocketClient(BaseClient):
                 sslopt={'cert_reqs': ssl.CERT_REQUIRED,
                         'ca_certs': self.get_system_ca_file()},
                 subprotocols=["binary", "base64"])
-            print('connected to %s, press Enter to continue' % self.id)
-            print('type %s. to disconnect' % self.escape)
         except socket.error as e:
             raise exceptions.ConnectionFailed(e)
         except websocket.WebSocketConnectionClosedException as e:
@@ -266,9 +514,36 @@ class WebSocketClient(BaseClient):
 
     def send(self, data):
         self.ws.send_binary(data)
+        self.stats.bytes_out += len(data)
 
     def recv(self):
-        return self.ws.recv()
+        opcode, data = self.ws.recv_data(control_frame=True)
+        if opcode in (websocket.ABNF.OPCODE_TEXT,
+                      websocket.ABNF.OPCODE_BINARY):
+            self.stats.bytes_in += len(data)
+            return data
+        elif opcode == websocket.ABNF.OPCODE_PONG:
+            self.handle_pong(data)
+            return None
+        elif opcode == websocket.ABNF.OPCODE_PING:
+            return None
+        return b''
+
+    def ping(self, payload):
+        self.ws.ping(payload)
+
+    def close_socket(self):
+        super(WebSocketClient, self).close_socket()
+        try:
+            self.ws.shutdown()
+        except Exception:
+            pass
+
+    def pending(self):
+        if getattr(self.ws.frame_buffer, 'recv_buffer', None):
+            return True
+        sock = self.ws.sock
+        return isinstance(sock, ssl.SSLSocket) and sock.pending() > 0
 
     @staticmethod
     def get_system_ca_file():
@@ -287,6 +562,11 @@ class WebSocketClient(BaseClient):
 
 class AttachClient(WebSocketClient):
 
+    resumable = True
+
+    def refresh_url(self):
+        return self.cs.containers.attach(self.id)
+
     def tty_resize(self, height, width):
         """Resize the tty session
 
@@ -303,9 +583,9 @@ class AttachClient(WebSocketClient):
 class ExecClient(WebSocketClient):
 
     def __init__(self, zunclient, url, exec_id, id, escape='~',
-                 close_wait=0.5):
+                 close_wait=0.5, **kwargs):
         super(ExecClient, self).__init__(zunclient, url, id, escape,
-                                         close_wait)
+                                         close_wait, **kwargs)
         self.exec_id = exec_id
 
     def tty_resize(self, height, width):
@@ -321,6 +601,298 @@ class ExecClient(WebSocketClient):
         self.cs.containers.execute_resize(self.id, self.exec_id, width, height)
 
 
+def stream_command(command, marker, stdin=False):
+    """Wrap a command so that its output can be streamed by ExecStream.
+
+    The zun API only creates interactive exec sessions on a pseudo-TTY, so
+    the wrapper puts the TTY in raw mode without echo, where no byte is
+    translated, turned into a signal or limited by the line editor. It
+    prints ``marker`` once the TTY is set up and ``marker`` followed by
+    the exit status when the command ends. The zun API has no way to
+    inspect an exec instance, so this trailer is the only way to learn the
+    exit code.
+
+    With ``stdin``, the command reads the Base64 encoded input which
+    ExecStream sends up to a line holding a single dot, and gets a real
+    end of file after it; otherwise its stdin is /dev/null. The image must
+    provide sh and stty, and sed and base64 for stdin.
+    """
+    argv = ' '.join(shlex.quote(arg) for arg in shlex.split(command))
+    if stdin:
+        argv = "sed -n '/^[.]$/q;p' | base64 -d | %s" % argv
+    else:
+        argv = '%s </dev/null' % argv
+    script = ("stty raw -echo || exit; printf '%%s\\n' %(m)s; "
+              "%(argv)s; printf '%%s%%d\\n' %(m)s $?" %
+              {'m': marker, 'argv': argv})
+    return 'sh -c %s' % shlex.quote(script)
+
+
+class ExecStream(ExecClient):
+    """Iterate over the output of a command executed in a container.
+
+    Each iteration returns the bytes received since the previous one. The
+    websocket is only read when the next chunk is requested, so a slow
+    consumer throttles the container through TCP flow control. ``stdin``
+    is copied to the command from a background thread with blocking
+    sends, Base64 encoded so that any byte goes through the TTY, and is
+    closed with an end-of-file once exhausted. The command runs on the
+    container's pseudo-TTY, which merges its stdout and stderr.
+
+    ``exit_code`` is set once the iteration is over. It is
+    EXIT_STATUS_UNKNOWN if the stream was closed or the connection lost
+    before the command ended.
+    """
+
+    def __init__(self, zunclient, url, exec_id, id, marker, stdin=None,
+                 chunk_size=STDIN_READ_SIZE):
+        super(ExecStream, self).__init__(zunclient, url, exec_id, id)
+        self.marker = marker.encode('utf-8')
+        self.stdin = stdin
+        self.chunk_size = chunk_size
+        self.started = False
+        self.exit_code = None
+        self._buffer = b''
+        self._done = False
+        self._started = threading.Event()
+        self._pump = None
+
+    def connect(self):
+        self._connect()
+        if self.stdin is not None:
+            self._pump = threading.Thread(target=self._pump_stdin)
+            self._pump.daemon = True
+            self._pump.start()
+
+    def close(self):
+        self._done = True
+        if self.exit_code is None:
+            LOG.debug('exec stream closed before the command ended')
+            self.exit_code = EXIT_STATUS_UNKNOWN
+        # Release the stdin pump if the command never started
+        self._started.set()
+        self.ws.close()
+
+    def _pump_stdin(self):
+        self._started.wait()
+        try:
+            read = getattr(self.stdin, 'read1', self.stdin.read)
+            # Only whole 3 byte groups are encoded before the end, so that
+            # the input has no padding in the middle
+            pending = b''
+            while not self._done:
+                data = read(self.chunk_size)
+                if not data:
+                    break
+                data = pending + data
+                split = len(data) - len(data) % 3
+                pending = data[split:]
+                if split:
+                    self.send(base64.encodebytes(data[:split]))
+            self.send(base64.encodebytes(pending) + b'.\n')
+        except (socket.error, websocket.WebSocketException) as e:
+            LOG.debug('stopped sending stdin: %s', e)
+
+    def _feed(self, data):
+        """Return the output in data, stripped of the stream markers."""
+        buf = self._buffer + data
+        chunks = []
+        while True:
+            idx = buf.find(self.marker)
+            if idx < 0:
+                # The end of buf could be the beginning of a marker
+                keep = len(self.marker) - 1
+                break
+            end = buf.find(b'\n', idx)
+            if end < 0:
+                keep = len(buf) - idx
+                break
+            if self.started:
+                chunks.append(buf[:idx])
+            tag = buf[idx + len(self.marker):end]
+            buf = buf[end + 1:]
+            if self.started:
+                self.exit_code = int(tag)
+                self._done = True
+                buf, keep = b'', 0
+                break
+            self.started = True
+            self._started.set()
+        split = max(len(buf) - keep, 0)
+        if self.started:
+            chunks.append(buf[:split])
+        self._buffer = buf[split:]
+        return b''.join(chunks)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        while not self._done:
+            try:
+                opcode, data = self.ws.recv_data()
+            except (socket.error, websocket.WebSocketException) as e:
+                LOG.debug('exec stream disconnected: %s', e)
+                opcode, data = websocket.ABNF.OPCODE_CLOSE, b''
+            if opcode == websocket.ABNF.OPCODE_CLOSE:
+                data = self._buffer if self.started else b''
+                self._buffer = b''
+                self.close()
+            else:
+                data = self._feed(data)
+                if self._done:
+                    self.close()
+            if data:
+                return data
+        raise StopIteration
+
+
+class MultiplexClient(object):
+    """Relay the output of several attach or exec sessions at once.
+
+    Every session is watched by a single selector loop. Output is written
+    line by line, prefixed by the id of the session it comes from, in
+    colour when stdout is a terminal. When ``broadcast`` is set, the lines
+    read from stdin are sent to every session; typing the escape character
+    followed by ``.`` on its own line disconnects.
+    """
+
+    def __init__(self, clients, broadcast=False, escape='~',
+                 close_wait=0.5, colour=None):
+        self.clients = list(clients)
+        self.broadcast = broadcast
+        self.escape = escape
+        self.close_wait = close_wait
+        self.colour = colour
+        self.partial = {}
+
+    def _prefixes(self):
+        if self.colour is None:
+            self.colour = sys.stdout.isatty()
+        width = max(len(str(c.id)) for c in self.clients)
+        prefixes = {}
+        for index, client in enumerate(self.clients):
+            name = str(client.id).ljust(width)
+            if self.colour:
+                colour = PREFIX_COLOURS[index % len(PREFIX_COLOURS)]
+                name = '\x1b[%dm%s\x1b[0m' % (colour, name)
+            prefixes[client] = ('%s | ' % name).encode('utf-8')
+        return prefixes
+
+    def start_loop(self):
+        self.prefixes = self._prefixes()
+        self.stdout = getattr(sys.stdout, 'buffer', sys.stdout)
+        self.output_pending = False
+        self.selector = make_selector()
+        # Closed websockets have no file descriptor left to unregister
+        self.fds = {}
+        for client in self.clients:
+            self.fds[client] = client.fileno()
+            self.selector.register(self.fds[client], selectors.EVENT_READ,
+                                   client)
+        if self.broadcast:
+            self.selector.register(sys.stdin, selectors.EVENT_READ, None)
+        self.active = set(self.clients)
+        try:
+            self.run_forever()
+        except socket.error as e:
+            raise exceptions.ConnectionFailed(e)
+        finally:
+            for client in list(self.active):
+                self._flush_partial(client)
+            self.flush_output()
+            self.selector.close()
+
+    def run_forever(self):
+        LOG.debug('starting multiplexed loop for %d sessions',
+                  len(self.clients))
+        self.quit = False
+        when = None
+
+        while True:
+            try:
+                events = self.selector.select(0.5)
+            except InterruptedError:
+                continue
+            for key, event in events:
+                if key.data is None:
+                    self.handle_stdin()
+                else:
+                    self.handle_socket(key.data)
+            self.flush_output()
+
+            if self.quit and when is None:
+                LOG.debug('entering close_wait')
+                when = time.time() + self.close_wait
+
+            if when is not None and time.time() > when:
+                LOG.debug('quitting')
+                break
+
+    def handle_stdin(self):
+        data = os.read(sys.stdin.fileno(), STDIN_READ_SIZE)
+
+        if not data:
+            LOG.debug('eof on stdin, no longer broadcasting')
+            self.selector.unregister(sys.stdin)
+            return
+
+        if data.rstrip(b'\r\n') == (self.escape + '.').encode('utf-8'):
+            LOG.debug('exit by local escape code')
+            raise exceptions.UserExit()
+
+        for client in self.active:
+            client.send(data)
+
+    def handle_socket(self, client):
+        for _ in range(MAX_FRAMES_PER_CYCLE):
+            try:
+                data = client.recv()
+            except websocket.WebSocketConnectionClosedException:
+                data = b''
+            if data is None:
+                pass
+            elif not data:
+                self._disconnect(client)
+                return
+            else:
+                if isinstance(data, str):
+                    data = data.encode('utf-8')
+                self._write(client, data)
+            if not client.pending():
+                break
+
+    def _disconnect(self, client):
+        LOG.debug('session %s disconnected', client.id)
+        self.selector.unregister(self.fds[client])
+        self._flush_partial(client)
+        self.active.discard(client)
+        if not self.active:
+            self.quit = True
+
+    def _write(self, client, data):
+        lines = (self.partial.pop(client, b'') + data).split(b'\n')
+        rest = lines.pop()
+        if rest:
+            self.partial[client] = rest
+        prefix = self.prefixes[client]
+        if lines:
+            self.stdout.write(b''.join(prefix + line + b'\n'
+                                       for line in lines))
+            self.output_pending = True
+
+    def _flush_partial(self, client):
+        rest = self.partial.pop(client, None)
+        if rest:
+            self.stdout.write(self.prefixes[client] + rest + b'\n')
+            self.output_pending = True
+
+    def flush_output(self):
+        if self.output_pending:
+            self.stdout.flush()
+            self.output_pending = False
+
+
 class WINCHHandler(object):
     """WINCH Signal handler
 
@@ -336,6 +908,7 @@ class WINCHHandler(object):
 
         self.client = client
         self.original_handler = None
+        self.rfd = self.wfd = None
 
     def __enter__(self):
         """Enter
@@ -360,15 +933,35 @@ class WINCHHandler(object):
         Start trapping WINCH signals and resizing the PTY.
         This method saves the previous WINCH handler so it can be restored on
         `stop()`.
+
+        The signal handler only writes to a pipe watched by the selector of
+        the client, the resize itself happens in its loop.
         """
 
+        self.rfd, self.wfd = os.pipe()
+        os.set_blocking(self.rfd, False)
+        os.set_blocking(self.wfd, False)
+        self.client.selector.register(self.rfd, selectors.EVENT_READ,
+                                      self.handle_wakeup)
+
         def handle(signum, frame):
             if signum == signal.SIGWINCH:
-                LOG.debug("Send command to resize the tty session")
-                self.client.handle_resize()
+                try:
+                    os.write(self.wfd, b'\0')
+                except OSError:
+                    # The pipe is full, a wakeup is already pending
+                    pass
 
         self.original_handler = signal.signal(signal.SIGWINCH, handle)
 
+    def handle_wakeup(self, event):
+        try:
+            while os.read(self.rfd, 512):
+                pass
+        except BlockingIOError:
+            pass
+        self.client.request_resize()
+
     def stop(self):
         """stop
 
@@ -377,36 +970,94 @@ class WINCHHandler(object):
 
         if self.original_handler is not None:
             signal.signal(signal.SIGWINCH, self.original_handler)
+        if self.rfd is not None:
+            try:
+                self.client.selector.unregister(self.rfd)
+            except (KeyError, ValueError):
+                # The selector has been closed already
+                pass
+            os.close(self.rfd)
+            os.close(self.wfd)
+            self.rfd = self.wfd = None
+
+
+def _run_session(wscls, container_id, record=None, started=None,
+                 record_input=False):
+    if started is not None:
+        wscls.stats.started = started
+    try:
+        wscls.connect()
+        wscls.stats.time_to_attach = time.monotonic() - wscls.stats.started
+        if record:
+            rows, cols = wscls.tty_size(sys.stdout) or (24, 80)
+            wscls.recorder = recorder.SessionRecorder(
+                record, width=int(cols), height=int(rows),
+                title=container_id, record_input=record_input)
+        wscls.handle_resize()
+        try:
+            wscls.start_loop()
+        finally:
+            if wscls.recorder is not None:
+                wscls.recorder.close()
+            LOG.debug('session statistics: %s', wscls.stats)
+    except exceptions.ContainerWebSocketException as e:
+        print("%(e)s:%(container)s" %
+              {'e': e, 'container': container_id})
 
 
-def do_attach(zunclient, url, container_id, escape, close_wait):
+def do_attach(zunclient, url, container_id, escape, close_wait,
+              record=None, started=None, record_input=False):
     if url.startswith("ws://") or url.startswith("wss://"):
-        try:
-            wscls = AttachClient(zunclient=zunclient, url=url,
-                                 id=container_id, escape=escape,
-                                 close_wait=close_wait)
-            wscls.connect()
-            wscls.handle_resize()
-            wscls.start_loop()
-        except exceptions.ContainerWebSocketException as e:
-            print("%(e)s:%(container)s" %
-                  {'e': e, 'container': container_id})
+        wscls = AttachClient(zunclient=zunclient, url=url,
+                             id=container_id, escape=escape,
+                             close_wait=close_wait)
+        _run_session(wscls, container_id, record, started, record_input)
     else:
         raise exceptions.InvalidWebSocketLink(container_id)
 
 
-def do_exec(zunclient, url, container_id, exec_id, escape, close_wait):
+def do_exec(zunclient, url, container_id, exec_id, escape, close_wait,
+            record=None, record_input=False):
     if url.startswith("ws://") or url.startswith("wss://"):
+        wscls = ExecClient(zunclient=zunclient, url=url,
+                           exec_id=exec_id,
+                           id=container_id, escape=escape,
+                           close_wait=close_wait)
+        _run_session(wscls, container_id, record,
+                     record_input=record_input)
+    else:
+        raise exceptions.InvalidWebSocketLink(container_id)
+
+
+def do_attach_many(zunclient, urls, escape, close_wait, broadcast=False):
+    """Attach to several containers and multiplex their output.
+
+    ``urls`` is a list of (container, websocket url) pairs. Containers
+    which cannot be attached to are reported and skipped.
+    """
+    clients = []
+    for container_id, url in urls:
+        if not (url.startswith("ws://") or url.startswith("wss://")):
+            raise exceptions.InvalidWebSocketLink(container_id)
+        wscls = AttachClient(zunclient=zunclient, url=url,
+                             id=container_id, escape=escape,
+                             close_wait=close_wait)
         try:
-            wscls = ExecClient(zunclient=zunclient, url=url,
-                               exec_id=exec_id,
-                               id=container_id, escape=escape,
-                               close_wait=close_wait)
-            wscls.connect()
-            wscls.handle_resize()
-            wscls.start_loop()
+            wscls._connect()
         except exceptions.ContainerWebSocketException as e:
             print("%(e)s:%(container)s" %
                   {'e': e, 'container': container_id})
-    else:
-        raise exceptions.InvalidWebSocketLink(container_id)
+            continue
+        clients.append(wscls)
+    if not clients:
+        return
+    try:
+        MultiplexClient(clients, broadcast=broadcast, escape=escape,
+                        close_wait=close_wait).start_loop()
+    except exceptions.ContainerWebSocketException as e:
+        print(e)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for wscls in clients:
+            wscls.ws.close()
@@ -39,6 +39,21 @@ class InvalidAttribute(exceptions.ClientException):
     pass
 
 
+class WaitTimeout(exceptions.ClientException):
+    """A resource did not reach the expected status in time."""
+    pass
+
+
+class ResourceInErrorState(exceptions.ClientException):
+    """A resource reached an error status while being waited for."""
+    pass
+
+
+class NoRecordedResponse(exceptions.ClientException):
+    """A replayed cassette has no response for a request."""
+    pass
+
+
 def from_response(response, message=None, traceback=None, method=None,
                   url=None):
     """Return an HttpError instance based on response from httplib/requests."""
@@ -0,0 +1,60 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Run a fake zun-api until interrupted.
+
+Usage: python -m zunclient.fakeserver [--port PORT] [--containers N]
+"""
+
+import argparse
+import time
+
+from zunclient.fakeserver import server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=0)
+    parser.add_argument('--containers', type=int, default=0,
+                        help='Number of Running containers to create.')
+    parser.add_argument('--latency', type=float, default=0,
+                        help='Seconds added to every request.')
+    parser.add_argument('--transition-delay', type=float, default=0,
+                        help='Seconds spent in transient statuses.')
+    parser.add_argument('--max-limit', type=int, default=server.MAX_LIMIT,
+                        help='Maximum number of resources per page.')
+    parser.add_argument('--compression', action='store_true',
+                        help='Compress responses and take gzipped '
+                             'requests.')
+    args = parser.parse_args(argv)
+
+    fake = server.FakeZunServer(host=args.host, port=args.port,
+                                latency=args.latency,
+                                transition_delay=args.transition_delay,
+                                max_limit=args.max_limit,
+                                compression=args.compression)
+    for _ in range(args.containers):
+        fake.add_container(status='Running')
+    fake.start()
+    print('Fake zun-api listening on %s' % fake.url, flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fake.stop()
+
+
+if __name__ == '__main__':
+    main()
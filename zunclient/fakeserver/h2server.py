@@ -0,0 +1,245 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Serving a FakeZunServer over HTTP/2, with the h2 package.
+
+Without an SSL context, H2Server speaks HTTP/2 with prior knowledge. With
+one, clients pick HTTP/2 or HTTP/1.1 with ALPN among the protocols the
+context offers, so both can be compared over TLS, and the fallback to
+HTTP/1.1 tested::
+
+    fake = server.FakeZunServer(latency=0.005)
+    context, cafile = h2server.self_signed_context()
+    h2 = h2server.H2Server(fake, ssl_context=context).start()
+    zun = fake.client(endpoint_override=h2.url, cacert=cafile,
+                      transport='http2')
+
+Every stream is answered in its own thread, so requests multiplexed on
+one connection are handled concurrently. The server needs the h2 and
+cryptography packages of the http2 extra.
+"""
+
+import collections
+import datetime
+import ipaddress
+import os
+import socket
+import ssl
+import tempfile
+import threading
+
+from oslo_utils import importutils
+from requests import structures
+
+from zunclient import exceptions
+from zunclient.fakeserver import server
+
+h2_config = importutils.try_import('h2.config')
+h2_connection = importutils.try_import('h2.connection')
+h2_events = importutils.try_import('h2.events')
+h2_exceptions = importutils.try_import('h2.exceptions')
+
+INSTALL_HINT = 'pip install python-zunclient[http2]'
+
+
+def self_signed_context(alpn=('h2', 'http/1.1'), host='127.0.0.1'):
+    """Return a server SSL context and the file of its CA certificate.
+
+    :param alpn: protocols offered to the clients
+    """
+    try:
+        from cryptography.hazmat.primitives.asymmetric import ec
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives import serialization
+        from cryptography import x509
+        from cryptography.x509 import oid
+    except ImportError:
+        raise exceptions.InvalidAttribute(
+            'A self-signed certificate requires the cryptography package: '
+            + INSTALL_HINT)
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(oid.NameOID.COMMON_NAME, host)])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (x509.CertificateBuilder()
+            .subject_name(name).issuer_name(name)
+            .public_key(key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now - datetime.timedelta(days=1))
+            .not_valid_after(now + datetime.timedelta(days=1))
+            .add_extension(x509.SubjectAlternativeName(
+                [x509.IPAddress(ipaddress.ip_address(host))]),
+                critical=False)
+            .add_extension(x509.BasicConstraints(ca=True, path_length=None),
+                           critical=True)
+            .sign(key, hashes.SHA256()))
+    directory = tempfile.mkdtemp()
+    cert_file = os.path.join(directory, 'cert.pem')
+    key_file = os.path.join(directory, 'key.pem')
+    with open(cert_file, 'wb') as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_file, 'wb') as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM,
+                                  serialization.PrivateFormat.PKCS8,
+                                  serialization.NoEncryption()))
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert_file, key_file)
+    context.set_alpn_protocols(list(alpn))
+    return context, cert_file
+
+
+class _H2Connection(object):
+    """The server side of one HTTP/2 connection."""
+
+    def __init__(self, fake, sock):
+        self.fake = fake
+        self.sock = sock
+        self.conn = h2_connection.H2Connection(h2_config.H2Configuration(
+            client_side=False, header_encoding='utf-8'))
+        # Guards the connection state and the writes to the socket
+        self.lock = threading.Condition()
+        self.streams = {}
+
+    def _flush(self):
+        data = self.conn.data_to_send()
+        if data:
+            self.sock.sendall(data)
+
+    def run(self):
+        with self.lock:
+            self.conn.initiate_connection()
+            self._flush()
+        while True:
+            try:
+                data = self.sock.recv(65536)
+            except OSError:
+                return
+            if not data:
+                return
+            with self.lock:
+                try:
+                    events = self.conn.receive_data(data)
+                except h2_exceptions.ProtocolError:
+                    self._flush()
+                    return
+                self._flush()
+                self.lock.notify_all()
+            for event in events:
+                if isinstance(event, h2_events.RequestReceived):
+                    self.streams[event.stream_id] = (
+                        structures.CaseInsensitiveDict(event.headers),
+                        bytearray())
+                elif isinstance(event, h2_events.DataReceived):
+                    self.streams[event.stream_id][1].extend(event.data)
+                    with self.lock:
+                        self.conn.acknowledge_received_data(
+                            event.flow_controlled_length, event.stream_id)
+                        self._flush()
+                elif isinstance(event, h2_events.StreamEnded):
+                    headers, body = self.streams.pop(event.stream_id)
+                    thread = threading.Thread(
+                        target=self._respond,
+                        args=(event.stream_id, headers, bytes(body)))
+                    thread.daemon = True
+                    thread.start()
+                elif isinstance(event, h2_events.ConnectionTerminated):
+                    return
+
+    def _respond(self, stream_id, headers, body):
+        status, response_headers, data = self.fake.respond(
+            headers[':method'], headers[':path'], headers, body or None)
+        response_headers = [(':status', str(status))] + [
+            (k.lower(), v) for k, v in response_headers.items()]
+        try:
+            with self.lock:
+                self.conn.send_headers(stream_id, response_headers,
+                                       end_stream=not data)
+                self._flush()
+                while data:
+                    # Wait for the client to open the flow control window
+                    while not self.conn.local_flow_control_window(stream_id):
+                        self.lock.wait()
+                    size = min(self.conn.local_flow_control_window(stream_id),
+                               self.conn.max_outbound_frame_size, len(data))
+                    chunk, data = data[:size], data[size:]
+                    self.conn.send_data(stream_id, chunk,
+                                        end_stream=not data)
+                    self._flush()
+        except (h2_exceptions.StreamClosedError, OSError):
+            pass
+
+
+class H2Server(object):
+    """Serve the API of a FakeZunServer over HTTP/2 on a local port.
+
+    :param fake: the FakeZunServer answering the requests, which need not
+        be started
+    :param ssl_context: serve TLS, negotiating the protocol with ALPN
+    """
+
+    def __init__(self, fake, host='127.0.0.1', port=0, ssl_context=None):
+        if h2_connection is None:
+            raise exceptions.InvalidAttribute(
+                'The HTTP/2 fake server requires the h2 package: '
+                + INSTALL_HINT)
+        self.fake = fake
+        self.ssl_context = ssl_context
+        self.sock = socket.create_server((host, port))
+        self.host, self.port = self.sock.getsockname()[:2]
+        self.lock = threading.Lock()
+        # Connections accepted, by negotiated protocol
+        self.connections = collections.Counter()
+
+    @property
+    def url(self):
+        scheme = 'https' if self.ssl_context else 'http'
+        return '%s://%s:%s/v1' % (scheme, self.host, self.port)
+
+    def start(self):
+        thread = threading.Thread(target=self._serve)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self.sock.close()
+
+    def _serve(self):
+        while True:
+            try:
+                sock, address = self.sock.accept()
+            except OSError:
+                return
+            thread = threading.Thread(target=self._handle,
+                                      args=(sock, address))
+            thread.daemon = True
+            thread.start()
+
+    def _handle(self, sock, address):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        protocol = 'h2'
+        try:
+            if self.ssl_context:
+                sock = self.ssl_context.wrap_socket(sock, server_side=True)
+                protocol = sock.selected_alpn_protocol() or 'http/1.1'
+            with self.lock:
+                self.connections[protocol] += 1
+            if protocol == 'h2':
+                _H2Connection(self.fake, sock).run()
+            else:
+                # The HTTP/1.1 handler of the fake serves the connection
+                server._make_handler(self.fake, tcp=False)(sock, address,
+                                                           self)
+        except (ssl.SSLError, OSError):
+            pass
+        finally:
+            sock.close()
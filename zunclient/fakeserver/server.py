@@ -0,0 +1,727 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""A local stand-in for zun-api.
+
+FakeZunServer keeps containers, images, hosts and capsules in memory and
+serves them over HTTP the way zun-api does, including pagination with
+``next`` links, microversion negotiation and ``/attach`` websockets, so
+the client can be run end to end without a cloud::
+
+    server = FakeZunServer(latency=0.01).start()
+    zun = server.client()
+    zun.containers.run(image='cirros')
+    ...
+    server.stop()
+
+Status changes take ``transition_delay`` seconds, and errors can be
+injected with ``inject_error``.
+"""
+
+import collections
+from http import server as http_server
+import json
+import re
+import socketserver
+import threading
+import time
+from urllib import parse
+import uuid
+import zlib
+
+from zunclient import api_versions
+from zunclient import client
+from zunclient.common import compression
+from zunclient.common import transports
+from zunclient.fakeserver import wsserver
+
+MAX_LIMIT = 1000
+HOSTNAME = 'fake-host'
+# Smallest response body compressed, when compression is on
+COMPRESS_MIN_SIZE = 1024
+
+# Status of a container once an action has completed, and while it runs
+ACTION_STATUS = {
+    'start': ('Running', None),
+    'stop': ('Stopped', None),
+    'reboot': ('Running', 'rebooting'),
+    'pause': ('Paused', None),
+    'unpause': ('Running', None),
+    'kill': ('Stopped', None),
+    'rebuild': (None, 'rebuilding'),
+}
+
+Request = collections.namedtuple('Request', ['method', 'path', 'query',
+                                             'headers', 'body', 'version'])
+
+
+class HTTPError(Exception):
+
+    def __init__(self, status, title, detail=None):
+        super(HTTPError, self).__init__(title)
+        self.status = status
+        self.title = title
+        self.detail = detail or title
+
+
+class _Route(object):
+
+    def __init__(self, method, pattern, handler):
+        self.method = method
+        self.pattern = re.compile('^/v1/' + pattern + '/?$')
+        self.handler = handler
+
+
+def _query(request, name, default=None):
+    return request.query.get(name, [default])[0]
+
+
+class FakeZunServer(object):
+    """An in-memory zun-api served on a local port.
+
+    :param latency: seconds added to the handling of every request
+    :param transition_delay: seconds a container spends in a transient
+        status, such as Creating or Deleting, before reaching the next one
+    :param max_limit: maximum number of resources returned per page
+    :param echo: answer the attach and interactive exec websockets by
+        echoing the input back, like ``cat`` in a tty
+    :param unix_socket: serve the API on this Unix socket instead of a
+        port, to use with the unix transport
+    :param compression: compress the responses for clients accepting
+        gzip or deflate, and take gzipped request bodies, like zun-api
+        behind a compressing proxy; otherwise these get 415
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0,
+                 transition_delay=0, max_limit=MAX_LIMIT, echo=True,
+                 unix_socket=None, compression=False):
+        self.latency = latency
+        self.compression = compression
+        # Request and response bodies compressed, by encoding
+        self.encodings = collections.Counter()
+        self.transition_delay = transition_delay
+        self.max_limit = max_limit
+        self.lock = threading.RLock()
+        self.containers = collections.OrderedDict()
+        self.images = collections.OrderedDict()
+        self.capsules = collections.OrderedDict()
+        self.hosts = collections.OrderedDict()
+        self.errors = []
+        self.requests = collections.Counter()
+        self.min_version = api_versions.APIVersion(
+            api_versions.MIN_API_VERSION)
+        self.max_version = api_versions.APIVersion(
+            api_versions.MAX_API_VERSION)
+        self.add_host(HOSTNAME)
+        self.routes = [
+            _Route('GET', 'containers', self.list_containers),
+            _Route('POST', 'containers', self.create_container),
+            _Route('GET', 'containers/([^/]+)', self.show_container),
+            _Route('PATCH', 'containers/([^/]+)', self.update_container),
+            _Route('DELETE', 'containers/([^/]+)', self.delete_container),
+            _Route('POST', 'containers/([^/]+)/(%s)' % '|'.join(
+                ACTION_STATUS), self.container_action),
+            _Route('POST', 'containers/([^/]+)/rename',
+                   self.rename_container),
+            _Route('GET', 'containers/([^/]+)/attach', self.attach_container),
+            _Route('POST', 'containers/([^/]+)/resize', self.resize_container),
+            _Route('POST', 'containers/([^/]+)/execute',
+                   self.execute_container),
+            _Route('POST', 'containers/([^/]+)/execute_resize',
+                   self.resize_container),
+            _Route('GET', 'containers/([^/]+)/logs', self.container_logs),
+            _Route('GET', 'images', self.list_images),
+            _Route('POST', 'images', self.create_image),
+            _Route('GET', 'images/([^/]+)', self.show_image),
+            _Route('DELETE', 'images/([^/]+)', self.delete_image),
+            _Route('GET', 'hosts', self.list_hosts),
+            _Route('GET', 'hosts/([^/]+)', self.show_host),
+            _Route('GET', 'capsules', self.list_capsules),
+            _Route('POST', 'capsules', self.create_capsule),
+            _Route('GET', 'capsules/([^/]+)', self.show_capsule),
+            _Route('DELETE', 'capsules/([^/]+)', self.delete_capsule),
+        ]
+
+        self.ws_server = wsserver.WebSocketServer(
+            handler=wsserver.echo_handler if echo else self._idle_handler,
+            host=host)
+        if unix_socket:
+            self.httpd = socketserver.ThreadingUnixStreamServer(
+                unix_socket, _make_handler(self, tcp=False))
+            self.host, self.port = 'localhost', 80
+        else:
+            self.httpd = http_server.ThreadingHTTPServer((host, port),
+                                                         _make_handler(self))
+            self.host, self.port = self.httpd.server_address[:2]
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        """The endpoint of the API, to use as endpoint_override."""
+        return 'http://%s:%s/v1' % (self.host, self.port)
+
+    def start(self):
+        self.ws_server.start()
+        self.thread = threading.Thread(target=self.httpd.serve_forever,
+                                       kwargs={'poll_interval': 0.05})
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving, or release the sockets of a server never started.
+
+        A server called with its memory_transport need not be started.
+        """
+        if self.thread:
+            self.httpd.shutdown()
+            self.thread = None
+        self.httpd.server_close()
+        self.ws_server.stop()
+
+    def client(self, version='1.latest', **kwargs):
+        """Return a zunclient Client talking to this server.
+
+        endpoint_override may point it at another front end of the server,
+        such as an H2Server.
+        """
+        kwargs.setdefault('endpoint_override', self.url)
+        return client.Client(version, auth_token='fake-token', **kwargs)
+
+    # Error injection
+
+    def inject_error(self, status=500, method=None, path=None, count=1,
+                     title=None):
+        """Fail matching requests with an HTTP error.
+
+        :param method: HTTP method to match, or None for any
+        :param path: regular expression searched in the request path, or
+            None for any
+        :param count: number of requests to fail, or None for all of them
+        """
+        with self.lock:
+            self.errors.append({
+                'status': status, 'method': method,
+                'path': re.compile(path) if path else None, 'count': count,
+                'title': title or http_server.BaseHTTPRequestHandler.responses
+                .get(status, ('Error',))[0]})
+
+    def clear_errors(self):
+        with self.lock:
+            self.errors = []
+
+    def _injected_error(self, method, path):
+        with self.lock:
+            for rule in self.errors:
+                if rule['method'] and rule['method'] != method:
+                    continue
+                if rule['path'] and not rule['path'].search(path):
+                    continue
+                if rule['count'] is not None:
+                    rule['count'] -= 1
+                    if rule['count'] <= 0:
+                        self.errors.remove(rule)
+                return HTTPError(rule['status'], rule['title'],
+                                 'Injected error')
+
+    # Dispatching
+
+    def _negotiate(self, headers):
+        header = headers.get(api_versions.HEADER_NAME)
+        if not header:
+            return self.min_version
+        service, _, version = header.strip().partition(' ')
+        if service.lower() != api_versions.SERVICE_TYPE:
+            return self.min_version
+        if version == 'latest':
+            return self.max_version
+        try:
+            version = api_versions.APIVersion(version)
+        except Exception:
+            raise HTTPError(400, 'Bad Request',
+                            'Invalid API version %s' % header)
+        if not self.min_version <= version <= self.max_version:
+            raise HTTPError(
+                406, 'Not Acceptable',
+                'Version %s is not supported by the API. Minimum is %s and '
+                'maximum is %s.' % (version.get_string(),
+                                    self.min_version.get_string(),
+                                    self.max_version.get_string()))
+        return version
+
+    def handle(self, method, raw_path, headers, raw_body):
+        """Return the (status, headers, body) answering a request."""
+        if self.latency:
+            time.sleep(self.latency)
+        url = parse.urlparse(raw_path)
+        with self.lock:
+            self.requests[method] += 1
+        version = self.min_version
+        try:
+            version = self._negotiate(headers)
+            error = self._injected_error(method, url.path)
+            if error:
+                raise error
+            raw_body = self._decode_body(headers, raw_body)
+            try:
+                body = json.loads(raw_body) if raw_body else None
+            except ValueError:
+                raise HTTPError(400, 'Bad Request', 'Malformed JSON body')
+            request = Request(method, url.path,
+                              parse.parse_qs(url.query), headers, body,
+                              version)
+            status, body = self._dispatch(request)
+        except HTTPError as e:
+            status = e.status
+            body = _error_body(e)
+        except Exception as e:
+            status = 500
+            body = _error_body(HTTPError(500, 'Internal Server Error',
+                                         str(e)))
+        response_headers = {
+            api_versions.HEADER_NAME: '%s %s' % (api_versions.SERVICE_TYPE,
+                                                 version.get_string()),
+            'Vary': api_versions.HEADER_NAME}
+        return status, response_headers, body
+
+    def respond(self, method, raw_path, headers, raw_body):
+        """Like handle, with the body of the response encoded as JSON.
+
+        The body is compressed if the server and the client allow it.
+        """
+        status, response_headers, body = self.handle(method, raw_path,
+                                                     headers, raw_body)
+        data = b''
+        if body is not None:
+            response_headers['Content-Type'] = 'application/json'
+            data = json.dumps(body).encode()
+            encoding = self._response_encoding(headers)
+            if encoding and len(data) >= COMPRESS_MIN_SIZE:
+                with self.lock:
+                    self.encodings['response:' + encoding] += 1
+                if encoding == 'gzip':
+                    data = compression.compress(data)
+                else:
+                    data = zlib.compress(data, compression.COMPRESS_LEVEL)
+                response_headers['Content-Encoding'] = encoding
+        response_headers['Content-Length'] = str(len(data))
+        return status, response_headers, data
+
+    def _response_encoding(self, headers):
+        if not self.compression:
+            return None
+        accepted = [e.split(';')[0].strip().lower() for e in
+                    (headers.get('Accept-Encoding') or '').split(',')]
+        for encoding in ('gzip', 'deflate'):
+            if encoding in accepted:
+                return encoding
+        return None
+
+    def _decode_body(self, headers, raw_body):
+        encoding = (headers.get('Content-Encoding') or '').lower()
+        if not raw_body or not encoding or encoding == 'identity':
+            return raw_body
+        if not self.compression or encoding != 'gzip':
+            raise HTTPError(415, 'Unsupported Media Type',
+                            'Content-Encoding %s is not supported.' %
+                            encoding)
+        with self.lock:
+            self.encodings['request:' + encoding] += 1
+        try:
+            return compression.decode(encoding, raw_body)
+        except zlib.error:
+            raise HTTPError(400, 'Bad Request', 'Malformed gzip body')
+
+    def memory_transport(self):
+        """Return a transport calling this server without any network."""
+        return transports.MemoryTransport(self.respond)
+
+    def _dispatch(self, request):
+        if request.path in ('', '/') and request.method == 'GET':
+            return self.list_versions(request)
+        allowed = False
+        for route in self.routes:
+            match = route.pattern.match(request.path)
+            if not match:
+                continue
+            if route.method != request.method:
+                allowed = True
+                continue
+            with self.lock:
+                self._apply_transitions()
+                return route.handler(request, *match.groups())
+        if allowed:
+            raise HTTPError(405, 'Method Not Allowed')
+        raise HTTPError(404, 'Not Found',
+                        'The resource could not be found.')
+
+    # Helpers
+
+    def _next_url(self, request, last, limit):
+        query = {'limit': limit, 'marker': last['uuid']}
+        for key in ('sort_key', 'sort_dir'):
+            if _query(request, key):
+                query[key] = _query(request, key)
+        return 'http://%s:%s%s?%s' % (self.host, self.port,
+                                      request.path.rstrip('/'),
+                                      parse.urlencode(query))
+
+    def _paginate(self, request, collection, name, filters=()):
+        resources = list(collection.values())
+        for key in filters:
+            value = _query(request, key)
+            if value is not None:
+                resources = [r for r in resources
+                             if str(r.get(key)) == value]
+        sort_key = _query(request, 'sort_key')
+        if sort_key:
+            resources.sort(key=lambda r: str(r.get(sort_key)),
+                           reverse=_query(request, 'sort_dir') == 'desc')
+        marker = _query(request, 'marker')
+        if marker:
+            uuids = [r['uuid'] for r in resources]
+            if marker not in uuids:
+                raise HTTPError(400, 'Bad Request',
+                                'Marker %s not found' % marker)
+            resources = resources[uuids.index(marker) + 1:]
+        try:
+            limit = min(int(_query(request, 'limit', self.max_limit)),
+                        self.max_limit)
+        except ValueError:
+            raise HTTPError(400, 'Bad Request', 'Invalid limit')
+        page = resources[:limit]
+        body = {name: page}
+        # Like zun-api, link to a next page whenever this one is full
+        if page and len(page) == limit:
+            body['next'] = self._next_url(request, page[-1], limit)
+        return 200, body
+
+    def _find(self, collection, id, kind):
+        if id in collection:
+            return collection[id]
+        matches = [r for r in collection.values() if r.get('name') == id]
+        if len(matches) > 1:
+            raise HTTPError(409, 'Conflict',
+                            'Multiple %ss exist with same name. Please use '
+                            'the %s uuid instead.' % (kind, kind))
+        if not matches:
+            raise HTTPError(404, 'Not Found',
+                            '%s %s could not be found.' % (kind.capitalize(),
+                                                           id))
+        return matches[0]
+
+    def _transition(self, resource, transient, final, task_state=None):
+        """Move a resource to final, through transient if delayed."""
+        if self.transition_delay and transient:
+            resource['status'] = transient
+            resource['task_state'] = task_state
+            resource['_pending'] = (time.monotonic() + self.transition_delay,
+                                    final)
+        else:
+            resource.pop('_pending', None)
+            resource['task_state'] = None
+            if final is None:
+                resource['_deleted'] = True
+            else:
+                resource['status'] = final
+
+    def _apply_transitions(self):
+        now = time.monotonic()
+        for collection in (self.containers, self.capsules):
+            for key, resource in list(collection.items()):
+                pending = resource.get('_pending')
+                if pending and pending[0] <= now:
+                    del resource['_pending']
+                    resource['task_state'] = None
+                    if pending[1] is None:
+                        resource['_deleted'] = True
+                    else:
+                        resource['status'] = pending[1]
+                if resource.get('_deleted'):
+                    del collection[key]
+
+    @staticmethod
+    def _public(resource):
+        return dict((k, v) for k, v in resource.items()
+                    if not k.startswith('_'))
+
+    def _public_list(self, status, body, name):
+        body[name] = [self._public(r) for r in body[name]]
+        return status, body
+
+    def list_versions(self, request):
+        return 200, {'versions': [{
+            'id': 'v1', 'status': 'CURRENT',
+            'min_version': self.min_version.get_string(),
+            'max_version': self.max_version.get_string(),
+            'links': [{'href': self.url + '/', 'rel': 'self'}]}]}
+
+    # Containers
+
+    def add_container(self, **kwargs):
+        """Add a container directly to the store and return it."""
+        container = {
+            'uuid': str(uuid.uuid4()),
+            'name': 'container-%d' % (len(self.containers) + 1),
+            'image': 'cirros',
+            'command': [],
+            'cpu': 1.0,
+            'memory': '512M',
+            'status': 'Created',
+            'status_reason': None,
+            'task_state': None,
+            'host': HOSTNAME,
+            'labels': {},
+            'addresses': {},
+            'ports': [],
+            'interactive': False,
+            'tty': False,
+            'auto_remove': False,
+            'project_id': 'fake-project',
+            'user_id': 'fake-user',
+        }
+        container.update(kwargs)
+        with self.lock:
+            self.containers[container['uuid']] = container
+        return container
+
+    def list_containers(self, request):
+        return self._public_list(*self._paginate(
+            request, self.containers, 'containers',
+            filters=('name', 'image', 'status', 'host', 'project_id',
+                     'user_id', 'task_state')), name='containers')
+
+    def create_container(self, request):
+        body = request.body or {}
+        if not body.get('image'):
+            raise HTTPError(400, 'Bad Request', "'image' is a required "
+                                                "property")
+        if body.get('name') and any(c['name'] == body['name']
+                                    for c in self.containers.values()):
+            raise HTTPError(409, 'Conflict', 'A container with name %s '
+                                             'already exists.' % body['name'])
+        kwargs = dict((k, v) for k, v in body.items()
+                      if not k.startswith('_'))
+        kwargs['status'] = 'Creating'
+        kwargs['task_state'] = 'container_creating'
+        container = self.add_container(**kwargs)
+        run = _query(request, 'run', 'false').lower() == 'true'
+        self._transition(container, 'Creating',
+                         'Running' if run else 'Created',
+                         'container_creating')
+        return 202, self._public(container)
+
+    def show_container(self, request, id):
+        return 200, self._public(self._find(self.containers, id,
+                                            'container'))
+
+    def update_container(self, request, id):
+        container = self._find(self.containers, id, 'container')
+        for key, value in (request.body or {}).items():
+            if key in ('cpu', 'memory', 'name', 'auto_heal'):
+                container[key] = value
+        return 200, self._public(container)
+
+    def delete_container(self, request, id):
+        container = self._find(self.containers, id, 'container')
+        force = _query(request, 'force', 'False').lower() == 'true'
+        stop = _query(request, 'stop', 'False').lower() == 'true'
+        if (container['status'] in ('Running', 'Paused') and
+                not (force or stop)):
+            raise HTTPError(409, 'Conflict',
+                            'Cannot delete container %s in %s state' %
+                            (container['uuid'], container['status']))
+        self._transition(container, 'Deleting', None)
+        self._apply_transitions()
+        return 204, None
+
+    def container_action(self, request, id, action):
+        container = self._find(self.containers, id, 'container')
+        final, task_state = ACTION_STATUS[action]
+        if final is None:
+            final = container['status']
+            if 'image' in (request.body or {}):
+                container['image'] = request.body['image']
+            image = _query(request, 'image')
+            if image:
+                container['image'] = image
+            transient = 'Rebuilding'
+        else:
+            transient = container['status']
+        self._transition(container, transient, final, task_state)
+        return 202, None
+
+    def rename_container(self, request, id):
+        container = self._find(self.containers, id, 'container')
+        container['name'] = _query(request, 'name')
+        return 200, self._public(container)
+
+    def attach_container(self, request, id):
+        container = self._find(self.containers, id, 'container')
+        if container['status'] != 'Running':
+            raise HTTPError(409, 'Conflict',
+                            'Cannot attach to container %s in %s state' %
+                            (container['uuid'], container['status']))
+        return 200, '%s?token=%s' % (self.ws_server.url, container['uuid'])
+
+    def resize_container(self, request, id):
+        self._find(self.containers, id, 'container')
+        return 200, None
+
+    def execute_container(self, request, id):
+        container = self._find(self.containers, id, 'container')
+        if container['status'] != 'Running':
+            raise HTTPError(409, 'Conflict',
+                            'Cannot execute in container %s in %s state' %
+                            (container['uuid'], container['status']))
+        command = _query(request, 'command', '')
+        if _query(request, 'interactive', 'false').lower() == 'true':
+            exec_id = uuid.uuid4().hex
+            return 200, {'exec_id': exec_id,
+                         'proxy_url': '%s?token=%s&exec_id=%s' % (
+                             self.ws_server.url, container['uuid'],
+                             exec_id)}
+        return 200, {'output': command, 'exit_code': 0}
+
+    def container_logs(self, request, id):
+        container = self._find(self.containers, id, 'container')
+        return 200, 'log of %s\n' % container['name']
+
+    # Images
+
+    def add_image(self, **kwargs):
+        image = {'uuid': str(uuid.uuid4()), 'image_id': uuid.uuid4().hex,
+                 'repo': 'cirros', 'tag': 'latest', 'size': '12345',
+                 'host': HOSTNAME}
+        image.update(kwargs)
+        with self.lock:
+            self.images[image['uuid']] = image
+        return image
+
+    def list_images(self, request):
+        return self._paginate(request, self.images, 'images',
+                              filters=('repo', 'tag', 'host'))
+
+    def create_image(self, request):
+        body = request.body or {}
+        if not body.get('repo'):
+            raise HTTPError(400, 'Bad Request', "'repo' is a required "
+                                                "property")
+        repo, _, tag = body['repo'].partition(':')
+        image = self.add_image(repo=repo, tag=body.get('tag') or tag or
+                               'latest', host=body.get('host', HOSTNAME))
+        return 202, image
+
+    def show_image(self, request, id):
+        return 200, self._find(self.images, id, 'image')
+
+    def delete_image(self, request, id):
+        image = self._find(self.images, id, 'image')
+        del self.images[image['uuid']]
+        return 204, None
+
+    # Hosts
+
+    def add_host(self, hostname, **kwargs):
+        host = {'uuid': str(uuid.uuid4()), 'hostname': hostname,
+                'mem_total': 16384, 'mem_used': 0, 'cpus': 8,
+                'cpu_used': 0.0, 'disk_total': 200, 'disk_used': 0,
+                'os': 'Linux', 'os_type': 'linux', 'kernel_version': '5.15',
+                'labels': {}, 'total_containers': 0}
+        host.update(kwargs)
+        with self.lock:
+            self.hosts[host['uuid']] = host
+        return host
+
+    def list_hosts(self, request):
+        return self._paginate(request, self.hosts, 'hosts')
+
+    def show_host(self, request, id):
+        if id in self.hosts:
+            return 200, self.hosts[id]
+        for host in self.hosts.values():
+            if host['hostname'] == id:
+                return 200, host
+        raise HTTPError(404, 'Not Found', 'Host %s could not be found.' % id)
+
+    # Capsules
+
+    def list_capsules(self, request):
+        return self._public_list(*self._paginate(
+            request, self.capsules, 'capsules'), name='capsules')
+
+    def create_capsule(self, request):
+        template = (request.body or {}).get('template')
+        if not template:
+            raise HTTPError(400, 'Bad Request', "'template' is a required "
+                                                "property")
+        metadata = template.get('metadata', {})
+        containers = template.get('spec', {}).get('containers', [])
+        capsule = {'uuid': str(uuid.uuid4()),
+                   'name': metadata.get('name') or
+                   'capsule-%d' % (len(self.capsules) + 1),
+                   'labels': metadata.get('labels', {}),
+                   'status': 'Creating', 'task_state': None,
+                   'addresses': {}, 'host': HOSTNAME,
+                   'containers': [{'uuid': str(uuid.uuid4()),
+                                   'image': c.get('image')}
+                                  for c in containers]}
+        self.capsules[capsule['uuid']] = capsule
+        self._transition(capsule, 'Creating', 'Running')
+        return 202, self._public(capsule)
+
+    def show_capsule(self, request, id):
+        return 200, self._public(self._find(self.capsules, id, 'capsule'))
+
+    def delete_capsule(self, request, id):
+        capsule = self._find(self.capsules, id, 'capsule')
+        self._transition(capsule, 'Deleting', None)
+        self._apply_transitions()
+        return 204, None
+
+    @staticmethod
+    def _idle_handler(conn):
+        while conn.recv_frame()[0] != wsserver.OPCODE_CLOSE:
+            pass
+
+
+def _error_body(error):
+    return {'errors': [{'status': error.status, 'code': '',
+                        'title': error.title, 'detail': error.detail}]}
+
+
+def _make_handler(fake, tcp=True):
+
+    class Handler(http_server.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # Headers and body are written separately, do not let Nagle's
+        # algorithm hold the body back until the client acknowledges
+        disable_nagle_algorithm = tcp
+
+        def _handle(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            raw_body = self.rfile.read(length) if length else None
+            status, headers, data = fake.respond(self.command, self.path,
+                                                 self.headers, raw_body)
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        do_GET = do_POST = do_PATCH = do_PUT = do_DELETE = _handle
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
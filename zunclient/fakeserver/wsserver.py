@@ -0,0 +1,144 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""A minimal RFC 6455 websocket server for benchmarks and the fake API."""
+
+import socket
+import struct
+import threading
+
+from zunclient.common.websocketclient import framing
+
+OPCODE_TEXT = framing.OPCODE_TEXT
+OPCODE_BINARY = framing.OPCODE_BINARY
+OPCODE_CLOSE = framing.OPCODE_CLOSE
+OPCODE_PING = framing.OPCODE_PING
+OPCODE_PONG = framing.OPCODE_PONG
+
+
+class Connection(object):
+    """A server side websocket connection."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.rfile = sock.makefile('rb')
+        self.path = None
+
+    def _read_exact(self, size):
+        data = self.rfile.read(size)
+        if len(data) < size:
+            raise EOFError()
+        return data
+
+    def handshake(self):
+        headers = {}
+        request_line = self.rfile.readline().decode('latin-1').split()
+        self.path = request_line[1] if len(request_line) > 1 else '/'
+        while True:
+            line = self.rfile.readline().decode('latin-1').strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        accept = framing.accept_key(headers['sec-websocket-key'])
+        response = ['HTTP/1.1 101 Switching Protocols',
+                    'Upgrade: websocket',
+                    'Connection: Upgrade',
+                    'Sec-WebSocket-Accept: %s' % accept]
+        protocols = headers.get('sec-websocket-protocol')
+        if protocols:
+            response.append('Sec-WebSocket-Protocol: %s'
+                            % protocols.split(',')[0].strip())
+        self.sock.sendall(('\r\n'.join(response) + '\r\n\r\n').encode())
+        return headers
+
+    def recv_frame(self):
+        """Return the (opcode, payload) of the next frame."""
+        _, opcode, masked, length = framing.parse_header(
+            self._read_exact(2))
+        if length in framing.EXTENDED_LENGTH:
+            fmt = framing.EXTENDED_LENGTH[length]
+            length = struct.unpack(fmt,
+                                   self._read_exact(struct.calcsize(fmt)))[0]
+        key = self._read_exact(4) if masked else None
+        payload = self._read_exact(length)
+        if key:
+            payload = framing.apply_mask(payload, key)
+        return opcode, payload
+
+    def send_frame(self, opcode, payload):
+        self.sock.sendall(framing.encode_frame(opcode, payload))
+
+    def close(self):
+        try:
+            self.send_frame(OPCODE_CLOSE, framing.CLOSE_NORMAL)
+        except OSError:
+            pass
+        self.rfile.close()
+        self.sock.close()
+
+
+def echo_handler(conn):
+    """Echo every data frame back to the client."""
+    while True:
+        opcode, payload = conn.recv_frame()
+        if opcode == OPCODE_CLOSE:
+            return
+        if opcode == OPCODE_PING:
+            conn.send_frame(OPCODE_PONG, payload)
+        elif opcode in (OPCODE_TEXT, OPCODE_BINARY):
+            conn.send_frame(opcode, payload)
+
+
+class WebSocketServer(object):
+    """Serve websocket connections with handler on a local port."""
+
+    def __init__(self, handler=echo_handler, host='127.0.0.1', port=0):
+        self.handler = handler
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, port))
+        self.sock.listen(128)
+        self.host, self.port = self.sock.getsockname()[:2]
+
+    @property
+    def url(self):
+        return 'ws://%s:%s/' % (self.host, self.port)
+
+    def start(self):
+        thread = threading.Thread(target=self._serve)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self.sock.close()
+
+    def _serve(self):
+        while True:
+            try:
+                client, _ = self.sock.accept()
+            except OSError:
+                return
+            thread = threading.Thread(target=self._handle, args=(client,))
+            thread.daemon = True
+            thread.start()
+
+    def _handle(self, client):
+        conn = Connection(client)
+        try:
+            conn.handshake()
+            self.handler(conn)
+        except (EOFError, OSError):
+            pass
+        finally:
+            conn.close()
@@ -15,6 +15,7 @@ from contextlib import closing
 import io
 import os
 from oslo_log import log as logging
+import sys
 import tarfile
 import time
 
@@ -22,10 +23,12 @@ from osc_lib.command import command
 from osc_lib import utils
 
 from zunclient.common import utils as zun_utils
+from zunclient.common import waiter
 from zunclient.common.websocketclient import exceptions
 from zunclient.common.websocketclient import websocketclient
 from zunclient import exceptions as exc
 from zunclient.i18n import _
+from zunclient.v1 import containers as containers_api
 
 
 def _container_columns(container):
@@ -37,10 +40,49 @@ def _get_client(obj, parsed_args):
     return obj.app.client_manager.container
 
 
+def _add_concurrency_argument(parser):
+    args, kwargs = zun_utils.concurrency_arg(containers_api.BULK_CONCURRENCY)
+    parser.add_argument(*args, **kwargs)
+
+
 def _action_columns(action):
     return action._info.keys()
 
 
+def _wait_for_containers(client, containers, success_status, message,
+                         all_projects=False):
+    """Wait for containers to reach a status, or to be deleted.
+
+    The names are resolved to uuids once, then every poll lists the
+    containers once and matches them by uuid. The outcome of each is
+    printed with message. Exit if any of them failed.
+    """
+    opts = {'all_projects': True} if all_projects else {}
+    uuids = {}
+    for container in containers:
+        try:
+            uuids[container] = client.containers.get(container, **opts).uuid
+        except exc.NotFound:
+            # Deleted already, or gone before it could be waited for
+            uuids[container] = None
+    done, failed = waiter.Waiter().wait_for_all(
+        lambda: client.containers.list_all(all_projects=all_projects),
+        [uuid for uuid in uuids.values() if uuid is not None],
+        success_status)
+    any_failed = False
+    for container in containers:
+        uuid = uuids[container]
+        if uuid is None:
+            ok = success_status is None
+        else:
+            ok = uuid in done
+        any_failed = any_failed or not ok
+        print(message % {'container': container,
+                         'result': 'success' if ok else 'failed'})
+    if any_failed:
+        raise SystemExit
+
+
 class CreateContainer(command.ShowOne):
     """Create a container"""
 
@@ -275,13 +317,10 @@ class CreateContainer(command.ShowOne):
         container = client.containers.create(**opts)
         if parsed_args.wait:
             container_uuid = getattr(container, 'uuid', None)
-            if utils.wait_for_status(
-                client.containers.get,
-                container_uuid,
-                success_status=['created'],
-            ):
-                container = client.containers.get(container_uuid)
-            else:
+            try:
+                container = waiter.Waiter().wait_for_status(
+                    client.containers.get, container_uuid, ['Created'])
+            except (exc.ResourceInErrorState, exc.WaitTimeout):
                 print('Failed to create container.\n')
                 raise SystemExit
         columns = _container_columns(container)
@@ -444,37 +483,27 @@ class DeleteContainer(command.Command):
             '--wait',
             action='store_true',
             help='Wait for create to complete')
+        _add_concurrency_argument(parser)
         return parser
 
     def take_action(self, parsed_args):
         client = _get_client(self, parsed_args)
-        containers = parsed_args.container
-        for container in containers:
-            opts = {}
-            opts['id'] = container
-            opts['force'] = parsed_args.force
-            opts['stop'] = parsed_args.stop
-            opts['all_projects'] = parsed_args.all_projects
-            opts = zun_utils.remove_null_parms(**opts)
-            try:
-                client.containers.delete(**opts)
-                print(_('Request to delete container %s has been accepted.')
-                      % container)
-                if parsed_args.wait:
-                    if utils.wait_for_delete(
-                        client.containers,
-                        container,
-                        timeout=30
-                    ):
-                        print("Delete for container %(container)s success." %
-                              {'container': container})
-                    else:
-                        print("Delete for container %(container)s failed." %
-                              {'container': container})
-                        raise SystemExit
-            except Exception as e:
-                print("Delete for container %(container)s failed: %(e)s" %
-                      {'container': container, 'e': e})
+        opts = {}
+        opts['force'] = parsed_args.force
+        opts['stop'] = parsed_args.stop
+        opts['all_projects'] = parsed_args.all_projects
+        opts = zun_utils.remove_null_parms(**opts)
+        results = client.containers.bulk(
+            'delete', parsed_args.container,
+            concurrency=parsed_args.concurrency, **opts)
+        accepted = zun_utils.print_bulk_results(
+            results, _('Request to delete container %s has been accepted.'),
+            "Delete for container %(container)s failed: %(e)s")
+        if parsed_args.wait and accepted:
+            _wait_for_containers(
+                client, accepted, None,
+                "Delete for container %(container)s %(result)s.",
+                all_projects=parsed_args.all_projects)
 
 
 class RestartContainer(command.Command):
@@ -493,19 +522,18 @@ class RestartContainer(command.Command):
             metavar='<timeout>',
             default=10,
             help='Seconds to wait for stop before restarting (container)s')
+        _add_concurrency_argument(parser)
         return parser
 
     def take_action(self, parsed_args):
         client = _get_client(self, parsed_args)
-        containers = parsed_args.container
-        for container in containers:
-            try:
-                client.containers.restart(container, parsed_args.timeout)
-                print(_('Request to restart container %s has been accepted')
-                      % container)
-            except Exception as e:
-                print("Restart for container %(container)s failed: %(e)s" %
-                      {'container': container, 'e': e})
+        results = client.containers.bulk(
+            'restart', parsed_args.container,
+            concurrency=parsed_args.concurrency,
+            timeout=parsed_args.timeout)
+        zun_utils.print_bulk_results(
+            results, _('Request to restart container %s has been accepted'),
+            "Restart for container %(container)s failed: %(e)s")
 
 
 class StartContainer(command.Command):
@@ -519,19 +547,17 @@ class StartContainer(command.Command):
             metavar='<container>',
             nargs='+',
             help='ID or name of the (container)s to start.')
+        _add_concurrency_argument(parser)
         return parser
 
     def take_action(self, parsed_args):
         client = _get_client(self, parsed_args)
-        containers = parsed_args.container
-        for container in containers:
-            try:
-                client.containers.start(container)
-                print(_('Request to start container %s has been accepted')
-                      % container)
-            except Exception as e:
-                print("Start for container %(container)s failed: %(e)s" %
-                      {'container': container, 'e': e})
+        results = client.containers.bulk(
+            'start', parsed_args.container,
+            concurrency=parsed_args.concurrency)
+        zun_utils.print_bulk_results(
+            results, _('Request to start container %s has been accepted'),
+            "Start for container %(container)s failed: %(e)s")
 
 
 class PauseContainer(command.Command):
@@ -545,19 +571,17 @@ class PauseContainer(command.Command):
             metavar='<container>',
             nargs='+',
             help='ID or name of the (container)s to pause.')
+        _add_concurrency_argument(parser)
         return parser
 
     def take_action(self, parsed_args):
         client = _get_client(self, parsed_args)
-        containers = parsed_args.container
-        for container in containers:
-            try:
-                client.containers.pause(container)
-                print(_('Request to pause container %s has been accepted')
-                      % container)
-            except Exception as e:
-                print("Pause for container %(container)s failed: %(e)s" %
-                      {'container': container, 'e': e})
+        results = client.containers.bulk(
+            'pause', parsed_args.container,
+            concurrency=parsed_args.concurrency)
+        zun_utils.print_bulk_results(
+            results, _('Request to pause container %s has been accepted'),
+            "Pause for container %(container)s failed: %(e)s")
 
 
 class UnpauseContainer(command.Command):
@@ -571,19 +595,17 @@ class UnpauseContainer(command.Command):
             metavar='<container>',
             nargs='+',
             help='ID or name of the (container)s to unpause.')
+        _add_concurrency_argument(parser)
         return parser
 
     def take_action(self, parsed_args):
         client = _get_client(self, parsed_args)
-        containers = parsed_args.container
-        for container in containers:
-            try:
-                client.containers.unpause(container)
-                print(_('Request to unpause container %s has been accepted')
-                      % container)
-            except Exception as e:
-                print("unpause for container %(container)s failed: %(e)s" %
-                      {'container': container, 'e': e})
+        results = client.containers.bulk(
+            'unpause', parsed_args.container,
+            concurrency=parsed_args.concurrency)
+        zun_utils.print_bulk_results(
+            results, _('Request to unpause container %s has been accepted'),
+            "unpause for container %(container)s failed: %(e)s")
 
 
 class ExecContainer(command.Command):
@@ -607,13 +629,44 @@ class ExecContainer(command.Command):
             action='store_true',
             default=False,
             help='Keep STDIN open and allocate a pseudo-TTY for interactive')
+        parser.add_argument(
+            '--stream',
+            dest='stream',
+            action='store_true',
+            default=False,
+            help='Stream the output of the command as it is produced, '
+                 'sending it STDIN when it is not a terminal. stdout and '
+                 'stderr are merged. The image must provide sh and stty, '
+                 'and sed and base64 to send STDIN.')
+        parser.add_argument(
+            '--record',
+            metavar='<file>',
+            help='Record the interactive session to <file> in the asciicast '
+                 'v2 format.')
+        parser.add_argument(
+            '--record-input',
+            action='store_true',
+            default=False,
+            help='Also record the input typed in the session, passwords '
+                 'included. Requires --record.')
         return parser
 
     def take_action(self, parsed_args):
         client = _get_client(self, parsed_args)
         container = parsed_args.container
+        if parsed_args.record_input and not parsed_args.record:
+            raise exc.CommandError("--record-input requires --record")
         opts = {}
         opts['command'] = zun_utils.parse_command(parsed_args.command)
+        if parsed_args.stream:
+            if parsed_args.interactive:
+                raise exc.CommandError("--stream and --interactive are "
+                                       "mutually exclusive")
+            stdin = None if sys.stdin.isatty() else sys.stdin.buffer
+            stream = client.containers.execute_stream(
+                container, opts['command'], stdin=stdin)
+            zun_utils.write_stream(stream, output=sys.stdout.buffer)
+            return stream.exit_code
         if parsed_args.interactive:
             opts['interactive'] = True
             opts['run'] = False
@@ -621,7 +674,9 @@ class ExecContainer(command.Command):
         if parsed_args.interactive:
             exec_id = response['exec_id']
             url = response['proxy_url']
-            websocketclient.do_exec(client, url, container, exec_id, "~", 0.5)
+            websocketclient.do_exec(client, url, container, exec_id, "~",
+                                    0.5, record=parsed_args.record,
+                                    record_input=parsed_args.record_input)
         else:
             output = response['output']
             exit_code = response['exit_code']
@@ -636,9 +691,17 @@ class LogsContainer(command.Command):
     def get_parser(self, prog_name):
         parser = super(LogsContainer, self).get_parser(prog_name)
         parser.add_argument(
-            'container',
+            'containers',
             metavar='<container>',
-            help='ID or name of the container to get logs for.')
+            nargs='*',
+            help='ID or name of the container(s) to get logs for. The logs '
+                 'of several containers are interleaved by timestamp.')
+        parser.add_argument(
+            '--label',
+            metavar='<KEY=VALUE>',
+            action='append', default=[],
+            help='Get the logs of all the containers with this label. '
+                 'May be used multiple times.')
         parser.add_argument(
             '--stdout',
             action='store_true',
@@ -664,18 +727,48 @@ class LogsContainer(command.Command):
             metavar='<tail>',
             default='all',
             help='Number of lines to show from the end of the logs.')
+        parser.add_argument(
+            '--follow',
+            action='store_true',
+            default=False,
+            help='Follow log output.')
         return parser
 
     def take_action(self, parsed_args):
         client = _get_client(self, parsed_args)
         opts = {}
-        opts['id'] = parsed_args.container
         opts['stdout'] = parsed_args.stdout
         opts['stderr'] = parsed_args.stderr
         opts['since'] = parsed_args.since
         opts['timestamps'] = parsed_args.timestamps
         opts['tail'] = parsed_args.tail
         opts = zun_utils.remove_null_parms(**opts)
+        if not parsed_args.containers and not parsed_args.label:
+            raise exc.CommandError(
+                "the following arguments are required: <container> (or "
+                "--label)")
+        if parsed_args.label or len(parsed_args.containers) != 1:
+            if parsed_args.follow:
+                raise exc.CommandError(
+                    "--follow requires a single container")
+            ids = list(parsed_args.containers)
+            prefixes = {}
+            if parsed_args.label:
+                labels = zun_utils.format_args(parsed_args.label)
+                for container in zun_utils.filter_by_labels(
+                        client.containers.list_all(), labels):
+                    ids.append(container.uuid)
+                    prefixes[container.uuid] = (container.name or
+                                                container.uuid)
+            if not ids:
+                raise exc.CommandError("No container matches the request")
+            sys.stdout.writelines(client.containers.merged_logs(
+                ids, prefixes=prefixes, **opts))
+            return
+        opts['id'] = parsed_args.containers[0]
+        if parsed_args.follow:
+            zun_utils.write_stream(client.containers.stream_logs(**opts))
+            return
         logs = client.containers.logs(**opts)
         print(logs)
 
@@ -696,22 +789,21 @@ class KillContainer(command.Command):
             metavar='<signal>',
             default=None,
             help='The signal to kill')
+        _add_concurrency_argument(parser)
         return parser
 
     def take_action(self, parsed_args):
         client = _get_client(self, parsed_args)
-        for container in parsed_args.containers:
-            opts = {}
-            opts['id'] = container
-            opts['signal'] = parsed_args.signal
-            opts = zun_utils.remove_null_parms(**opts)
-            try:
-                client.containers.kill(**opts)
-                print(_('Request to send kill signal to container %s has '
-                        'been accepted') % container)
-            except Exception as e:
-                print("kill signal for container %(container)s failed: %(e)s" %
-                      {'container': container, 'e': e})
+        opts = {}
+        opts['signal'] = parsed_args.signal
+        opts = zun_utils.remove_null_parms(**opts)
+        results = client.containers.bulk(
+            'kill', parsed_args.containers,
+            concurrency=parsed_args.concurrency, **opts)
+        zun_utils.print_bulk_results(
+            results, _('Request to send kill signal to container %s has '
+                       'been accepted'),
+            "kill signal for container %(container)s failed: %(e)s")
 
 
 class StopContainer(command.Command):
@@ -731,19 +823,18 @@ class StopContainer(command.Command):
             metavar='<timeout>',
             default=10,
             help='Seconds to wait for stop before killing (container)s')
+        _add_concurrency_argument(parser)
         return parser
 
     def take_action(self, parsed_args):
         client = _get_client(self, parsed_args)
-        containers = parsed_args.container
-        for container in containers:
-            try:
-                client.containers.stop(container, parsed_args.timeout)
-                print(_('Request to stop container %s has been accepted.')
-                      % container)
-            except Exception as e:
-                print("Stop for container %(container)s failed: %(e)s" %
-                      {'container': container, 'e': e})
+        results = client.containers.bulk(
+            'stop', parsed_args.container,
+            concurrency=parsed_args.concurrency,
+            timeout=parsed_args.timeout)
+        zun_utils.print_bulk_results(
+            results, _('Request to stop container %s has been accepted.'),
+            "Stop for container %(container)s failed: %(e)s")
 
 
 class RunContainer(command.ShowOne):
@@ -977,37 +1068,28 @@ class RunContainer(command.ShowOne):
                 zun_utils.parse_health(parsed_args.healthcheck)
 
         opts = zun_utils.remove_null_parms(**opts)
+        started = time.monotonic()
         container = client.containers.run(**opts)
         columns = _container_columns(container)
         container_uuid = getattr(container, 'uuid', None)
         if parsed_args.wait:
-            if utils.wait_for_status(
-                client.containers.get,
-                container_uuid,
-                success_status=['running'],
-            ):
-                container = client.containers.get(container_uuid)
-            else:
+            try:
+                container = waiter.Waiter().wait_for_status(
+                    client.containers.get, container_uuid, ['Running'])
+            except (exc.ResourceInErrorState, exc.WaitTimeout):
                 print('Failed to run container.\n')
                 raise SystemExit
 
         if parsed_args.interactive:
-            ready_for_attach = False
-            while True:
-                container = client.containers.get(container_uuid)
-                if zun_utils.check_container_status(container, 'Running'):
-                    ready_for_attach = True
-                    break
-                if zun_utils.check_container_status(container, 'Error'):
-                    break
-                print("Waiting for container start")
-                time.sleep(1)
-            if ready_for_attach is True:
-                response = client.containers.attach(container_uuid)
-                websocketclient.do_attach(client, response, container_uuid,
-                                          "~", 0.5)
-            else:
+            try:
+                waiter.Waiter(max_interval=1).wait_for_status(
+                    client.containers.get, container_uuid, ['Running'],
+                    on_wait=lambda: print("Waiting for container start"))
+            except exc.ResourceInErrorState:
                 raise exceptions.InvalidWebSocketLink(container_uuid)
+            response = client.containers.attach(container_uuid)
+            websocketclient.do_attach(client, response, container_uuid,
+                                      "~", 0.5, started=started)
 
         return columns, utils.get_item_properties(container, columns)
 
@@ -1105,23 +1187,52 @@ class UpdateContainer(command.ShowOne):
 
 
 class AttachContainer(command.Command):
-    """Attach to a running container"""
+    """Attach to one or more running container(s)"""
 
     log = logging.getLogger(__name__ + ".AttachContainer")
 
     def get_parser(self, prog_name):
         parser = super(AttachContainer, self).get_parser(prog_name)
         parser.add_argument(
-            'container',
+            'containers',
             metavar='<container>',
-            help='ID or name of the container to be attached to.')
+            nargs='+',
+            help='ID or name of the container(s) to be attached to. The '
+                 'output of several containers is prefixed by their name.')
+        parser.add_argument(
+            '--broadcast',
+            action='store_true',
+            default=False,
+            help='When attached to several containers, send each line of '
+                 'input to all of them.')
+        parser.add_argument(
+            '--record',
+            metavar='<file>',
+            help='Record the session to <file> in the asciicast v2 format.')
+        parser.add_argument(
+            '--record-input',
+            action='store_true',
+            default=False,
+            help='Also record the input typed in the session, passwords '
+                 'included. Requires --record.')
         return parser
 
     def take_action(self, parsed_args):
         client = _get_client(self, parsed_args)
-        response = client.containers.attach(parsed_args.container)
-        websocketclient.do_attach(client, response, parsed_args.container,
-                                  "~", 0.5)
+        containers = parsed_args.containers
+        if parsed_args.record_input and not parsed_args.record:
+            raise exc.CommandError("--record-input requires --record")
+        if len(containers) == 1:
+            response = client.containers.attach(containers[0])
+            websocketclient.do_attach(client, response, containers[0],
+                                      "~", 0.5, record=parsed_args.record,
+                                      record_input=parsed_args.record_input)
+            return
+        if parsed_args.record:
+            raise exc.CommandError("--record requires a single container")
+        urls = [(c, client.containers.attach(c)) for c in containers]
+        websocketclient.do_attach_many(client, urls, "~", 0.5,
+                                       broadcast=parsed_args.broadcast)
 
 
 class CopyContainer(command.Command):
@@ -1138,37 +1249,58 @@ class CopyContainer(command.Command):
         parser.add_argument(
             'destination',
             metavar='<destination>',
+            nargs='+',
             help='The directory destination where save the source. '
-                 'The format of this parameter is [container:]dest_path.')
+                 'The format of this parameter is [container:]dest_path. '
+                 'When copying between containers, more than one container '
+                 'destination may be given.')
         return parser
 
     def take_action(self, parsed_args):
         client = _get_client(self, parsed_args)
-        if ':' in parsed_args.source:
-            source_parts = parsed_args.source.split(':', 1)
-            container_id = source_parts[0]
-            container_path = source_parts[1]
+        source = zun_utils.parse_container_path(parsed_args.source)
+        destinations = [zun_utils.parse_container_path(dest)
+                        for dest in parsed_args.destination]
+        is_remote_dest = [container is not None
+                          for container, _ in destinations]
+
+        if source[0] is not None and all(is_remote_dest):
+            client.containers.copy_archive(source[0], source[1],
+                                           destinations)
+
+        elif source[0] is not None and destinations == [(None, '-')]:
+            # Stream the tar archive to stdout, e.g. "cp c:/var/log - | tar x"
+            stdout = sys.stdout.buffer
+            for chunk in client.containers.get_archive_stream(*source):
+                stdout.write(chunk)
+            stdout.flush()
+
+        elif source == (None, '-') and len(destinations) == 1 and \
+                is_remote_dest[0]:
+            # Read a tar archive from stdin, e.g. "tar c . | cp - c:/app"
+            dest_id, dest_path = destinations[0]
+            client.containers.put_archive_stream(dest_id, dest_path,
+                                                 sys.stdin.buffer)
+
+        elif len(destinations) == 1 and source[0] is not None:
             opts = {}
-            opts['id'] = container_id
-            opts['path'] = container_path
+            opts['id'] = source[0]
+            opts['path'] = source[1]
 
             res = client.containers.get_archive(**opts)
-            dest_path = parsed_args.destination
+            dest_path = destinations[0][1]
             tardata = io.BytesIO(res['data'])
             with closing(tarfile.open(fileobj=tardata)) as tar:
                 tar.extractall(dest_path)  # nosec
 
-        elif ':' in parsed_args.destination:
-            dest_parts = parsed_args.destination.split(':', 1)
-            container_id = dest_parts[0]
-            container_path = dest_parts[1]
-            filename = os.path.split(parsed_args.source)[1]
+        elif len(destinations) == 1 and is_remote_dest[0]:
+            filename = os.path.split(source[1])[1]
             opts = {}
-            opts['id'] = container_id
-            opts['path'] = container_path
+            opts['id'] = destinations[0][0]
+            opts['path'] = destinations[0][1]
             tardata = io.BytesIO()
             with closing(tarfile.open(fileobj=tardata, mode='w')) as tar:
-                tar.add(parsed_args.source, arcname=filename)
+                tar.add(source[1], arcname=filename)
             opts['data'] = tardata.getvalue()
             client.containers.put_archive(**opts)
         else:
@@ -1176,6 +1308,8 @@ class CopyContainer(command.Command):
             print("Usage:")
             print("openstack appcontainer cp container:src_path dest_path|-")
             print("openstack appcontainer cp src_path|- container:dest_path")
+            print("openstack appcontainer cp container:src_path "
+                  "container:dest_path [container:dest_path ...]")
 
 
 class StatsContainer(command.ShowOne):
@@ -1400,36 +1534,32 @@ class RebuildContainer(command.Command):
             '--wait',
             action='store_true',
             help='Wait for rebuild to complete')
+        parser.add_argument(
+            '--all-projects',
+            action="store_true",
+            default=False,
+            help='Wait for container(s) in all projects by name.')
+        _add_concurrency_argument(parser)
         return parser
 
     def take_action(self, parsed_args):
         client = _get_client(self, parsed_args)
-        for container in parsed_args.containers:
-            opts = {}
-            opts['id'] = container
-            if parsed_args.image:
-                opts['image'] = parsed_args.image
-            if parsed_args.image_driver:
-                opts['image_driver'] = parsed_args.image_driver
-            try:
-                client.containers.rebuild(**opts)
-                print(_('Request to rebuild container %s has '
-                        'been accepted') % container)
-                if parsed_args.wait:
-                    if utils.wait_for_status(
-                        client.containers.get,
-                        container,
-                        success_status=['created', 'running'],
-                    ):
-                        print("rebuild container %(container)s success." %
-                              {'container': container})
-                    else:
-                        print("rebuild container %(container)s failed." %
-                              {'container': container})
-                        raise SystemExit
-            except Exception as e:
-                print("rebuild container %(container)s failed: %(e)s" %
-                      {'container': container, 'e': e})
+        opts = {}
+        if parsed_args.image:
+            opts['image'] = parsed_args.image
+        if parsed_args.image_driver:
+            opts['image_driver'] = parsed_args.image_driver
+        results = client.containers.bulk(
+            'rebuild', parsed_args.containers,
+            concurrency=parsed_args.concurrency, **opts)
+        accepted = zun_utils.print_bulk_results(
+            results, _('Request to rebuild container %s has been accepted'),
+            "rebuild container %(container)s failed: %(e)s")
+        if parsed_args.wait and accepted:
+            _wait_for_containers(
+                client, accepted, ['Created', 'Running'],
+                "rebuild container %(container)s %(result)s.",
+                all_projects=parsed_args.all_projects)
 
 
 class NetworkList(command.Lister):
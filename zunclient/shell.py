@@ -34,7 +34,9 @@ from oslo_utils import strutils
 from zunclient import api_versions
 from zunclient import client as base_client
 from zunclient.common.apiclient import auth
+from zunclient.common import cassette
 from zunclient.common import cliutils
+from zunclient.common import transports
 from zunclient import exceptions as exc
 from zunclient.i18n import _
 from zunclient.v1 import shell as shell_v1
@@ -372,6 +374,37 @@ class OpenStackZunShell(object):
                             action='store_true',
                             help="Do not verify https connections")
 
+        parser.add_argument('--transport',
+                            metavar='<transport>',
+                            default=cliutils.env('ZUN_TRANSPORT',
+                                                 default=None),
+                            help='Send the requests with this transport: '
+                                 'requests (default), http.client, http2 '
+                                 'to multiplex them on one connection, or '
+                                 'unix:<path> for a local API proxy on a '
+                                 'Unix socket. '
+                                 'Defaults to env[ZUN_TRANSPORT].')
+
+        cassette_group = parser.add_mutually_exclusive_group()
+        cassette_group.add_argument(
+            '--record-cassette',
+            metavar='<file>',
+            help='Record the requests and responses of the command, with '
+                 'their timings and redacted tokens, to a cassette file, '
+                 'gzipped if its name ends with .gz.')
+        cassette_group.add_argument(
+            '--replay-cassette',
+            metavar='<file>',
+            help='Answer the requests of the command from a cassette file '
+                 'recorded with --record-cassette, without any network.')
+        parser.add_argument('--replay-speed',
+                            metavar='<speed>',
+                            type=float,
+                            help='With --replay-cassette, wait for the '
+                                 'recorded server time divided by <speed>, '
+                                 'e.g. 1 to replay at the recorded speed. '
+                                 'By default answers come at once.')
+
         if profiler:
             parser.add_argument('--profile',
                                 metavar='HMAC_KEY',
@@ -549,6 +582,10 @@ class OpenStackZunShell(object):
             self.do_bash_completion(args)
             return 0
 
+        if args.replay_speed is not None and not args.replay_cassette:
+            raise exc.CommandError(
+                '--replay-speed requires --replay-cassette')
+
         (os_username, os_project_name, os_project_id,
          os_user_domain_id, os_user_domain_name,
          os_project_domain_id, os_project_domain_name,
@@ -637,6 +674,19 @@ class OpenStackZunShell(object):
 
         client = base_client
 
+        kwargs = {}
+        if args.transport:
+            kwargs['transport'] = transports.get_transport(args.transport)
+        tape = None
+        if args.record_cassette:
+            tape = cassette.Cassette(args.record_cassette, mode='record')
+        elif args.replay_cassette:
+            tape = cassette.Cassette(args.replay_cassette, mode='replay',
+                                     speed=args.replay_speed)
+        if tape:
+            kwargs['transport'] = cassette.CassetteAdapter(
+                tape, kwargs.get('transport'))
+
         if not do_help:
             if api_version.is_latest():
                 # This client is just used to discover api version.
@@ -658,7 +708,8 @@ class OpenStackZunShell(object):
                     endpoint_override=bypass_url,
                     interface=endpoint_type,
                     insecure=insecure,
-                    cacert=os_cacert)
+                    cacert=os_cacert,
+                    **kwargs)
                 api_version = api_versions.discover_version(self.cs,
                                                             api_version)
 
@@ -673,7 +724,6 @@ class OpenStackZunShell(object):
                         "max": max_version.get_string()}
                 )
 
-        kwargs = {}
         if profiler:
             kwargs["profile"] = args.profile
 
@@ -697,12 +747,17 @@ class OpenStackZunShell(object):
                                 key=os_key,
                                 **kwargs)
 
-        args.func(self.cs, args)
+        try:
+            ret = args.func(self.cs, args)
+        finally:
+            if tape:
+                tape.close()
 
         if profiler and args.profile:
             trace_id = profiler.get().get_base_id()
             print("To display trace use the command:\n\n"
                   "  osprofiler trace show --html %s " % trace_id)
+        return ret
 
     def _dump_timings(self, timings):
         class Tyme(object):
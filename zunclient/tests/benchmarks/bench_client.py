@@ -0,0 +1,289 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Benchmarks of the client hot paths, without any network.
+
+Every benchmark takes a size and does its setup, then returns a callable
+which runs the measured work once and returns the number of operations
+it did. The suite module times these callables.
+"""
+
+from concurrent import futures
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from unittest import mock
+
+import requests
+
+from zunclient import api_versions
+from zunclient.common import cassette
+from zunclient.common import cliutils
+from zunclient.common import httpclient
+from zunclient.common import transports
+from zunclient.common import utils
+from zunclient.common.websocketclient import websocketclient
+from zunclient.fakeserver import server as fakeserver
+from zunclient.fakeserver import wsserver
+from zunclient.tests.benchmarks import bench_websocket
+from zunclient.v1 import containers
+
+
+def _container(i):
+    return {'uuid': '%08d-0000-0000-0000-000000000000' % i,
+            'name': 'container-%d' % i, 'image': 'cirros',
+            'status': 'Running', 'task_state': None, 'cpu': 1.0,
+            'memory': '512M', 'host': 'host-%d' % (i % 10),
+            'labels': {'app': 'bench'}, 'ports': [80],
+            'addresses': {'private': [{'addr': '10.0.%d.%d' % (
+                i // 250 % 250, i % 250), 'version': 4}]}}
+
+
+class MemoryAPI(object):
+    """A json_request answering from prebuilt bodies, keyed by URL."""
+
+    def __init__(self, bodies):
+        self.bodies = bodies
+        self.api_version = api_versions.APIVersion(
+            api_versions.MAX_API_VERSION)
+
+    def json_request(self, method, url, **kwargs):
+        return None, self.bodies[url]
+
+
+def bench_list(size):
+    """ContainerManager.list: one response with size containers."""
+    items = [_container(i) for i in range(size)]
+    manager = containers.ContainerManager(
+        MemoryAPI({'/v1/containers': {'containers': items}}))
+    return lambda: len(manager.list())
+
+
+def bench_list_pagination(size, page_size=1000):
+    """ContainerManager.list_all: size containers in pages."""
+    bodies = {}
+    url = '/v1/containers'
+    for start in range(0, size, page_size):
+        page = [_container(i)
+                for i in range(start, min(start + page_size, size))]
+        next_url = '/v1/containers/?limit=%d&marker=%s' % (
+            page_size, page[-1]['uuid'])
+        bodies[url] = {'containers': page}
+        if start + page_size < size:
+            bodies[url]['next'] = 'http://zun' + next_url
+        url = next_url
+    manager = containers.ContainerManager(MemoryAPI(bodies))
+    return lambda: len(manager.list_all())
+
+
+def bench_resource(size):
+    """Container construction and to_dict."""
+    items = [_container(i) for i in range(size)]
+    manager = containers.ContainerManager(MemoryAPI({}))
+
+    def run():
+        for item in items:
+            containers.Container(manager, item, loaded=True).to_dict()
+        return size
+    return run
+
+
+def bench_cassette_replay(size):
+    """list_all replayed from a cassette of size containers, in pages."""
+    fake = fakeserver.FakeZunServer().start()
+    for _ in range(size):
+        fake.add_container(status='Running')
+    fd, path = tempfile.mkstemp(suffix='.jsonl.gz')
+    os.close(fd)
+    try:
+        with cassette.Cassette(path, mode='record') as tape:
+            fake.client(transport=cassette.CassetteAdapter(tape)
+                        ).containers.list_all()
+        fake.stop()
+        tape = cassette.Cassette(path)
+    finally:
+        os.unlink(path)
+    zun = fake.client(transport=cassette.CassetteAdapter(tape))
+    return lambda: len(zun.containers.list_all())
+
+
+def bench_transport(size, name='requests'):
+    """ContainerManager.get through a transport, size times.
+
+    The fake zun-api runs in process, its work is part of the measure.
+    """
+    fake = fakeserver.FakeZunServer()
+    if name == 'memory':
+        transport = fake.memory_transport()
+    else:
+        fake.start()
+        transport = transports.get_transport(name)
+    uuid = fake.add_container(status='Running')['uuid']
+    zun = fake.client(transport=transport)
+
+    def run():
+        for _ in range(size):
+            zun.containers.get(uuid)
+        return size
+    return run
+
+
+def bench_list_http(size, compression=False):
+    """ContainerManager.list_all of size containers over local HTTP.
+
+    With compression, the fake zun-api gzips the pages and the client
+    decodes them as they are read; the work of both is measured.
+    """
+    fake = fakeserver.FakeZunServer(compression=compression).start()
+    for _ in range(size):
+        fake.add_container(status='Running')
+    zun = fake.client(api_versions.MAX_API_VERSION)
+    return lambda: len(zun.containers.list_all())
+
+
+def bench_fanout(size, name='requests', concurrency=32, latency=0.005):
+    """size concurrent ContainerManager.get over TLS from a new client.
+
+    A new client per run counts the connections and TLS handshakes a fan
+    out pays for. The server negotiates HTTP/2 or HTTP/1.1 with ALPN and
+    takes latency seconds per request, its work is part of the measure.
+    """
+    from zunclient.fakeserver import h2server
+
+    fake = fakeserver.FakeZunServer(latency=latency)
+    uuid = fake.add_container(status='Running')['uuid']
+    context, cafile = h2server.self_signed_context()
+    server = h2server.H2Server(fake, ssl_context=context).start()
+
+    def run():
+        zun = fake.client(endpoint_override=server.url, cacert=cafile,
+                          transport=name)
+        with futures.ThreadPoolExecutor(concurrency) as executor:
+            for _ in executor.map(lambda _: zun.containers.get(uuid),
+                                  range(size)):
+                pass
+        return size
+    return run
+
+
+def bench_print_list(size):
+    """cliutils.print_list of size containers to a discarded stdout."""
+    manager = containers.ContainerManager(MemoryAPI({}))
+    items = [containers.Container(manager, _container(i), loaded=True)
+             for i in range(size)]
+    columns = ('uuid', 'name', 'image', 'status', 'task_state', 'host')
+
+    def run():
+        with mock.patch('sys.stdout', io.StringIO()):
+            cliutils.print_list(items, columns, sortby_index=None)
+        return size
+    return run
+
+
+def bench_print_dict(size):
+    """cliutils.print_dict of one container, size times."""
+    item = _container(0)
+
+    def run():
+        with mock.patch('sys.stdout', io.StringIO()):
+            for _ in range(size):
+                cliutils.print_dict(item)
+        return size
+    return run
+
+
+def bench_json_request(size):
+    """SessionClient.json_request encoding a body and decoding a list."""
+    content = json.dumps({'containers': [_container(i)
+                                         for i in range(size)]}).encode()
+    body = _container(0)
+
+    class _Session(object):
+        def request(self, url, method, **kwargs):
+            response = requests.Response()
+            response.status_code = 200
+            response.headers['Content-Type'] = 'application/json'
+            response._content = content
+            return response
+
+    client = httpclient.SessionClient(
+        session=_Session(), endpoint_override='http://zun',
+        api_version=api_versions.APIVersion(api_versions.MAX_API_VERSION))
+    return lambda: len(client.json_request(
+        'POST', '/v1/containers', body=body)[1]['containers'])
+
+
+class _Versioned(object):
+    api_version = api_versions.APIVersion('1.30')
+
+    @api_versions.wraps('1.1', '1.20')
+    def action(self):
+        return 1
+
+    @api_versions.wraps('1.21')
+    def action(self):  # noqa: F811
+        return 2
+
+
+def bench_api_versions(size):
+    """Dispatch of a method versioned with api_versions.wraps."""
+    obj = _Versioned()
+
+    def run():
+        for _ in range(size):
+            obj.action()
+        return size
+    return run
+
+
+def bench_archive(size):
+    """Base64 encoding and decoding of a size MiB archive."""
+    data = os.urandom(size * 1024 * 1024)
+
+    def run():
+        encoded = utils.encode_file_stream(io.BytesIO(data))
+        decoded = sum(len(chunk) for chunk in
+                      utils.iter_decode_file_data(encoded))
+        assert decoded == len(data)
+        return size
+    return run
+
+
+def bench_websocket_relay(size):
+    """Attach relay through a local echo server, size MiB."""
+
+    def run():
+        server = wsserver.WebSocketServer().start()
+        try:
+            bench_websocket.run(websocketclient.WebSocketClient,
+                                server.url, size * 1024 * 1024)
+        finally:
+            server.stop()
+        return size
+    return run
+
+
+def bench_cli_start(size):
+    """Cold start of the zun CLI printing its version, size times."""
+    command = [sys.executable, '-c',
+               'import sys; from zunclient import shell; '
+               'sys.argv = ["zun", "--version"]; shell.main()']
+
+    def run():
+        for _ in range(size):
+            subprocess.run(command, stdout=subprocess.DEVNULL,
+                           stderr=subprocess.DEVNULL, check=True)
+        return size
+    return run
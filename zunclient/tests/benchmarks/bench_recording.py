@@ -0,0 +1,73 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Overhead of recording attach/exec sessions.
+
+The websocket relay benchmark is run with and without a session recorder,
+and the cost of a single record() call, the only recording work done by
+the interactive loop, is measured on its own.
+
+Usage: python -m zunclient.tests.benchmarks.bench_recording [--size MiB]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from zunclient.common.websocketclient import recorder
+from zunclient.common.websocketclient import websocketclient
+from zunclient.fakeserver import wsserver
+from zunclient.tests.benchmarks import bench_websocket
+
+
+def record_cost(calls=100000, frame=b'x' * 1024):
+    """Return the mean duration of record(), in microseconds."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        rec = recorder.SessionRecorder(os.path.join(tmpdir, 'bench.cast'),
+                                       buffer_events=calls)
+        start = time.perf_counter()
+        for _ in range(calls):
+            rec.record(frame)
+        elapsed = time.perf_counter() - start
+        rec.close()
+    return elapsed / calls * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=int, default=64,
+                        help='MiB to relay through the echo server.')
+    args = parser.parse_args(argv)
+
+    server = wsserver.WebSocketServer().start()
+    size = args.size * 1024 * 1024
+    try:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            rec = recorder.SessionRecorder(os.path.join(tmpdir, 'b.cast'))
+            for name, kwargs in (('plain', {}),
+                                 ('recorded', {'recorder': rec})):
+                received, elapsed = bench_websocket.run(
+                    websocketclient.WebSocketClient, server.url, size,
+                    **kwargs)
+                print('%-10s %8.1f MiB/s  (%d bytes in %.2fs)'
+                      % (name, received / elapsed / 1024 / 1024, received,
+                         elapsed))
+            rec.close()
+            print('%d events dropped' % rec.dropped)
+    finally:
+        server.stop()
+    print('record() %.2f us per call' % record_cost())
+
+
+if __name__ == '__main__':
+    main()
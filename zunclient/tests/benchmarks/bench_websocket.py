@@ -0,0 +1,124 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Throughput of the attach/exec websocket relay.
+
+Data written to a stdin pipe goes through the client I/O loop to a local
+websocket echo server and back to a stdout sink. The current loop is
+compared with the former one, which decoded and flushed every frame and
+read stdin 1 KiB at a time.
+
+Usage: python -m zunclient.tests.benchmarks.bench_websocket [--size MiB]
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from unittest import mock
+
+from zunclient.common.websocketclient import websocketclient
+from zunclient.fakeserver import wsserver
+
+
+class _Sink(object):
+    """A stdout replacement counting the bytes written to it."""
+
+    def __init__(self, client, expected):
+        self.client = client
+        self.expected = expected
+        self.received = 0
+        self.buffer = self
+
+    def write(self, data):
+        self.received += len(data)
+        if self.received >= self.expected:
+            self.client.quit = True
+
+    def flush(self):
+        pass
+
+
+class LegacyClient(websocketclient.WebSocketClient):
+    """The I/O loop behaviour before the binary fast path."""
+
+    def handle_stdin(self, event):
+        data = os.read(sys.stdin.fileno(), 1024)
+        if not data:
+            self._unregister(sys.stdin)
+            self.quit = True
+            return
+        self.send(data)
+
+    def handle_socket(self, event):
+        data = self.recv()
+        if not data:
+            self._unregister(self.fileno())
+            self.quit = True
+            return
+        if isinstance(data, bytes):
+            data = data.decode('utf-8')
+        sys.stdout.write(data)
+        sys.stdout.flush()
+
+
+def run(client_class, url, size, chunk_size=64 * 1024, **kwargs):
+    client = client_class(zunclient=None, url=url, id='bench',
+                          close_wait=0, **kwargs)
+    with mock.patch('sys.stdout'):
+        client.connect()
+    read_fd, write_fd = os.pipe()
+    payload = b'x' * chunk_size
+    sink = _Sink(client, size)
+
+    def _feed():
+        sent = 0
+        while sent < size:
+            sent += os.write(write_fd, payload[:size - sent])
+
+    feeder = threading.Thread(target=_feed)
+    feeder.daemon = True
+    with open(read_fd, 'rb', buffering=0) as stdin, \
+            mock.patch('sys.stdin', stdin), \
+            mock.patch('sys.stdout', sink):
+        start = time.perf_counter()
+        feeder.start()
+        client.start_loop()
+        elapsed = time.perf_counter() - start
+    os.close(write_fd)
+    client.ws.close()
+    return sink.received, elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=int, default=64,
+                        help='MiB to relay through the echo server.')
+    args = parser.parse_args(argv)
+
+    server = wsserver.WebSocketServer().start()
+    size = args.size * 1024 * 1024
+    try:
+        for name, client_class in (('legacy', LegacyClient),
+                                   ('fast path',
+                                    websocketclient.WebSocketClient)):
+            received, elapsed = run(client_class, server.url, size)
+            print('%-10s %8.1f MiB/s  (%d bytes in %.2fs)'
+                  % (name, received / elapsed / 1024 / 1024, received,
+                     elapsed))
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
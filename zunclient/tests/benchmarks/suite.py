@@ -0,0 +1,228 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Run the client benchmarks and compare them with earlier runs.
+
+Each run is appended to a history file together with the commit it was
+run on. A benchmark regresses when its throughput falls, or its peak
+memory grows, by more than the threshold compared with the median of the
+last runs in the same mode on the same Python version.
+
+The history file is .benchmarks/history.jsonl unless --history or the
+ZUNCLIENT_BENCH_HISTORY environment variable names another one, e.g. one
+kept in a CI cache. With --baseline, runs are compared with those of a
+file in the same format, such as one committed for a reference machine,
+instead of with the history.
+
+Usage: python -m zunclient.tests.benchmarks.suite [--quick] [--check]
+           [--filter NAME] [--history FILE] [--baseline FILE]
+"""
+
+import argparse
+import functools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from zunclient.common import transports
+from zunclient.tests.benchmarks import bench_client
+
+HISTORY_FILE = os.environ.get('ZUNCLIENT_BENCH_HISTORY',
+                              os.path.join('.benchmarks', 'history.jsonl'))
+REPEAT = 3
+THRESHOLD = 0.1
+WINDOW = 5
+# Peak memory changes below this many KiB are noise
+MEMORY_SLACK = 64
+
+# name, benchmark, size, unit of the operations it counts
+BENCHMARKS = [
+    ('list_10k', bench_client.bench_list, 10000, 'items'),
+    ('list_100k', bench_client.bench_list, 100000, 'items'),
+    ('list_pagination_10k', bench_client.bench_list_pagination, 10000,
+     'items'),
+    ('list_pagination_100k', bench_client.bench_list_pagination, 100000,
+     'items'),
+    ('cassette_replay_10k', bench_client.bench_cassette_replay, 10000,
+     'items'),
+    ('transport_requests', bench_client.bench_transport, 1000,
+     'requests'),
+    ('transport_http_client',
+     functools.partial(bench_client.bench_transport, name='http.client'),
+     1000, 'requests'),
+    ('transport_memory',
+     functools.partial(bench_client.bench_transport, name='memory'), 1000,
+     'requests'),
+    ('list_http_10k', bench_client.bench_list_http, 10000, 'items'),
+    ('list_http_gzip_10k',
+     functools.partial(bench_client.bench_list_http, compression=True),
+     10000, 'items'),
+    ('fanout_http11', bench_client.bench_fanout, 320, 'requests'),
+    ('resource_to_dict', bench_client.bench_resource, 10000, 'items'),
+    ('print_list', bench_client.bench_print_list, 2000, 'rows'),
+    ('print_dict', bench_client.bench_print_dict, 200, 'tables'),
+    ('json_request', bench_client.bench_json_request, 1000, 'items'),
+    ('api_versions_dispatch', bench_client.bench_api_versions, 100000,
+     'calls'),
+    ('archive_codec', bench_client.bench_archive, 16, 'MiB'),
+    ('websocket_relay', bench_client.bench_websocket_relay, 32, 'MiB'),
+    ('cli_cold_start', bench_client.bench_cli_start, 3, 'starts'),
+]
+if transports.httpx:
+    BENCHMARKS.append(
+        ('fanout_http2',
+         functools.partial(bench_client.bench_fanout, name='http2'), 320,
+         'requests'))
+
+
+def measure(benchmark, size, repeat=REPEAT):
+    """Return the throughput and peak memory of a benchmark.
+
+    The first run is traced with tracemalloc and doubles as a warm up,
+    the best of the following runs gives the throughput.
+    """
+    run = benchmark(size)
+    tracemalloc.start()
+    try:
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        ops = run()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return {'ops_per_sec': ops / best, 'seconds': best,
+            'peak_kib': peak / 1024.0}
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def save_run(path, run):
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(path, 'a') as f:
+        f.write(json.dumps(run, sort_keys=True) + '\n')
+
+
+def baseline(history, run, name, window=WINDOW):
+    """Return the median results of name over the last comparable runs."""
+    results = [past['results'][name] for past in history
+               if past['mode'] == run['mode'] and
+               past['python'] == run['python'] and
+               name in past['results']][-window:]
+    if not results:
+        return None
+    return {
+        'ops_per_sec': statistics.median(r['ops_per_sec'] for r in results),
+        'peak_kib': statistics.median(r['peak_kib'] for r in results)}
+
+
+def compare(result, base, threshold=THRESHOLD):
+    """Return a list of the regressions of result against base."""
+    regressions = []
+    if base is None:
+        return regressions
+    if result['ops_per_sec'] < base['ops_per_sec'] * (1 - threshold):
+        regressions.append('throughput')
+    if (result['peak_kib'] > base['peak_kib'] * (1 + threshold) and
+            result['peak_kib'] - base['peak_kib'] > MEMORY_SLACK):
+        regressions.append('memory')
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--quick', action='store_true',
+                        help='Run every benchmark at a tenth of its size.')
+    parser.add_argument('--filter', metavar='<name>', action='append',
+                        default=[],
+                        help='Only run benchmarks whose name contains '
+                             '<name>. May be repeated.')
+    parser.add_argument('--history', metavar='<file>', default=HISTORY_FILE,
+                        help='File keeping the results of earlier runs '
+                             '(default: %s).' % HISTORY_FILE)
+    parser.add_argument('--baseline', metavar='<file>',
+                        help='Compare with the runs kept in <file> instead '
+                             'of with the history.')
+    parser.add_argument('--no-save', action='store_true',
+                        help='Do not add this run to the history.')
+    parser.add_argument('--repeat', type=int, default=REPEAT)
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help='Relative change reported as a regression '
+                             '(default: %s).' % THRESHOLD)
+    parser.add_argument('--check', action='store_true',
+                        help='Exit with status 1 if anything regressed.')
+    args = parser.parse_args(argv)
+
+    if args.baseline and not os.path.exists(args.baseline):
+        parser.error('baseline file %s does not exist' % args.baseline)
+    history = load_history(args.baseline or args.history)
+    run = {'commit': git_commit(), 'timestamp': int(time.time()),
+           'python': platform.python_version(),
+           'mode': 'quick' if args.quick else 'full', 'results': {}}
+    regressed = []
+    print('%-24s %14s %-9s %10s %8s' % ('benchmark', 'throughput', 'unit',
+                                        'peak KiB', 'change'))
+    for name, benchmark, size, unit in BENCHMARKS:
+        if args.filter and not any(f in name for f in args.filter):
+            continue
+        if args.quick:
+            size = max(1, size // 10)
+        result = measure(benchmark, size, args.repeat)
+        result['unit'] = unit
+        run['results'][name] = result
+        base = baseline(history, run, name)
+        change = ''
+        if base:
+            change = '%+.1f%%' % ((result['ops_per_sec'] /
+                                   base['ops_per_sec'] - 1) * 100)
+        regressions = compare(result, base, args.threshold)
+        if regressions:
+            regressed.append(name)
+            change += ' REGRESSED (%s)' % ', '.join(regressions)
+        print('%-24s %14.1f %-9s %10.1f %8s' % (
+            name, result['ops_per_sec'], unit + '/s', result['peak_kib'],
+            change))
+    if not args.no_save:
+        save_run(args.history, run)
+    if regressed and args.check:
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
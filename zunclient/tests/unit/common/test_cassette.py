@@ -0,0 +1,130 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+import os
+from unittest import mock
+
+import fixtures
+
+from zunclient import api_versions
+from zunclient.common import cassette
+from zunclient.common import httpclient
+from zunclient import exceptions
+from zunclient.fakeserver import server
+from zunclient.tests.unit import utils as test_utils
+
+
+class CassetteTest(test_utils.BaseTestCase):
+
+    def setUp(self):
+        super(CassetteTest, self).setUp()
+        self.tempdir = self.useFixture(fixtures.TempDir()).path
+        self.path = os.path.join(self.tempdir, 'tape.jsonl.gz')
+
+    def _record(self):
+        fake = server.FakeZunServer(max_limit=2).start()
+        self.addCleanup(fake.stop)
+        for _ in range(5):
+            fake.add_container()
+        with cassette.Cassette(self.path, mode='record') as tape:
+            zun = fake.client(transport=cassette.CassetteAdapter(tape))
+            containers = zun.containers.list_all()
+            zun.containers.stop(containers[0].uuid, timeout=10)
+            self.assertRaises(exceptions.NotFound, zun.containers.get,
+                              'missing')
+        fake.stop()
+        return fake, containers
+
+    def test_record_and_replay(self):
+        fake, recorded = self._record()
+        tape = cassette.Cassette(self.path)
+        # The fake server is gone, everything comes from the cassette
+        zun = fake.client(transport=cassette.CassetteAdapter(tape))
+        self.assertEqual([c.to_dict() for c in recorded],
+                         [c.to_dict() for c in zun.containers.list_all()])
+        zun.containers.stop(recorded[0].uuid, timeout=10)
+        self.assertRaises(exceptions.NotFound, zun.containers.get, 'missing')
+        self.assertRaises(exceptions.NoRecordedResponse,
+                          zun.containers.get, recorded[1].uuid)
+
+    def test_redacted(self):
+        self._record()
+        tape = cassette.Cassette(self.path)
+        self.assertNotIn('fake-token', json.dumps(tape.interactions))
+        for interaction in tape.interactions:
+            self.assertEqual(cassette.REDACTED,
+                             interaction['request_headers']['X-Auth-Token'])
+            self.assertGreater(interaction['elapsed'], 0)
+        offsets = [i['offset'] for i in tape.interactions]
+        self.assertEqual(sorted(offsets), offsets)
+
+    def test_redact_body(self):
+        body = json.dumps({'auth': {'identity': {'password': {'user': {
+            'name': 'admin', 'password': 's3cr3t'}}}}})
+        self.assertEqual(
+            {'auth': {'identity': {'password': {'user': {
+                'name': 'admin', 'password': cassette.REDACTED}}}}},
+            json.loads(cassette.redact_body(body)))
+        self.assertEqual('not json', cassette.redact_body('not json'))
+
+    def test_redact_body_url_token(self):
+        self.assertEqual(
+            '"ws://zun:6080/?token=%s"' % cassette.REDACTED,
+            cassette.redact_body('"ws://zun:6080/?token=0a1b2c"'))
+        body = json.dumps({'exec_id': 'e1', 'url': (
+            'ws://zun:6080/?uuid=c1&token=0a1b2c&exec_id=e1')})
+        self.assertEqual(
+            'ws://zun:6080/?uuid=c1&token=%s&exec_id=e1' % cassette.REDACTED,
+            json.loads(cassette.redact_body(body))['url'])
+
+    def test_request_key(self):
+        self.assertEqual(
+            cassette.request_key('get', '/v1/containers/?marker=b&limit=2'),
+            cassette.request_key('GET', 'http://other:9517/v1/containers'
+                                        '?limit=2&marker=b'))
+
+    @mock.patch('time.sleep')
+    def test_replay_speed(self, mock_sleep):
+        self._record()
+        tape = cassette.Cassette(self.path, speed=2)
+        interaction = tape.interactions[0]
+        played = tape.play(interaction['method'], interaction['url'])
+        self.assertEqual(interaction, played)
+        mock_sleep.assert_called_once_with(interaction['elapsed'] / 2)
+
+    def test_replay_repeats_last(self):
+        self._record()
+        tape = cassette.Cassette(self.path)
+        interaction = tape.interactions[-1]
+        for _ in range(3):
+            self.assertEqual(interaction, tape.play(interaction['method'],
+                                                    interaction['url']))
+
+    def test_http_client_transport(self):
+        fake, recorded = self._record()
+        tape = cassette.Cassette(self.path)
+        client = httpclient.HTTPClient(
+            fake.url, api_version=api_versions.APIVersion('1.1'),
+            transport=cassette.CassetteAdapter(tape))
+        resp, body = client.json_request('GET', '/v1/containers')
+        self.assertEqual(200, resp.status)
+        self.assertEqual([c.uuid for c in recorded[:2]],
+                         [c['uuid'] for c in body['containers']])
+
+    def test_invalid_cassette(self):
+        path = os.path.join(self.tempdir, 'empty.jsonl')
+        open(path, 'w').close()
+        self.assertRaises(exceptions.InvalidAttribute, cassette.Cassette,
+                          path)
+        self.assertRaises(exceptions.InvalidAttribute, cassette.Cassette,
+                          path, mode='rewind')
@@ -0,0 +1,217 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import gzip
+import io
+import json
+from unittest import mock
+import zlib
+
+from zunclient import api_versions
+from zunclient.common import compression
+from zunclient.common import httpclient
+from zunclient.common import transports
+from zunclient.fakeserver import server
+from zunclient.tests.unit import utils as test_utils
+
+DATA = json.dumps({'containers': [{'name': 'container-%d' % i}
+                                  for i in range(200)]}).encode()
+
+
+def _chunks(data, size=7):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class DecoderTest(test_utils.BaseTestCase):
+
+    def _decode(self, encoding, data):
+        return b''.join(compression.Decoder(encoding).iter(_chunks(data)))
+
+    def test_gzip(self):
+        self.assertEqual(DATA, self._decode('gzip', gzip.compress(DATA)))
+        self.assertEqual(DATA, self._decode('X-Gzip', gzip.compress(DATA)))
+
+    def test_deflate(self):
+        self.assertEqual(DATA, self._decode('deflate', zlib.compress(DATA)))
+
+    def test_raw_deflate(self):
+        raw = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+        self.assertEqual(DATA, self._decode(
+            'deflate', raw.compress(DATA) + raw.flush()))
+
+    def test_identity(self):
+        self.assertEqual(DATA, self._decode(None, DATA))
+        self.assertEqual(DATA, self._decode('identity', DATA))
+        self.assertEqual(DATA, compression.decode(None, DATA))
+
+    def test_corrupt(self):
+        self.assertRaises(zlib.error, compression.decode, 'gzip', DATA)
+
+
+class CompressBodyTest(test_utils.BaseTestCase):
+
+    def test_compress_body(self):
+        data = compression.compress_body(DATA, min_size=1024)
+        self.assertLess(len(data), len(DATA))
+        self.assertEqual(DATA, gzip.decompress(data))
+        self.assertEqual(DATA, gzip.decompress(
+            compression.compress_body(DATA.decode(), min_size=1024)))
+
+    def test_not_worth_it(self):
+        self.assertIsNone(compression.compress_body(None))
+        self.assertIsNone(compression.compress_body(DATA))
+        self.assertIsNone(compression.compress_body(b'x', min_size=0))
+
+    def test_compressed_headers(self):
+        headers = {'Content-Length': '0'}
+        self.assertEqual({'Content-Length': '3', 'Content-Encoding': 'gzip'},
+                         compression.compressed_headers(headers, b'abc'))
+        self.assertEqual({'Content-Length': '0'}, headers)
+
+    def test_stats(self):
+        stats = compression.CompressionStats()
+        stats.request(1000, 100)
+        stats.response(500, 50)
+        self.assertEqual({'requests_compressed': 1, 'request_bytes': 1000,
+                          'request_bytes_sent': 100,
+                          'responses_compressed': 1, 'response_bytes': 500,
+                          'response_bytes_received': 50,
+                          'bytes_saved': 1350}, stats.as_dict())
+        self.assertEqual('1350 bytes saved, 1 compressed requests, 1 '
+                         'compressed responses', str(stats))
+
+
+class CompressionTest(test_utils.BaseTestCase):
+
+    def setUp(self):
+        super(CompressionTest, self).setUp()
+        self.fake = server.FakeZunServer(compression=True)
+        self.addCleanup(self.fake.stop)
+        for _ in range(50):
+            self.fake.add_container()
+
+    def _check_list(self, zun):
+        names = [c.name for c in zun.containers.list_all()]
+        self.assertEqual([c['name'] for c in self.fake.containers.values()],
+                         names)
+        self.assertGreater(self.fake.encodings['response:gzip'], 0)
+        stats = zun.http_client.compression_stats
+        self.assertEqual(1, stats.responses_compressed)
+        self.assertGreater(stats.response_bytes,
+                           stats.response_bytes_received)
+        self.assertEqual(stats.bytes_saved, stats.response_bytes -
+                         stats.response_bytes_received)
+
+    def test_requests(self):
+        self.fake.start()
+        self._check_list(self.fake.client(
+            api_versions.MAX_API_VERSION, transport='requests'))
+
+    def test_http_client_transport(self):
+        self.fake.start()
+        self._check_list(self.fake.client(
+            api_versions.MAX_API_VERSION, transport='http.client'))
+
+    def test_memory(self):
+        self._check_list(self.fake.client(
+            api_versions.MAX_API_VERSION,
+            transport=self.fake.memory_transport()))
+
+    def test_not_accepted(self):
+        self.fake.compression = False
+        self.fake.start()
+        zun = self.fake.client(api_versions.MAX_API_VERSION,
+                               transport=transports.get_transport(
+                                   'http.client'))
+        self.assertEqual(50, len(zun.containers.list_all()))
+        self.assertEqual(0, self.fake.encodings['response:gzip'])
+        self.assertEqual(0, zun.http_client.compression_stats.bytes_saved)
+
+    def test_http_client(self):
+        self.fake.start()
+        client = httpclient.HTTPClient(
+            self.fake.url, api_version=api_versions.APIVersion('1.1'))
+        with mock.patch.object(httpclient, 'CHUNKSIZE', 100):
+            resp, body = client.json_request('GET', '/v1/containers')
+        self.assertEqual('gzip', resp.getheader('Content-Encoding'))
+        self.assertEqual(50, len(body['containers']))
+        stats = client.compression_stats
+        self.assertEqual(1, stats.responses_compressed)
+        self.assertEqual(int(resp.getheader('Content-Length')),
+                         stats.response_bytes_received)
+        self.assertGreater(stats.bytes_saved, 0)
+
+    def test_http_client_with_transport(self):
+        client = httpclient.HTTPClient(
+            self.fake.url, api_version=api_versions.APIVersion('1.1'),
+            transport=self.fake.memory_transport())
+        resp, body = client.json_request('GET', '/v1/containers')
+        self.assertEqual(50, len(body['containers']))
+        self.assertEqual(1, client.compression_stats.responses_compressed)
+
+    def test_body_iterator(self):
+        data = gzip.compress(DATA)
+        resp = test_utils.FakeResponse(
+            {'content-encoding': 'gzip'}, io.BytesIO(data))
+        stats = compression.CompressionStats()
+        with mock.patch.object(httpclient, 'CHUNKSIZE', 10):
+            body = b''.join(httpclient.ResponseBodyIterator(resp, stats))
+        self.assertEqual(DATA, body)
+        self.assertEqual(len(DATA), stats.response_bytes)
+        self.assertEqual(len(data), stats.response_bytes_received)
+
+    def _labels(self):
+        # Well over MIN_REQUEST_SIZE, and compressible
+        return dict(('label-%d' % i, 'value') for i in range(5000))
+
+    def test_compress_requests(self):
+        self.fake.start()
+        zun = self.fake.client(api_versions.MAX_API_VERSION,
+                               compress_requests=True)
+        labels = self._labels()
+        container = zun.containers.create(image='cirros', labels=labels)
+        self.assertEqual(labels, zun.containers.get(container.uuid).labels)
+        self.assertEqual(1, self.fake.encodings['request:gzip'])
+        stats = zun.http_client.compression_stats
+        self.assertEqual(1, stats.requests_compressed)
+        self.assertLess(stats.request_bytes_sent, stats.request_bytes)
+        # Small bodies are sent as is
+        zun.containers.create(image='cirros')
+        self.assertEqual(1, self.fake.encodings['request:gzip'])
+
+    def test_compress_requests_unsupported(self):
+        self.fake.compression = False
+        zun = self.fake.client(api_versions.MAX_API_VERSION,
+                               transport=self.fake.memory_transport(),
+                               compress_requests=True)
+        labels = self._labels()
+        container = zun.containers.create(image='cirros', labels=labels)
+        self.assertEqual(labels, self.fake.containers[container.uuid][
+            'labels'])
+        self.assertFalse(zun.http_client.compress_requests)
+        self.assertEqual(0, zun.http_client.compression_stats.bytes_saved)
+
+    def test_http_client_compress_requests(self):
+        client = httpclient.HTTPClient(
+            self.fake.url, api_version=api_versions.APIVersion('1.1'),
+            transport=self.fake.memory_transport(), compress_requests=True)
+        labels = self._labels()
+        resp, body = client.json_request(
+            'POST', '/v1/containers',
+            body={'image': 'cirros', 'labels': labels})
+        self.assertEqual(labels, body['labels'])
+        self.assertEqual(1, self.fake.encodings['request:gzip'])
+        self.assertEqual(1, client.compression_stats.requests_compressed)
+        self.fake.compression = False
+        client.json_request('POST', '/v1/containers',
+                            body={'image': 'cirros', 'labels': labels})
+        self.assertFalse(client.compress_requests)
@@ -314,3 +314,16 @@ class SessionClientTest(utils.BaseTestCase):
         self.assertRaises(exceptions.GatewayTimeout,
                           client.json_request,
                           'GET', '/v1/resources')
+
+    def test_rate_limiter(self):
+        fake_response = utils.FakeSessionResponse(
+            {}, content="", status_code=201)
+        fake_session = mock.MagicMock()
+        fake_session.request.side_effect = [fake_response]
+        rate_limiter = mock.Mock()
+        client = http.SessionClient(
+            api_version=api_versions.APIVersion('1.latest'),
+            session=fake_session, endpoint_override='http://zun',
+            rate_limiter=rate_limiter)
+        client.json_request('POST', '/v1/containers')
+        rate_limiter.wait.assert_called_once_with('POST')
@@ -0,0 +1,82 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+from unittest import mock
+
+import fixtures
+
+from zunclient.common import ratelimit
+from zunclient.tests.unit import utils as test_utils
+
+
+@mock.patch('time.sleep')
+class TokenBucketTest(test_utils.BaseTestCase):
+
+    @mock.patch('time.monotonic')
+    def test_acquire(self, mock_monotonic, mock_sleep):
+        mock_monotonic.return_value = 100
+        bucket = ratelimit.TokenBucket(rate=2, burst=2)
+        self.assertEqual(0, bucket.acquire())
+        self.assertEqual(0, bucket.acquire())
+        # The bucket is empty, the next callers queue up behind each other
+        self.assertEqual(0.5, bucket.acquire())
+        self.assertEqual(1.0, bucket.acquire())
+        self.assertEqual([mock.call(0.5), mock.call(1.0)],
+                         mock_sleep.call_args_list)
+
+    @mock.patch('time.monotonic')
+    def test_refill_is_capped_by_burst(self, mock_monotonic, mock_sleep):
+        mock_monotonic.return_value = 100
+        bucket = ratelimit.TokenBucket(rate=1, burst=2)
+        bucket.acquire()
+        mock_monotonic.return_value = 200
+        self.assertEqual(0, bucket.acquire())
+        self.assertEqual(0, bucket.acquire())
+        self.assertEqual(1.0, bucket.acquire())
+
+    def test_invalid_rate(self, mock_sleep):
+        self.assertRaises(ValueError, ratelimit.TokenBucket, 0)
+
+    @mock.patch('time.time')
+    def test_shared_through_lock_file(self, mock_time, mock_sleep):
+        mock_time.return_value = 100
+        lock_file = os.path.join(self.useFixture(fixtures.TempDir()).path,
+                                 'ratelimit')
+        first = ratelimit.TokenBucket(rate=1, burst=1, lock_file=lock_file)
+        second = ratelimit.TokenBucket(rate=1, burst=1, lock_file=lock_file)
+        self.assertEqual(0, first.acquire())
+        self.assertEqual(1.0, second.acquire())
+        self.assertEqual(2.0, first.acquire())
+
+
+@mock.patch('time.sleep')
+class RateLimiterTest(test_utils.BaseTestCase):
+
+    @mock.patch('time.monotonic', return_value=100)
+    def test_separate_budgets(self, mock_monotonic, mock_sleep):
+        limiter = ratelimit.RateLimiter(read_rate=1, write_rate=1)
+        limiter.wait('GET')
+        limiter.wait('POST')
+        limiter.wait('DELETE')
+        self.assertEqual(
+            {'read': {'requests': 1, 'throttled': 0, 'throttled_time': 0.0},
+             'write': {'requests': 2, 'throttled': 1,
+                       'throttled_time': 1.0}},
+            limiter.metrics())
+
+    def test_unlimited(self, mock_sleep):
+        limiter = ratelimit.RateLimiter(write_rate=1)
+        for _ in range(10):
+            limiter.wait('get')
+        self.assertFalse(mock_sleep.called)
+        self.assertEqual(10, limiter.stats['read'].requests)
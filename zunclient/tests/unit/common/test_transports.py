@@ -0,0 +1,228 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from concurrent import futures
+import os
+from unittest import mock
+
+import fixtures
+from keystoneauth1 import exceptions as ksa_exceptions
+from keystoneauth1 import session as ksa_session
+import testtools
+
+from zunclient import api_versions
+from zunclient.common import httpclient
+from zunclient.common import transports
+from zunclient import exceptions
+from zunclient.fakeserver import h2server
+from zunclient.fakeserver import server
+from zunclient.tests.unit import utils as test_utils
+from zunclient.v1 import client
+
+
+class TransportsTest(test_utils.BaseTestCase):
+
+    def setUp(self):
+        super(TransportsTest, self).setUp()
+        self.fake = server.FakeZunServer()
+        self.addCleanup(self.fake.stop)
+        self.container = self.fake.add_container(name='test')
+
+    def _check(self, zun):
+        self.assertEqual(['test'], [c.name for c in zun.containers.list()])
+        self.assertEqual(self.container['uuid'],
+                         zun.containers.get('test').uuid)
+        self.assertRaises(exceptions.NotFound, zun.containers.get, 'missing')
+
+    def test_requests(self):
+        self.fake.start()
+        transport = transports.get_transport('requests')
+        self.assertIsInstance(transport, ksa_session.TCPKeepAliveAdapter)
+        self._check(self.fake.client(transport=transport))
+
+    def test_http_client(self):
+        self.fake.start()
+        transport = transports.get_transport('http.client', pool_maxsize=1)
+        self._check(self.fake.client(transport=transport))
+        # One connection was kept open and used for every request
+        self.assertEqual(1, len(sum(transport.pools.values(), [])))
+        transport.close()
+        self.assertEqual({}, transport.pools)
+
+    def test_http_client_stale_connection(self):
+        self.fake.start()
+        transport = transports.HTTPConnectionTransport()
+        zun = self.fake.client(transport=transport)
+        zun.containers.list()
+        # The server closed the idle connections meanwhile
+        for conn in sum(transport.pools.values(), []):
+            conn.sock.close()
+        self._check(zun)
+
+    def test_http_client_stale_connection_post_not_retried(self):
+        self.fake.start()
+        transport = transports.HTTPConnectionTransport()
+        zun = self.fake.client(transport=transport)
+        zun.containers.list()
+        for conn in sum(transport.pools.values(), []):
+            conn.sock.close()
+        # The POST may have reached the server, it must not be sent twice
+        self.assertRaises(ksa_exceptions.ConnectFailure, zun.containers.stop,
+                          self.container['uuid'], timeout=1)
+        self.assertEqual(0, self.fake.requests['POST'])
+        zun.containers.stop(self.container['uuid'], timeout=1)
+        self.assertEqual(1, self.fake.requests['POST'])
+
+    def test_http_client_tls_settings(self):
+        client = httpclient.HTTPClient(
+            'https://zun:9517/v1', api_version=api_versions.APIVersion('1.1'),
+            ca_file='ca.pem', cert_file='cert.pem', key_file='key.pem')
+        client.transport = mock.Mock()
+        client.transport.send.side_effect = (
+            lambda request, **kwargs: transports.build_response(
+                client.transport, request, 200, 'OK',
+                {'Content-Type': 'application/json'}, b'{}'))
+        client.json_request('GET', '/v1/containers')
+        client.transport.send.assert_called_once_with(
+            mock.ANY, timeout=600, verify='ca.pem',
+            cert=('cert.pem', 'key.pem'))
+        client.connection_params[2]['insecure'] = True
+        client.json_request('GET', '/v1/containers')
+        self.assertFalse(client.transport.send.call_args[1]['verify'])
+
+    def test_memory(self):
+        # The server is not started, nothing goes through the network
+        self._check(self.fake.client(
+            transport=self.fake.memory_transport()))
+        self.assertEqual(0, self.fake.requests['POST'])
+        self.assertGreater(self.fake.requests['GET'], 0)
+
+    def test_unix(self):
+        tempdir = self.useFixture(fixtures.TempDir()).path
+        path = os.path.join(tempdir, 'zun.sock')
+        fake = server.FakeZunServer(unix_socket=path).start()
+        self.addCleanup(fake.stop)
+        fake.add_container(name='test', uuid=self.container['uuid'])
+        self._check(fake.client(transport='unix:' + path))
+
+    def test_http_client_with_transport(self):
+        client = httpclient.HTTPClient(
+            self.fake.url, api_version=api_versions.APIVersion('1.1'),
+            transport='http.client')
+        self.assertIsInstance(client.transport,
+                              transports.HTTPConnectionTransport)
+        client.transport = self.fake.memory_transport()
+        resp, body = client.json_request('GET', '/v1/containers')
+        self.assertEqual(200, resp.status)
+        self.assertEqual(['test'], [c['name'] for c in body['containers']])
+
+    def test_session_of_caller_unchanged(self):
+        session = ksa_session.Session()
+        adapters = dict(session.session.adapters)
+        zun = client.Client(session=session, endpoint_override=self.fake.url,
+                            transport=self.fake.memory_transport())
+        self._check(zun)
+        self.assertEqual(adapters, dict(session.session.adapters))
+
+    def test_mount_endpoint_only(self):
+        session = ksa_session.Session()
+        transport = transports.mount(session, 'http.client',
+                                     'http://zun:9517/container/v1')
+        self.assertIs(transport, session.session.get_adapter(
+            'http://zun:9517/container/v1/containers'))
+        self.assertIs(transport, session.session.get_adapter(
+            'http://zun:9517/container/'))
+        for url in ('http://keystone:5000/v3/auth/tokens',
+                    'http://zun:9517/identity/v3'):
+            self.assertIsNot(transport, session.session.get_adapter(url))
+
+    def test_mount_whole_session(self):
+        session = ksa_session.Session()
+        transport = transports.get_transport('memory', app=None)
+        transport.whole_session = True
+        transports.mount(session, transport, 'http://zun:9517/v1')
+        self.assertIs(transport, session.session.get_adapter(
+            'http://keystone:5000/v3/auth/tokens'))
+
+    def test_get_transport_unknown(self):
+        self.assertRaises(exceptions.InvalidAttribute,
+                          transports.get_transport, 'carrier-pigeon')
+
+    @mock.patch.object(h2server, 'h2_connection', None)
+    def test_h2server_h2_missing(self):
+        e = self.assertRaises(exceptions.InvalidAttribute,
+                              h2server.H2Server, self.fake)
+        self.assertIn('python-zunclient[http2]', str(e))
+
+
+@testtools.skipUnless(transports.httpx and h2server.h2_connection,
+                      'httpx and h2 are not installed')
+class HTTP2TransportTest(test_utils.BaseTestCase):
+
+    def setUp(self):
+        super(HTTP2TransportTest, self).setUp()
+        self.fake = server.FakeZunServer()
+        self.addCleanup(self.fake.stop)
+        self.uuid = self.fake.add_container(name='test')['uuid']
+
+    def _run(self, ssl_context=None, cacert=None, **kwargs):
+        h2 = h2server.H2Server(self.fake, ssl_context=ssl_context).start()
+        self.addCleanup(h2.stop)
+        transport = transports.HTTP2Transport(**kwargs)
+        self.addCleanup(transport.close)
+        # Skip the version discovery, whose client closes the transport
+        zun = self.fake.client(api_versions.MAX_API_VERSION,
+                               endpoint_override=h2.url, cacert=cacert,
+                               transport=transport)
+        with futures.ThreadPoolExecutor(16) as executor:
+            names = list(executor.map(
+                lambda _: zun.containers.get(self.uuid).name, range(50)))
+        self.assertEqual(['test'] * 50, names)
+        self.assertRaises(exceptions.NotFound, zun.containers.get, 'missing')
+        return h2, transport
+
+    def test_prior_knowledge(self):
+        h2, transport = self._run(prior_knowledge=True)
+        # Every request was multiplexed on one connection
+        self.assertEqual({'h2': 1}, h2.connections)
+        self.assertEqual(['HTTP/2'], list(transport.versions))
+
+    def test_alpn(self):
+        context, cacert = h2server.self_signed_context()
+        h2, transport = self._run(context, cacert)
+        self.assertEqual({'h2': 1}, h2.connections)
+        self.assertEqual(['HTTP/2'], list(transport.versions))
+
+    def test_alpn_fallback(self):
+        context, cacert = h2server.self_signed_context(alpn=['http/1.1'])
+        h2, transport = self._run(context, cacert)
+        self.assertEqual(['http/1.1'], list(h2.connections))
+        self.assertEqual(['HTTP/1.1'], list(transport.versions))
+
+    def test_compression(self):
+        self.fake.compression = True
+        for _ in range(50):
+            self.fake.add_container()
+        h2 = h2server.H2Server(self.fake).start()
+        self.addCleanup(h2.stop)
+        transport = transports.HTTP2Transport(prior_knowledge=True)
+        self.addCleanup(transport.close)
+        zun = self.fake.client(api_versions.MAX_API_VERSION,
+                               endpoint_override=h2.url, transport=transport)
+        self.assertEqual(51, len(zun.containers.list_all()))
+        self.assertEqual(1, self.fake.encodings['response:gzip'])
+        self.assertGreater(zun.http_client.compression_stats.bytes_saved, 0)
+
+    @mock.patch.object(transports, 'httpx', None)
+    def test_httpx_missing(self):
+        self.assertRaises(exceptions.InvalidAttribute,
+                          transports.get_transport, 'http2')
@@ -14,7 +14,14 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import argparse
 import collections
+import io
+import os
+import tarfile
+from unittest import mock
+
+import fixtures
 
 from zunclient.common import cliutils
 from zunclient.common import utils
@@ -210,6 +217,27 @@ class CliUtilsTest(test_utils.BaseTestCase):
         self.assertEqual(str(dict_exp), str(dict_act))
 
 
+class CheckConcurrencyTest(test_utils.BaseTestCase):
+
+    def test_check_concurrency(self):
+        self.assertEqual(4, utils.check_concurrency('4'))
+
+    def test_check_concurrency_invalid(self):
+        for value in ('0', '-1', 'many'):
+            self.assertRaises(argparse.ArgumentTypeError,
+                              utils.check_concurrency, value)
+
+
+class PercentileTest(test_utils.BaseTestCase):
+
+    def test_percentile(self):
+        values = list(range(100, 0, -1))
+        self.assertEqual(50, utils.percentile(values, 50))
+        self.assertEqual(99, utils.percentile(values, 99))
+        self.assertEqual(1, utils.percentile(values, 0))
+        self.assertIsNone(utils.percentile([], 50))
+
+
 class ParseNetsTest(test_utils.BaseTestCase):
 
     def test_no_nets(self):
@@ -261,3 +289,151 @@ class ParseCommandTest(test_utils.BaseTestCase):
         command = ['sh', '-c', 'echo hello']
         result = utils.parse_command(command)
         self.assertEqual('"sh" "-c" "echo hello"', result)
+
+
+class FileDataStreamTest(test_utils.BaseTestCase):
+
+    def test_iter_decode_file_data(self):
+        payload = bytes(range(256)) * 5
+        encoded = utils.encode_file_data(payload)
+        chunks = list(utils.iter_decode_file_data(encoded, chunk_size=100))
+        self.assertTrue(all(len(chunk) <= 100 for chunk in chunks))
+        self.assertEqual(payload, b''.join(chunks))
+
+    def test_iter_decode_file_data_invalid(self):
+        self.assertRaises(exc.CommandError, list,
+                          utils.iter_decode_file_data('a'))
+
+    def test_encode_file_stream(self):
+        payload = bytes(range(256)) * 5
+        for chunk_size in (1, 2, 3, 7, 4096):
+            self.assertEqual(
+                utils.encode_file_data(payload),
+                utils.encode_file_stream(io.BytesIO(payload), chunk_size))
+
+    def test_encode_file_stream_empty(self):
+        self.assertEqual('', utils.encode_file_stream(io.BytesIO()))
+
+
+class ParseMountsTest(test_utils.BaseTestCase):
+
+    def setUp(self):
+        super(ParseMountsTest, self).setUp()
+        self.tempdir = self.useFixture(fixtures.TempDir()).path
+        self.addCleanup(utils._bind_source_cache.clear)
+
+    def _write(self, name, content):
+        filename = os.path.join(self.tempdir, name)
+        with open(filename, 'wb') as f:
+            f.write(content)
+        return filename
+
+    def test_parse_mounts_volume(self):
+        mounts = utils.parse_mounts(['source=vol,destination=/data'])
+        self.assertEqual([{'source': 'vol', 'destination': '/data'}],
+                         mounts)
+
+    def test_parse_mounts_bind_file(self):
+        filename = self._write('conf', b'content')
+        mounts = utils.parse_mounts(
+            ['type=bind,source=%s,destination=/etc/conf' % filename])
+        self.assertEqual([{'type': 'bind', 'source': b'content',
+                           'destination': '/etc/conf'}], mounts)
+
+    def test_parse_mounts_bind_file_read_once(self):
+        filename = self._write('conf', b'content')
+        mount = 'type=bind,source=%s,destination=/etc/conf' % filename
+        with mock.patch('builtins.open', wraps=open) as mock_open:
+            utils.parse_mounts([mount])
+            utils.parse_mounts([mount])
+        self.assertEqual(1, mock_open.call_count)
+
+    def test_parse_mounts_bind_directory(self):
+        os.mkdir(os.path.join(self.tempdir, 'conf.d'))
+        self._write(os.path.join('conf.d', 'a.conf'), b'a')
+        mounts = utils.parse_mounts(
+            ['type=bind,source=%s,destination=/etc/conf.d/,copy=true' %
+             os.path.join(self.tempdir, 'conf.d')])
+        self.assertEqual(1, len(mounts))
+        self.assertTrue(mounts[0]['directory'])
+        self.assertTrue(mounts[0]['copy'])
+        tar = tarfile.open(fileobj=io.BytesIO(mounts[0]['source']))
+        self.assertEqual(['conf.d', 'conf.d/a.conf'],
+                         sorted(tar.getnames()))
+
+    def test_parse_mounts_bind_directory_not_copied(self):
+        os.mkdir(os.path.join(self.tempdir, 'conf.d'))
+        self.assertRaises(exc.CommandError, utils.parse_mounts,
+                          ['type=bind,source=%s,destination=/etc/conf.d' %
+                           os.path.join(self.tempdir, 'conf.d')])
+
+    def test_parse_mounts_copy_invalid(self):
+        filename = self._write('conf', b'content')
+        self.assertRaises(exc.CommandError, utils.parse_mounts,
+                          ['type=bind,source=%s,destination=/etc/conf,'
+                           'copy=maybe' % filename])
+        self.assertRaises(exc.CommandError, utils.parse_mounts,
+                          ['source=vol,destination=/data,copy=true'])
+
+
+class PayloadCacheTest(test_utils.BaseTestCase):
+
+    def test_get_or_set(self):
+        cache = utils.PayloadCache(max_bytes=10)
+        factory = mock.Mock(return_value=b'12345')
+        self.assertEqual(b'12345', cache.get_or_set('a', factory))
+        self.assertEqual(b'12345', cache.get_or_set('a', factory))
+        factory.assert_called_once_with()
+
+    def test_eviction(self):
+        cache = utils.PayloadCache(max_bytes=10)
+        cache.get_or_set('a', lambda: b'123456')
+        cache.get_or_set('b', lambda: b'123456')
+        factory = mock.Mock(return_value=b'123456')
+        cache.get_or_set('a', factory)
+        self.assertTrue(factory.called)
+
+    def test_encode_bind_mount_data_cached(self):
+        self.addCleanup(utils._encoded_payload_cache.clear)
+        with mock.patch.object(utils, 'encode_file_data',
+                               wraps=utils.encode_file_data) as mock_encode:
+            first = utils.encode_bind_mount_data(b'payload')
+            second = utils.encode_bind_mount_data(bytes(b'payload'))
+        self.assertEqual(utils.encode_file_data(b'payload'), first)
+        self.assertIs(first, second)
+        mock_encode.assert_called_once_with(b'payload')
+
+
+class LogTimestampTest(test_utils.BaseTestCase):
+
+    def test_parse_log_timestamp(self):
+        self.assertEqual(
+            1500000000 * 10 ** 9 + 120000000,
+            utils.parse_log_timestamp('2017-07-14T02:40:00.12Z'))
+        self.assertEqual(
+            1500000000 * 10 ** 9 + 1,
+            utils.parse_log_timestamp('2017-07-14T02:40:00.000000001Z'))
+        self.assertEqual(
+            1500000000 * 10 ** 9,
+            utils.parse_log_timestamp('2017-07-14T04:40:00+02:00'))
+
+    def test_parse_log_timestamp_invalid(self):
+        self.assertIsNone(utils.parse_log_timestamp('hello'))
+
+    def test_split_log_line(self):
+        self.assertEqual(
+            (1500000000 * 10 ** 9, 'hello world\n'),
+            utils.split_log_line('2017-07-14T02:40:00Z hello world\n'))
+        self.assertEqual((None, 'hello\n'), utils.split_log_line('hello\n'))
+
+
+class FilterByLabelsTest(test_utils.BaseTestCase):
+
+    def test_filter_by_labels(self):
+        c1 = mock.Mock(labels={'app': 'web', 'tier': 'front'})
+        c2 = mock.Mock(labels={'app': 'db'})
+        c3 = mock.Mock(labels=None)
+        self.assertEqual([c1], utils.filter_by_labels([c1, c2, c3],
+                                                      {'app': 'web'}))
+        self.assertEqual([c1, c2, c3], utils.filter_by_labels([c1, c2, c3],
+                                                              {}))
@@ -0,0 +1,121 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from unittest import mock
+
+from zunclient.common import waiter
+from zunclient import exceptions as exc
+from zunclient.tests.unit import utils as test_utils
+
+
+def _container(status, uuid='uuid1', name='c1'):
+    container = mock.Mock(status=status, uuid=uuid)
+    container.name = name
+    return container
+
+
+@mock.patch('time.sleep')
+class WaiterTest(test_utils.BaseTestCase):
+
+    def test_wait_for_status_backs_off(self, mock_sleep):
+        get = mock.Mock(side_effect=[_container('Creating'),
+                                     _container('Created'),
+                                     _container('Created'),
+                                     _container('Running')])
+        on_wait = mock.Mock()
+        container = waiter.Waiter(jitter=0).wait_for_status(
+            get, 'c1', ['Running'], on_wait=on_wait)
+        self.assertEqual('Running', container.status)
+        on_wait.assert_called_once_with()
+        intervals = [c[0][0] for c in mock_sleep.call_args_list]
+        self.assertEqual(3, len(intervals))
+        for expected, interval in zip([0.05, 0.075, 0.1125], intervals):
+            self.assertAlmostEqual(expected, interval)
+
+    def test_wait_for_status_max_interval(self, mock_sleep):
+        get = mock.Mock(side_effect=[_container('Creating')] * 20 +
+                        [_container('Running')])
+        waiter.Waiter(jitter=0, max_interval=1).wait_for_status(
+            get, 'c1', ['running'])
+        self.assertEqual(1, mock_sleep.call_args_list[-1][0][0])
+
+    @mock.patch('random.random', return_value=1)
+    def test_jitter(self, mock_random, mock_sleep):
+        get = mock.Mock(side_effect=[_container('Creating'),
+                                     _container('Running')])
+        waiter.Waiter(jitter=0.5).wait_for_status(get, 'c1', ['Running'])
+        mock_sleep.assert_called_once_with(0.025)
+
+    def test_wait_for_status_error(self, mock_sleep):
+        get = mock.Mock(side_effect=[_container('Creating'),
+                                     _container('Error')])
+        self.assertRaises(exc.ResourceInErrorState,
+                          waiter.Waiter().wait_for_status, get, 'c1',
+                          ['Running'])
+
+    @mock.patch('time.monotonic')
+    def test_wait_for_status_timeout(self, mock_monotonic, mock_sleep):
+        mock_monotonic.side_effect = [0, 5, 11]
+        get = mock.Mock(return_value=_container('Creating'))
+        self.assertRaisesRegex(exc.WaitTimeout, 'after 10 seconds',
+                               waiter.Waiter(timeout=10).wait_for_status,
+                               get, 'c1', ['Running'])
+        self.assertEqual(2, get.call_count)
+
+    def test_wait_for_delete(self, mock_sleep):
+        get = mock.Mock(side_effect=[_container('Deleting'),
+                                     exc.NotFound()])
+        self.assertIsNone(waiter.Waiter().wait_for_delete(get, 'c1'))
+        self.assertEqual(1, mock_sleep.call_count)
+
+    def test_wait_for_all(self, mock_sleep):
+        polls = [['Creating', 'Creating', 'Creating'],
+                 ['Running', 'Error', 'Creating'],
+                 ['Running', 'Error', 'Running']]
+
+        def list_all():
+            return [_container(status, 'uuid%d' % i)
+                    for i, status in enumerate(polls.pop(0), 1)] + [
+                _container('Creating', 'other')]
+
+        list_all = mock.Mock(side_effect=list_all)
+        done, failed = waiter.Waiter().wait_for_all(
+            list_all, ['uuid1', 'uuid2', 'uuid3'], ['Running'])
+        self.assertEqual(['uuid1', 'uuid3'], sorted(done))
+        self.assertEqual(['uuid2'], list(failed))
+        self.assertIsInstance(failed['uuid2'], exc.ResourceInErrorState)
+        self.assertEqual(3, list_all.call_count)
+        self.assertEqual(2, mock_sleep.call_count)
+
+    def test_wait_for_all_deleted(self, mock_sleep):
+        list_all = mock.Mock(side_effect=[[_container('Deleting')], []])
+        done, failed = waiter.Waiter().wait_for_all(list_all, ['uuid1'])
+        self.assertEqual({'uuid1': None}, done)
+        self.assertEqual({}, failed)
+        self.assertEqual(2, list_all.call_count)
+
+    def test_wait_for_all_not_found(self, mock_sleep):
+        list_all = mock.Mock(return_value=[_container('Running', 'other')])
+        done, failed = waiter.Waiter().wait_for_all(list_all, ['uuid1'],
+                                                    ['Running'])
+        self.assertEqual({}, done)
+        self.assertIsInstance(failed['uuid1'], exc.NotFound)
+
+    @mock.patch('time.monotonic')
+    def test_wait_for_all_timeout(self, mock_monotonic, mock_sleep):
+        mock_monotonic.side_effect = [0, 5, 11]
+        list_all = mock.Mock(return_value=[_container('Running', 'uuid1'),
+                                           _container('Creating', 'uuid2')])
+        done, failed = waiter.Waiter(timeout=10).wait_for_all(
+            list_all, ['uuid1', 'uuid2'], ['Running'])
+        self.assertEqual(['uuid1'], list(done))
+        self.assertIsInstance(failed['uuid2'], exc.WaitTimeout)
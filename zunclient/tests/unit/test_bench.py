@@ -0,0 +1,52 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import io
+
+from zunclient import bench
+from zunclient import exceptions
+from zunclient.fakeserver import server
+from zunclient.tests.unit import utils as test_utils
+
+
+class BenchTest(test_utils.BaseTestCase):
+
+    def test_parse_mix(self):
+        self.assertEqual({'create': 1.0, 'show': 4.0, 'list': 1.0},
+                         bench.parse_mix('create=1,show=4,list'))
+        self.assertRaises(exceptions.CommandError, bench.parse_mix,
+                          'create=1,explode=2')
+        self.assertRaises(exceptions.CommandError, bench.parse_mix,
+                          'show=0')
+
+    def test_run(self):
+        fake = server.FakeZunServer().start()
+        self.addCleanup(fake.stop)
+        fake.inject_error(500, 'GET', '/v1/containers$', count=1)
+        generator = bench.LoadGenerator(
+            fake.client(), bench.parse_mix('create=1,list=1,show=2,action=1'),
+            concurrency=4, operations=200, seed=1)
+        report = generator.run()
+        self.assertEqual(200, report['ops'])
+        self.assertEqual(
+            {'InternalServerError (HTTP 500)': 1},
+            report['operations']['list']['errors'])
+        self.assertNotIn('delete', report['operations'])
+        self.assertEqual(len(generator.containers),
+                         report['operations']['create']['ops'])
+        self.assertEqual(len(generator.containers), generator.cleanup())
+        self.assertEqual([], generator.containers)
+        self.assertEqual([], fake.client().containers.list())
+
+        out = io.StringIO()
+        bench.print_report(report, out)
+        self.assertIn('InternalServerError (HTTP 500)', out.getvalue())
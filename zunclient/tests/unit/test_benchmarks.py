@@ -0,0 +1,100 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import functools
+import io
+import json
+import os
+import platform
+from unittest import mock
+
+import fixtures
+
+from zunclient.tests.benchmarks import bench_client
+from zunclient.tests.benchmarks import suite
+from zunclient.tests.unit import utils as test_utils
+
+
+def _run(mode='full', python='3.11.0', **results):
+    return {'mode': mode, 'python': python,
+            'results': dict((name, {'ops_per_sec': ops, 'peak_kib': peak})
+                            for name, (ops, peak) in results.items())}
+
+
+class BenchmarkSuiteTest(test_utils.BaseTestCase):
+
+    def test_baseline_is_median_of_comparable_runs(self):
+        history = [_run(list=(100, 10)), _run(list=(300, 30)),
+                   _run(list=(200, 20)), _run(mode='quick', list=(1, 1)),
+                   _run(python='3.8.0', list=(1, 1)), _run(other=(5, 5))]
+        self.assertEqual({'ops_per_sec': 200, 'peak_kib': 20},
+                         suite.baseline(history, _run(), 'list'))
+        self.assertIsNone(suite.baseline(history, _run(), 'missing'))
+
+    def test_baseline_window(self):
+        history = [_run(list=(ops, 0)) for ops in (1, 1, 1, 10, 10, 10)]
+        self.assertEqual(10, suite.baseline(history, _run(), 'list',
+                                            window=3)['ops_per_sec'])
+
+    def test_compare(self):
+        base = {'ops_per_sec': 100, 'peak_kib': 1000}
+        self.assertEqual([], suite.compare(
+            {'ops_per_sec': 95, 'peak_kib': 1050}, base))
+        self.assertEqual(['throughput', 'memory'], suite.compare(
+            {'ops_per_sec': 80, 'peak_kib': 2000}, base))
+        # Small absolute memory changes are ignored
+        self.assertEqual([], suite.compare(
+            {'ops_per_sec': 100, 'peak_kib': 20},
+            {'ops_per_sec': 100, 'peak_kib': 10}))
+        self.assertEqual([], suite.compare(
+            {'ops_per_sec': 1, 'peak_kib': 1}, None))
+
+    @mock.patch('sys.stdout', new_callable=io.StringIO)
+    def test_main_with_baseline(self, mock_stdout):
+        tempdir = self.useFixture(fixtures.TempDir()).path
+        history = os.path.join(tempdir, 'history.jsonl')
+        baseline = os.path.join(tempdir, 'baseline.jsonl')
+        with open(baseline, 'w') as f:
+            f.write(json.dumps(_run(
+                mode='quick', python=platform.python_version(),
+                api_versions_dispatch=(1e12, 0))) + '\n')
+        argv = ['--quick', '--repeat', '1', '--filter',
+                'api_versions_dispatch', '--history', history,
+                '--baseline', baseline, '--check']
+        self.assertEqual(1, suite.main(argv))
+        self.assertIn('REGRESSED (throughput)', mock_stdout.getvalue())
+        # The run is added to the history, the baseline is left alone
+        self.assertEqual(1, len(suite.load_history(history)))
+        self.assertEqual(1, len(suite.load_history(baseline)))
+
+    @mock.patch('sys.stderr', new_callable=io.StringIO)
+    def test_main_missing_baseline(self, mock_stderr):
+        self.assertRaises(SystemExit, suite.main,
+                          ['--baseline', '/nonexistent/baseline.jsonl'])
+        self.assertIn('does not exist', mock_stderr.getvalue())
+
+    def test_benchmarks_run(self):
+        for benchmark, size in ((bench_client.bench_list, 10),
+                                (bench_client.bench_list_pagination, 2500),
+                                (bench_client.bench_resource, 10),
+                                (bench_client.bench_print_list, 10),
+                                (bench_client.bench_print_dict, 2),
+                                (bench_client.bench_json_request, 10),
+                                (bench_client.bench_api_versions, 10),
+                                (bench_client.bench_archive, 1),
+                                (functools.partial(
+                                    bench_client.bench_transport,
+                                    name='memory'), 5),
+                                (functools.partial(
+                                    bench_client.bench_list_http,
+                                    compression=True), 20)):
+            self.assertEqual(size, benchmark(size)())
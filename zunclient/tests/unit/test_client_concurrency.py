@@ -0,0 +1,120 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Stress clients shared between threads against an in-process server."""
+
+from concurrent import futures
+from http import server
+import json
+import threading
+
+from zunclient import api_versions
+from zunclient.common import httpclient
+from zunclient.tests.unit import utils as test_utils
+from zunclient.v1 import client
+from zunclient.v1 import containers
+
+CALLS = 2000
+THREADS = 32
+
+
+class EchoHandler(server.BaseHTTPRequestHandler):
+    """Answer every request with what the server received."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def _reply(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        body = json.dumps({
+            'uuid': self.path.split('?')[0].rstrip('/').split('/')[-1],
+            'method': self.command,
+            'path': self.path,
+            'content_type': self.headers.get('Content-Type')}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = do_DELETE = _reply
+
+    def log_message(self, *args):
+        pass
+
+
+class EchoServer(server.ThreadingHTTPServer):
+
+    daemon_threads = True
+    # Do not drop the connections of the threads which all open at once
+    request_queue_size = THREADS
+
+
+class SessionClientConcurrencyTest(test_utils.BaseTestCase):
+
+    def setUp(self):
+        super(SessionClientConcurrencyTest, self).setUp()
+        self.server = EchoServer(('127.0.0.1', 0), EchoHandler)
+        thread = threading.Thread(target=self.server.serve_forever,
+                                  args=(0.05,))
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.endpoint = ('http://127.0.0.1:%d/v1' %
+                         self.server.server_address[1])
+        self.http_client, self.containers = self._make_client()
+
+    def _make_client(self):
+        # Let the client create its own session and connection pool
+        zun = client.Client(auth_token='token',
+                            endpoint_override=self.endpoint)
+        return zun.http_client, zun.containers
+
+    def _call(self, i):
+        id = 'container-%d' % i
+        kind = i % 3
+        if kind == 0:
+            container = self.containers.get(id)
+            return id, container.uuid, container.method
+        elif kind == 1:
+            resp, body = self.containers.stop(id, timeout=i)
+            self.assertEqual('/v1/containers/%s/stop?timeout=%d' % (id, i),
+                             body['path'])
+            return id, id, body['method']
+        else:
+            resp, body = self.http_client.json_request(
+                'GET', '/v1/containers/%s' % id, headers=self.headers)
+            return id, body['uuid'], body['content_type']
+
+    def test_shared_client(self):
+        self.headers = {'X-Test': 'shared'}
+        with futures.ThreadPoolExecutor(max_workers=THREADS) as executor:
+            results = list(executor.map(self._call, range(CALLS)))
+        self.assertEqual(CALLS, len(results))
+        for i, (id, uuid, extra) in enumerate(results):
+            # Every response belongs to the request which got it
+            self.assertEqual(id, uuid)
+            self.assertEqual(['GET', 'POST', 'application/json'][i % 3],
+                             extra)
+        # Headers passed in by the caller are left alone
+        self.assertEqual({'X-Test': 'shared'}, self.headers)
+
+
+class HTTPClientConcurrencyTest(SessionClientConcurrencyTest):
+
+    def _make_client(self):
+        http_client = httpclient.HTTPClient(
+            self.endpoint, api_version=api_versions.APIVersion('1.1'),
+            token='token')
+        return http_client, containers.ContainerManager(http_client)
@@ -0,0 +1,98 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import asyncio
+
+from zunclient.common.apiclient import exceptions as apiexec
+from zunclient.common import waiter
+from zunclient.common.websocketclient import aio
+from zunclient.fakeserver import server
+from zunclient.tests.unit import utils as test_utils
+
+
+class FakeServerTest(test_utils.BaseTestCase):
+
+    def setUp(self):
+        super(FakeServerTest, self).setUp()
+        self.server = server.FakeZunServer(max_limit=2).start()
+        self.addCleanup(self.server.stop)
+        self.zun = self.server.client()
+
+    def test_microversion(self):
+        self.assertEqual(self.server.max_version, self.zun.api_version)
+        resp, _ = self.zun.http_client.json_request('GET', '/v1/containers')
+        self.assertEqual('container %s' %
+                         self.server.max_version.get_string(),
+                         resp.headers['OpenStack-API-Version'])
+
+    def test_unsupported_microversion(self):
+        self.zun.http_client.api_version = server.api_versions.APIVersion(
+            '1.999')
+        self.assertRaises(apiexec.NotAcceptable, self.zun.containers.list)
+
+    def test_pagination(self):
+        for i in range(5):
+            self.server.add_container(name='c%d' % i)
+        before = self.server.requests['GET']
+        containers = self.zun.containers.list_all()
+        self.assertEqual(['c%d' % i for i in range(5)],
+                         [c.name for c in containers])
+        self.assertEqual(3, self.server.requests['GET'] - before)
+
+    def test_container_lifecycle(self):
+        self.server.transition_delay = 0.05
+        container = self.zun.containers.run(name='web', image='nginx')
+        self.assertEqual('Creating', container.status)
+        container = waiter.Waiter(timeout=5).wait_for_status(
+            self.zun.containers.get, 'web', ['Running'])
+        self.zun.containers.stop('web', 10)
+        self.assertEqual('Running', self.zun.containers.get('web').status)
+        waiter.Waiter(timeout=5).wait_for_status(
+            self.zun.containers.get, 'web', ['Stopped'])
+        self.zun.containers.delete('web')
+        waiter.Waiter(timeout=5).wait_for_delete(
+            self.zun.containers.get, container.uuid)
+
+    def test_not_found(self):
+        self.assertRaises(apiexec.NotFound, self.zun.containers.get, 'nope')
+
+    def test_inject_error(self):
+        self.server.add_container(name='c1')
+        self.server.inject_error(503, method='GET', path='/containers',
+                                 count=2)
+        self.assertRaises(apiexec.ServiceUnavailable,
+                          self.zun.containers.get, 'c1')
+        self.assertRaises(apiexec.ServiceUnavailable,
+                          self.zun.containers.list)
+        self.assertEqual('c1', self.zun.containers.get('c1').name)
+
+    def test_images_hosts_capsules(self):
+        image = self.zun.images.create(repo='nginx:1.25')
+        self.assertEqual(('nginx', '1.25'), (image.repo, image.tag))
+        self.assertEqual([server.HOSTNAME],
+                         [h.hostname for h in self.zun.hosts.list()])
+        capsule = self.zun.capsules.create(template={
+            'metadata': {'name': 'pod'},
+            'spec': {'containers': [{'image': 'nginx'}]}})
+        self.assertEqual('pod', self.zun.capsules.get(capsule.uuid).name)
+        self.zun.capsules.delete('pod')
+        self.assertEqual([], self.zun.capsules.list())
+
+    def test_attach(self):
+        self.server.add_container(name='c1', status='Running')
+
+        async def session():
+            client = await aio.attach(self.zun, 'c1')
+            async with client:
+                await client.write(b'hello')
+                return await client.read()
+        self.assertEqual(b'hello', asyncio.run(session()))
@@ -149,6 +149,12 @@ class ShellTest(utils.TestCase):
         else:
             self.fail('CommandError not raised')
 
+    def test_replay_speed_without_cassette(self):
+        self.make_env()
+        self.assertRaisesRegex(exceptions.CommandError,
+                               'requires --replay-cassette', self.shell,
+                               '--replay-speed 2 service-list')
+
     def test_no_user_id(self):
         required = ('You must provide a username via'
                     ' either --os-username or env[OS_USERNAME]')
@@ -13,10 +13,19 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import base64
+import io
+import os
+import selectors
+import shlex
+import signal
+import tempfile
 from unittest import mock
 
 import testtools
+import websocket
 
+from zunclient.common.websocketclient import exceptions
 from zunclient.common.websocketclient import websocketclient
 
 CONTAINER_ID = "0f96db5a-26dc-4550-b1a8-b110bd9247cb"
@@ -41,3 +50,383 @@ class WebSocketClientTest(testtools.TestCase):
         self.assertEqual(wsclient.id, CONTAINER_ID)
         self.assertEqual(wsclient.escape, ESCAPE_FLAG)
         self.assertEqual(wsclient.close_wait, WAIT_TIME)
+
+    def _make_client(self):
+        wsclient = websocketclient.WebSocketClient(zunclient=mock.Mock(),
+                                                   url=URL,
+                                                   id=CONTAINER_ID,
+                                                   escape=ESCAPE_FLAG,
+                                                   close_wait=WAIT_TIME)
+        wsclient.ws = mock.Mock()
+        wsclient.ws.frame_buffer.recv_buffer = []
+        wsclient.selector = mock.Mock()
+        wsclient.stdout = mock.Mock()
+        wsclient.output_pending = False
+        wsclient.quit = False
+        return wsclient
+
+    def test_handle_socket_writes_raw_bytes(self):
+        wsclient = self._make_client()
+        # A multibyte character split across two frames
+        wsclient.ws.recv_data.side_effect = [
+            (websocket.ABNF.OPCODE_BINARY, b'\xe2\x82'),
+            (websocket.ABNF.OPCODE_BINARY, b'\xac')]
+        wsclient.handle_socket(None)
+        wsclient.handle_socket(None)
+        wsclient.stdout.write.assert_has_calls(
+            [mock.call(b'\xe2\x82'), mock.call(b'\xac')])
+        self.assertFalse(wsclient.stdout.flush.called)
+        wsclient.flush_output()
+        wsclient.stdout.flush.assert_called_once_with()
+
+    def test_handle_socket_records_output(self):
+        wsclient = self._make_client()
+        wsclient.recorder = mock.Mock()
+        wsclient.ws.recv_data.return_value = (websocket.ABNF.OPCODE_BINARY,
+                                              b'out')
+        wsclient.handle_socket(None)
+        wsclient.recorder.record.assert_called_once_with(b'out')
+
+    def test_handle_socket_drains_pending_frames(self):
+        wsclient = self._make_client()
+        wsclient.ws.recv_data.side_effect = [
+            (websocket.ABNF.OPCODE_BINARY, b'a'),
+            (websocket.ABNF.OPCODE_TEXT, b'b')]
+        with mock.patch.object(wsclient, 'pending',
+                               side_effect=[True, False]):
+            wsclient.handle_socket(None)
+        wsclient.stdout.write.assert_has_calls(
+            [mock.call(b'a'), mock.call(b'b')])
+
+    def test_handle_socket_close(self):
+        wsclient = self._make_client()
+        wsclient.ws.recv_data.return_value = (websocket.ABNF.OPCODE_CLOSE,
+                                              b'')
+        wsclient.ws.fileno.return_value = 3
+        wsclient.handle_socket(None)
+        self.assertTrue(wsclient.quit)
+        wsclient.selector.unregister.assert_called_once_with(3)
+
+    def test_handle_socket_pong(self):
+        wsclient = self._make_client()
+        wsclient.ping_sent = 12.5
+        wsclient.ws.recv_data.return_value = (websocket.ABNF.OPCODE_PONG,
+                                              b'12.500000')
+        with mock.patch('time.monotonic', return_value=12.75):
+            wsclient.handle_socket(None)
+        self.assertFalse(wsclient.quit)
+        self.assertEqual([0.25], wsclient.stats.rtts)
+        self.assertIsNone(wsclient.ping_sent)
+        self.assertTrue(wsclient.pong_seen)
+
+    @mock.patch('time.monotonic')
+    def test_send_keepalive(self, mock_monotonic):
+        wsclient = self._make_client()
+        wsclient.last_ping = 0
+        mock_monotonic.return_value = 10
+        wsclient.send_keepalive()
+        self.assertFalse(wsclient.ws.ping.called)
+        mock_monotonic.return_value = 30
+        wsclient.send_keepalive()
+        wsclient.ws.ping.assert_called_once_with(b'30.000000')
+        # no answer is required until the server has answered once, the
+        # unanswered ping is given up and the next one sent
+        mock_monotonic.return_value = 100
+        wsclient.send_keepalive()
+        wsclient.ws.ping.assert_called_with(b'100.000000')
+        self.assertEqual(2, wsclient.ws.ping.call_count)
+        wsclient.pong_seen = True
+        mock_monotonic.return_value = 170
+        self.assertRaises(websocketclient.ConnectionLost,
+                          wsclient.send_keepalive)
+
+    def _start_loop(self, error, expected):
+        wsclient = self._make_client()
+        wsclient.fileno = mock.Mock(return_value=3)
+        with mock.patch.object(wsclient, 'run_forever',
+                               side_effect=error), \
+                mock.patch.object(wsclient, 'reconnect',
+                                  return_value=False) as mock_reconnect, \
+                mock.patch.object(wsclient, 'setup_tty'), \
+                mock.patch.object(wsclient, 'restore_tty'), \
+                mock.patch.object(websocketclient, 'make_selector'), \
+                mock.patch.object(websocketclient, 'WINCHHandler'):
+            self.assertRaises(expected, wsclient.start_loop)
+        return mock_reconnect
+
+    def test_start_loop_reconnects_on_websocket_error(self):
+        error = ConnectionResetError()
+        mock_reconnect = self._start_loop(
+            websocketclient.ConnectionLost(error), exceptions.ConnectionFailed)
+        mock_reconnect.assert_called_once_with(error)
+
+    def test_start_loop_local_error_propagates(self):
+        # Reconnecting would not help, the same write would fail again
+        mock_reconnect = self._start_loop(BrokenPipeError(), BrokenPipeError)
+        self.assertFalse(mock_reconnect.called)
+
+    def test_handle_socket_errors(self):
+        wsclient = self._make_client()
+        wsclient.ws.recv_data.side_effect = ConnectionResetError()
+        self.assertRaises(websocketclient.ConnectionLost,
+                          wsclient.handle_socket, None)
+        # A failing write to stdout is not a lost connection
+        wsclient.ws.recv_data.side_effect = None
+        wsclient.ws.recv_data.return_value = (
+            websocket.ABNF.OPCODE_BINARY, b'data')
+        wsclient.stdout.write.side_effect = BrokenPipeError()
+        self.assertRaises(BrokenPipeError, wsclient.handle_socket, None)
+
+    @mock.patch('time.sleep')
+    def test_reconnect(self, mock_sleep):
+        wsclient = websocketclient.AttachClient(zunclient=mock.Mock(),
+                                                url=URL, id=CONTAINER_ID)
+        wsclient.ws = mock.Mock()
+        wsclient.selector = mock.Mock()
+        wsclient.selector.get_map.return_value = {}
+        wsclient.cs.containers.attach.return_value = URL1
+        with mock.patch.object(wsclient, '_connect',
+                               side_effect=[exceptions.ConnectionFailed(),
+                                            None]):
+            self.assertTrue(wsclient.reconnect(Exception()))
+        self.assertEqual(URL1, wsclient.url)
+        self.assertEqual(1, wsclient.stats.reconnects)
+        mock_sleep.assert_has_calls([mock.call(1), mock.call(2)])
+        wsclient.selector.register.assert_called_once_with(
+            wsclient.ws.fileno.return_value, mock.ANY, wsclient.handle_socket)
+
+    def test_reconnect_exec_not_resumable(self):
+        wsclient = websocketclient.ExecClient(zunclient=mock.Mock(), url=URL,
+                                              exec_id='exec-id',
+                                              id=CONTAINER_ID)
+        self.assertFalse(wsclient.reconnect(Exception()))
+
+    @mock.patch('time.monotonic')
+    def test_maybe_resize_throttled(self, mock_monotonic):
+        wsclient = self._make_client()
+        wsclient.handle_resize = mock.Mock()
+        mock_monotonic.return_value = 100
+        wsclient.request_resize()
+        wsclient.maybe_resize()
+        mock_monotonic.return_value = 100.1
+        wsclient.request_resize()
+        wsclient.request_resize()
+        wsclient.maybe_resize()
+        self.assertEqual(1, wsclient.handle_resize.call_count)
+        self.assertAlmostEqual(0.15, wsclient.select_timeout())
+        mock_monotonic.return_value = 100.3
+        wsclient.maybe_resize()
+        self.assertEqual(2, wsclient.handle_resize.call_count)
+        self.assertEqual(0.5, wsclient.select_timeout())
+
+    def test_winch_handler_wakes_up_loop(self):
+        client = mock.Mock()
+        client.selector = selectors.DefaultSelector()
+        self.addCleanup(client.selector.close)
+        with websocketclient.WINCHHandler(client):
+            os.kill(os.getpid(), signal.SIGWINCH)
+            os.kill(os.getpid(), signal.SIGWINCH)
+            for key, event in client.selector.select(1):
+                key.data(event)
+            # the signals have been coalesced into one request
+            client.request_resize.assert_called_once_with()
+            self.assertFalse(client.handle_resize.called)
+        self.assertEqual({}, dict(client.selector.get_map()))
+
+    def test_selector_regular_file(self):
+        # epoll refuses regular files, so would stdin redirected from one
+        with tempfile.TemporaryFile() as stdin:
+            stdin.write(b'input')
+            stdin.seek(0)
+            selector = websocketclient.make_selector()
+            self.addCleanup(selector.close)
+            selector.register(stdin, selectors.EVENT_READ)
+            self.assertEqual(1, len(selector.select(0)))
+
+    def test_session_stats(self):
+        stats = websocketclient.SessionStats()
+        stats.bytes_in, stats.bytes_out = 10, 2
+        self.assertEqual('10 bytes received, 2 bytes sent, 0 reconnect(s)',
+                         str(stats))
+        stats.rtts = [i / 1000.0 for i in range(1, 101)]
+        self.assertEqual(0.05, stats.rtt_percentile(50))
+        self.assertEqual(0.099, stats.rtt_percentile(99))
+        self.assertIn('rtt p50/p90/p99 50.0/90.0/99.0 ms', str(stats))
+        stats.time_to_attach, stats.time_to_first_byte = 0.25, 0.5
+        self.assertIn('attached after 0.25s, first byte after 0.50s',
+                      str(stats))
+
+    def test_handle_socket_time_to_first_byte(self):
+        wsclient = self._make_client()
+        wsclient.stats.started = 10
+        wsclient.ws.recv_data.return_value = (websocket.ABNF.OPCODE_BINARY,
+                                              b'$ ')
+        with mock.patch('time.monotonic', side_effect=[10.75, 11]):
+            wsclient.handle_socket(None)
+            wsclient.handle_socket(None)
+        self.assertEqual(0.75, wsclient.stats.time_to_first_byte)
+
+    @mock.patch('sys.stdin')
+    @mock.patch('os.read')
+    def test_handle_stdin_escape(self, mock_read, mock_stdin):
+        wsclient = self._make_client()
+        wsclient.start_of_line = True
+        wsclient.read_escape = False
+        mock_read.side_effect = [b'~', b'.']
+        wsclient.handle_stdin(None)
+        self.assertRaises(exceptions.UserExit, wsclient.handle_stdin, None)
+        self.assertFalse(wsclient.ws.send_binary.called)
+
+    @mock.patch('sys.stdin')
+    @mock.patch('os.read')
+    def test_handle_stdin_eof(self, mock_read, mock_stdin):
+        wsclient = self._make_client()
+        mock_read.return_value = b''
+        wsclient.handle_stdin(None)
+        self.assertTrue(wsclient.quit)
+
+
+class ExecStreamTest(testtools.TestCase):
+
+    MARKER = 'zun-exec-1234'
+
+    def _make_stream(self, frames, stdin=None):
+        stream = websocketclient.ExecStream(None, URL, 'exec-id',
+                                            CONTAINER_ID, self.MARKER,
+                                            stdin=stdin)
+        stream.ws = mock.Mock()
+        stream.ws.recv_data.side_effect = [
+            (websocket.ABNF.OPCODE_BINARY, f) for f in frames] + [
+            (websocket.ABNF.OPCODE_CLOSE, b'')]
+        return stream
+
+    def test_stream_command(self):
+        command = websocketclient.stream_command('"echo" "$HOME"',
+                                                 self.MARKER)
+        argv = shlex.split(command)
+        self.assertEqual(['sh', '-c'], argv[:2])
+        self.assertIn('stty raw -echo', argv[2])
+        self.assertIn("echo '$HOME' </dev/null;", argv[2])
+        self.assertEqual(2, argv[2].count(self.MARKER))
+
+    def test_stream_command_stdin(self):
+        command = websocketclient.stream_command('cat', self.MARKER,
+                                                 stdin=True)
+        self.assertIn("| base64 -d | cat;", shlex.split(command)[2])
+
+    def test_iterate_output_and_exit_code(self):
+        stream = self._make_stream([
+            b'stty: noise\nzun-exec-1234\nfirst ',
+            b'line\nsecond zun-',
+            b'exec-12',
+            b'343\n'])
+        self.assertEqual(b'first line\nsecond ', b''.join(stream))
+        self.assertEqual(3, stream.exit_code)
+        stream.ws.close.assert_called_once_with()
+
+    def test_iterate_connection_lost(self):
+        stream = self._make_stream([b'zun-exec-1234\npartial zun'])
+        self.assertEqual(b'partial zun', b''.join(stream))
+        self.assertEqual(websocketclient.EXIT_STATUS_UNKNOWN,
+                         stream.exit_code)
+
+    def test_pump_stdin(self):
+        data = b'\x03\x04' + b'x' * 5000 + b'\n'
+        stream = self._make_stream([], stdin=io.BytesIO(data))
+        stream.chunk_size = 1000
+        stream._started.set()
+        stream._pump_stdin()
+        sent = b''.join(c[0][0] for c in
+                        stream.ws.send_binary.call_args_list)
+        self.assertTrue(sent.endswith(b'\n.\n'))
+        self.assertEqual(data, base64.b64decode(sent[:-2]))
+        # No padding before the end of the input
+        self.assertNotIn(b'=', sent[:-6])
+
+    def test_pump_stdin_waits_for_start(self):
+        stream = self._make_stream([b'zun-exec-1234\n', b'out'],
+                                   stdin=io.BytesIO(b''))
+        self.assertFalse(stream._started.is_set())
+        self.assertEqual(b'out', b''.join(stream))
+        self.assertTrue(stream._started.is_set())
+        stream._pump_stdin()
+        stream.ws.send_binary.assert_called_once_with(b'.\n')
+
+
+class MultiplexClientTest(testtools.TestCase):
+
+    def _make_client(self, *ids, **kwargs):
+        clients = []
+        for fd, id in enumerate(ids, 3):
+            client = mock.Mock(id=id)
+            client.fileno.return_value = fd
+            client.pending.return_value = False
+            clients.append(client)
+        mux = websocketclient.MultiplexClient(clients, **kwargs)
+        mux.prefixes = mux._prefixes()
+        mux.stdout = io.BytesIO()
+        mux.output_pending = False
+        mux.selector = mock.Mock()
+        mux.fds = {c: c.fileno() for c in clients}
+        mux.active = set(clients)
+        mux.quit = False
+        return mux
+
+    def test_prefix_complete_lines(self):
+        mux = self._make_client('web', 'db', colour=False)
+        web, db = mux.clients
+        web.recv.return_value = b'one\ntw'
+        mux.handle_socket(web)
+        db.recv.return_value = b'ready\n'
+        mux.handle_socket(db)
+        web.recv.return_value = b'o\n'
+        mux.handle_socket(web)
+        self.assertEqual(b'web | one\ndb  | ready\nweb | two\n',
+                         mux.stdout.getvalue())
+
+    def test_prefix_colour(self):
+        mux = self._make_client('web', colour=True)
+        self.assertEqual(b'\x1b[32mweb\x1b[0m | ',
+                         mux.prefixes[mux.clients[0]])
+
+    def test_disconnect_flushes_and_quits(self):
+        mux = self._make_client('web', 'db', colour=False)
+        web, db = mux.clients
+        web.recv.side_effect = [b'partial', b'']
+        mux.handle_socket(web)
+        mux.handle_socket(web)
+        self.assertEqual(b'web | partial\n', mux.stdout.getvalue())
+        mux.selector.unregister.assert_called_once_with(3)
+        self.assertFalse(mux.quit)
+        db.recv.side_effect = websocket.WebSocketConnectionClosedException
+        mux.handle_socket(db)
+        self.assertTrue(mux.quit)
+
+    @mock.patch('sys.stdin')
+    @mock.patch('os.read')
+    def test_broadcast_stdin(self, mock_read, mock_stdin):
+        mux = self._make_client('web', 'db', broadcast=True)
+        mock_read.side_effect = [b'ls\n', b'~.\n']
+        mux.handle_stdin()
+        for client in mux.clients:
+            client.send.assert_called_once_with(b'ls\n')
+        self.assertRaises(exceptions.UserExit, mux.handle_stdin)
+
+    @mock.patch.object(websocketclient, 'MultiplexClient')
+    @mock.patch.object(websocketclient.AttachClient, '_connect')
+    def test_do_attach_many(self, mock_connect, mock_mux):
+        mock_connect.side_effect = [None, exceptions.ConnectionFailed()]
+        with mock.patch.object(websocketclient.AttachClient, 'ws',
+                               create=True):
+            websocketclient.do_attach_many(
+                mock.Mock(), [('web', URL), ('db', URL1)], ESCAPE_FLAG,
+                WAIT_TIME, broadcast=True)
+        clients = mock_mux.call_args[0][0]
+        self.assertEqual(['web'], [c.id for c in clients])
+        mock_mux.return_value.start_loop.assert_called_once_with()
+
+    def test_do_attach_many_invalid_url(self):
+        self.assertRaises(exceptions.InvalidWebSocketLink,
+                          websocketclient.do_attach_many, mock.Mock(),
+                          [('web', 'http://localhost')], ESCAPE_FLAG,
+                          WAIT_TIME)
@@ -0,0 +1,181 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import asyncio
+import functools
+from unittest import mock
+from urllib import parse
+
+import testtools
+
+from zunclient.common.websocketclient import aio
+from zunclient.common.websocketclient import exceptions
+from zunclient.common.websocketclient import framing
+from zunclient.fakeserver import wsserver
+
+CONTAINER_ID = "0f96db5a-26dc-4550-b1a8-b110bd9247cb"
+URL = "ws://localhost:2375/v1.17/containers/201e4e22c5b2/attach/ws"
+
+
+class FakeWriter(object):
+
+    def __init__(self):
+        self.frames = []
+        self.closed = False
+
+    def write(self, data):
+        self.frames.append(data)
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    async def wait_closed(self):
+        pass
+
+
+class AsyncWebSocketClientTest(testtools.TestCase):
+
+    def _make_client(self):
+        client = aio.AsyncAttachClient(mock.Mock(), URL, CONTAINER_ID)
+        client.writer = FakeWriter()
+        return client
+
+    def _run(self, client, func, *frames):
+        async def run():
+            client.reader = asyncio.StreamReader()
+            for frame in frames:
+                client.reader.feed_data(frame)
+            client.reader.feed_eof()
+            return await func()
+        return asyncio.run(run())
+
+    def _collect(self, client, *frames):
+        async def collect():
+            return [chunk async for chunk in client]
+        return self._run(client, collect, *frames)
+
+    def test_read_frames(self):
+        client = self._make_client()
+        chunks = self._collect(
+            client,
+            framing.encode_frame(framing.OPCODE_BINARY, b'a' * 70000),
+            framing.encode_frame(framing.OPCODE_PING, b'hi'),
+            framing.encode_frame(framing.OPCODE_TEXT, b'b'),
+            framing.encode_frame(framing.OPCODE_CLOSE,
+                                 framing.CLOSE_NORMAL))
+        self.assertEqual([b'a' * 70000, b'b'], chunks)
+        # the ping is answered and the close is acknowledged
+        opcodes = [f[0] & 0x0f for f in client.writer.frames]
+        self.assertEqual([framing.OPCODE_PONG, framing.OPCODE_CLOSE],
+                         opcodes)
+        self.assertTrue(client.writer.closed)
+
+    def test_read_fragmented(self):
+        client = self._make_client()
+        self.assertEqual([b'abcd'],
+                         self._collect(client, b'\x02\x02ab', b'\x80\x02cd'))
+        self.assertTrue(client.eof)
+
+    def test_read_frame_too_big(self):
+        client = self._make_client()
+        client.max_message_size = 10
+        self.assertRaises(
+            exceptions.MessageTooBig, self._collect, client,
+            framing.encode_frame(framing.OPCODE_BINARY, b'a' * 11))
+        self.assertTrue(client.eof)
+        # closed with status 1009, without reading the payload
+        close = client.writer.frames[-1]
+        self.assertEqual(framing.OPCODE_CLOSE, close[0] & 0x0f)
+        self.assertEqual(framing.CLOSE_MESSAGE_TOO_BIG,
+                         framing.apply_mask(close[6:], close[2:6]))
+
+    def test_read_fragments_too_big(self):
+        client = self._make_client()
+        client.max_message_size = 3
+        self.assertRaises(exceptions.MessageTooBig, self._collect, client,
+                          b'\x02\x02ab', b'\x80\x02cd')
+        self.assertTrue(client.writer.closed)
+
+    @mock.patch.object(framing, 'new_key', return_value='key')
+    def test_handshake_default_port(self, mock_key):
+        client = self._make_client()
+        response = ('HTTP/1.1 101 Switching Protocols\r\n'
+                    'Sec-WebSocket-Accept: %s\r\n\r\n' %
+                    framing.accept_key('key')).encode()
+        for url, origin in (('ws://zun/ws', 'http://zun:80'),
+                            ('wss://zun/ws', 'https://zun:443')):
+            client.writer = FakeWriter()
+            self._run(client, functools.partial(
+                client._handshake, parse.urlparse(url)), response)
+            self.assertIn(('Origin: %s\r\n' % origin).encode(),
+                          client.writer.frames[0])
+
+    def test_write_masked(self):
+        client = self._make_client()
+        asyncio.run(client.write('ls\n'))
+        frame = client.writer.frames[0]
+        fin, opcode, masked, length = framing.parse_header(frame[:2])
+        self.assertEqual((True, framing.OPCODE_BINARY, True, 3),
+                         (fin, opcode, masked, length))
+        self.assertEqual(b'ls\n', framing.apply_mask(frame[6:], frame[2:6]))
+
+    def test_write_after_close(self):
+        client = self._make_client()
+        asyncio.run(client.close())
+        self.assertRaises(exceptions.Disconnected, asyncio.run,
+                          client.write(b'x'))
+
+    def test_resize(self):
+        client = self._make_client()
+        asyncio.run(client.resize(24, 80))
+        client.cs.containers.resize.assert_called_once_with(
+            CONTAINER_ID, '80', '24')
+
+    def test_echo_server(self):
+        server = wsserver.WebSocketServer().start()
+        self.addCleanup(server.stop)
+
+        async def session(index):
+            async with aio.AsyncAttachClient(None, server.url,
+                                             str(index)) as client:
+                await client.write(b'hello %d' % index)
+                return await client.read()
+
+        async def sessions():
+            return await asyncio.gather(*[session(i) for i in range(20)])
+        self.assertEqual([b'hello %d' % i for i in range(20)],
+                         asyncio.run(sessions()))
+
+    def test_connect_failed(self):
+        client = aio.AsyncAttachClient(None, 'ws://127.0.0.1:1/',
+                                       CONTAINER_ID)
+        self.assertRaises(exceptions.ConnectionFailed, asyncio.run,
+                          client.connect())
+
+    def test_exec_client_max_message_size(self):
+        client = aio.AsyncExecClient(None, 'ws://127.0.0.1:1/', 'e',
+                                     CONTAINER_ID, max_message_size=42)
+        self.assertEqual(42, client.max_message_size)
+        self.assertEqual(aio.MAX_MESSAGE_SIZE, aio.AsyncExecClient(
+            None, 'ws://127.0.0.1:1/', 'e', CONTAINER_ID).max_message_size)
+
+    def test_execute_invalid_url(self):
+        cs = mock.Mock()
+        cs.containers.execute.return_value = {'exec_id': 'e',
+                                              'proxy_url': 'http://x'}
+        self.assertRaises(exceptions.InvalidWebSocketLink, asyncio.run,
+                          aio.execute(cs, CONTAINER_ID, 'sh'))
+        cs.containers.execute.assert_called_once_with(
+            CONTAINER_ID, command='sh', interactive=True, run=False)
@@ -0,0 +1,74 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+import os
+from unittest import mock
+
+import fixtures
+import testtools
+
+from zunclient.common.websocketclient import recorder
+
+
+class SessionRecorderTest(testtools.TestCase):
+
+    def setUp(self):
+        super(SessionRecorderTest, self).setUp()
+        tmpdir = self.useFixture(fixtures.TempDir()).path
+        self.path = os.path.join(tmpdir, 'session.cast')
+
+    def _read(self):
+        with open(self.path) as f:
+            return [json.loads(line) for line in f]
+
+    def test_record_asciicast(self):
+        rec = recorder.SessionRecorder(self.path, width=100, height=30,
+                                       title='web')
+        rec.record('100x30', 'r')
+        # a multibyte character split across two frames
+        rec.record(b'\xe2\x82')
+        rec.record(b'\xac\r\n')
+        rec.record(b'ls\r', 'i')
+        rec.close()
+        header, *events = self._read()
+        self.assertEqual(2, header['version'])
+        self.assertEqual((100, 30, 'web'),
+                         (header['width'], header['height'],
+                          header['title']))
+        self.assertEqual([['r', '100x30'], ['o', ''], ['o', '€\r\n']],
+                         [e[1:] for e in events])
+        times = [e[0] for e in events]
+        self.assertEqual(sorted(times), times)
+
+    def test_record_input(self):
+        rec = recorder.SessionRecorder(self.path, record_input=True)
+        rec.record(b'ls\r', 'i')
+        rec.close()
+        self.assertEqual(['i', 'ls\r'], self._read()[1][1:])
+
+    @mock.patch.object(recorder, 'FLUSH_INTERVAL', 60)
+    def test_full_buffer_waits_for_writer(self):
+        rec = recorder.SessionRecorder(self.path, buffer_events=2)
+        for data in (b'a', b'b', b'c', b'd', b'e'):
+            rec.record(data)
+        rec.close()
+        self.assertEqual(['a', 'b', 'c', 'd', 'e'],
+                         [e[2] for e in self._read()[1:]])
+
+    def test_write_error(self):
+        rec = recorder.SessionRecorder(self.path, buffer_events=1)
+        with mock.patch.object(rec, '_write', side_effect=OSError('full')):
+            rec.record(b'a')
+            rec.writer.join()
+            self.assertRaises(IOError, rec.record, b'b')
+        self.assertRaises(IOError, rec.close)
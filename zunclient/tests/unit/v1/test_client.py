@@ -64,6 +64,8 @@ class ClientTest(testtools.TestCase):
             self, mock_session, mock_loader, http_client):
         mock_plugin = mock.Mock()
         mock_loader.return_value = mock_plugin
+        mock_session.return_value.get_endpoint.return_value = (
+            'http://zun:9517/v1')
         client.Client(auth_token='mytoken', auth_url='authurl')
         mock_loader.assert_called_once_with('token')
         mock_plugin.load_from_options.assert_called_once_with(
@@ -90,6 +92,8 @@ class ClientTest(testtools.TestCase):
             self, mock_session, mock_loader, http_client):
         mock_plugin = mock.Mock()
         mock_loader.return_value = mock_plugin
+        mock_session.return_value.get_endpoint.return_value = (
+            'http://zun:9517/v1')
         client.Client(username='myuser', auth_url='authurl')
         mock_loader.assert_called_once_with('password')
         mock_plugin.load_from_options.assert_called_once_with(
@@ -11,11 +11,16 @@
 #    under the License.
 
 import copy
+import io
+import tarfile
+from unittest import mock
 
 import testtools
 from testtools import matchers
 from urllib import parse
+from zunclient import api_versions
 from zunclient.common import utils as zun_utils
+from zunclient.common.websocketclient import exceptions as ws_exceptions
 from zunclient import exceptions
 from zunclient.tests.unit import utils
 from zunclient.v1 import containers
@@ -302,6 +307,14 @@ fake_responses = {
             None,
         ),
     },
+    '/v1/containers/%s/put_archive?%s'
+    % (CONTAINER2['id'], parse.urlencode({'path': path})):
+    {
+        'POST': (
+            {},
+            None,
+        ),
+    },
     '/v1/containers/%s/stats?%s'
     % (CONTAINER1['id'], parse.urlencode({'decode': False,
                                           'stream': False})):
@@ -375,7 +388,7 @@ class ContainerManagerTest(testtools.TestCase):
 
     def setUp(self):
         super(ContainerManagerTest, self).setUp()
-        self.api = utils.FakeAPI(fake_responses)
+        self.api = utils.FakeAPI(copy.deepcopy(fake_responses))
         self.mgr = containers.ContainerManager(self.api)
 
     def test_container_create(self):
@@ -403,6 +416,14 @@ class ContainerManagerTest(testtools.TestCase):
         self.assertEqual(expect, self.api.calls)
         self.assertThat(containers, matchers.HasLength(2))
 
+    def test_containers_list_all(self):
+        containers = self.mgr.list_all()
+        expect = [
+            ('GET', '/v1/containers', {}, None),
+        ]
+        self.assertEqual(expect, self.api.calls)
+        self.assertThat(containers, matchers.HasLength(2))
+
     def _test_containers_list_with_filters(self, limit=None, marker=None,
                                            sort_key=None, sort_dir=None,
                                            expect=[]):
@@ -571,6 +592,79 @@ class ContainerManagerTest(testtools.TestCase):
         self.assertEqual(expect, self.api.calls)
         self.assertIsNone(containers)
 
+    @mock.patch('time.sleep')
+    def test_containers_stream_logs(self, mock_sleep):
+        ts1 = '2017-07-14T02:40:00.1Z'
+        ts2 = '2017-07-14T02:40:00.2Z'
+        ts3 = '2017-07-14T02:40:01Z'
+        self.mgr.logs = mock.Mock(side_effect=[
+            '%s a\n%s b\n' % (ts1, ts2),
+            '%s a\n%s b\n' % (ts1, ts2),
+            '%s a\n%s b\n%s c\n' % (ts1, ts2, ts3),
+        ])
+        stream = self.mgr.stream_logs(CONTAINER1['id'], tail=10)
+        self.assertEqual('a\nb\n', next(stream))
+        self.assertEqual('c\n', next(stream))
+        self.mgr.logs.assert_has_calls([
+            mock.call(CONTAINER1['id'], stdout=False, stderr=False,
+                      timestamps=True, tail=10),
+            mock.call(CONTAINER1['id'], stdout=False, stderr=False,
+                      timestamps=True, tail='all', since=1500000000),
+            mock.call(CONTAINER1['id'], stdout=False, stderr=False,
+                      timestamps=True, tail='all', since=1500000000),
+        ])
+        # The interval backs off after the empty poll
+        self.assertEqual([mock.call(0.5), mock.call(1)],
+                         mock_sleep.call_args_list)
+
+    @mock.patch('time.sleep')
+    def test_containers_stream_logs_late_line(self, mock_sleep):
+        ts1 = '2017-07-14T02:40:00.1Z'
+        ts2 = '2017-07-14T02:40:00.5Z'
+        self.mgr.logs = mock.Mock(side_effect=[
+            '%s b\n' % ts2,
+            # stderr line written before b, but seen after it
+            '%s a\n%s b\n' % (ts1, ts2),
+        ])
+        stream = self.mgr.stream_logs(CONTAINER1['id'])
+        self.assertEqual('b\n', next(stream))
+        self.assertEqual('a\n', next(stream))
+
+    @mock.patch('time.sleep')
+    def test_containers_stream_logs_with_timestamps(self, mock_sleep):
+        self.mgr.logs = mock.Mock(
+            return_value='2017-07-14T02:40:00Z a\n')
+        stream = self.mgr.stream_logs(CONTAINER1['id'], timestamps=True)
+        self.assertEqual('2017-07-14T02:40:00Z a\n', next(stream))
+
+    def test_containers_merged_logs(self):
+        outputs = {
+            'c1': '2017-07-14T02:40:00.1Z a1\n'
+                  'no timestamp\n'
+                  '2017-07-14T02:40:00.3Z a2\n',
+            'long-name': '2017-07-14T02:40:00.2Z b1\n'
+                         '2017-07-14T02:40:00.4Z b2',
+        }
+        self.mgr.logs = mock.Mock(side_effect=lambda id, **kw: outputs[id])
+        lines = list(self.mgr.merged_logs(['c1', 'long-name'], tail=5))
+        self.assertEqual(['c1        | a1\n',
+                          'c1        | no timestamp\n',
+                          'long-name | b1\n',
+                          'c1        | a2\n',
+                          'long-name | b2\n'], lines)
+        self.mgr.logs.assert_has_calls([
+            mock.call('c1', stdout=False, stderr=False, timestamps=True,
+                      tail=5),
+            mock.call('long-name', stdout=False, stderr=False,
+                      timestamps=True, tail=5)], any_order=True)
+
+    def test_containers_merged_logs_with_prefixes(self):
+        self.mgr.logs = mock.Mock(
+            return_value='2017-07-14T02:40:00Z a\n')
+        lines = list(self.mgr.merged_logs(['uuid'], timestamps=True,
+                                          prefixes={'uuid': 'web'}))
+        self.assertEqual(['web | 2017-07-14T02:40:00Z a\n'], lines)
+
     def test_containers_execute(self):
         containers = self.mgr.execute(CONTAINER1['id'],
                                       command=CONTAINER1['command'])
@@ -583,6 +677,26 @@ class ContainerManagerTest(testtools.TestCase):
         self.assertEqual(expect, self.api.calls)
         self.assertIsNone(containers)
 
+    @mock.patch('zunclient.common.websocketclient.websocketclient.'
+                'ExecStream.connect')
+    def test_containers_execute_stream(self, mock_connect):
+        self.mgr.execute = mock.Mock(return_value={
+            'exec_id': 'exec-id', 'proxy_url': 'ws://localhost/exec'})
+        stream = self.mgr.execute_stream(CONTAINER1['id'], '"cat"',
+                                         stdin=io.BytesIO(b'data'))
+        kwargs = self.mgr.execute.call_args[1]
+        self.assertTrue(kwargs['interactive'])
+        self.assertFalse(kwargs['run'])
+        self.assertIn(stream.marker.decode(), kwargs['command'])
+        self.assertEqual('exec-id', stream.exec_id)
+        mock_connect.assert_called_once_with()
+
+    def test_containers_execute_stream_invalid_url(self):
+        self.mgr.execute = mock.Mock(return_value={
+            'exec_id': 'exec-id', 'proxy_url': 'http://localhost/exec'})
+        self.assertRaises(ws_exceptions.InvalidWebSocketLink,
+                          self.mgr.execute_stream, CONTAINER1['id'], 'ls')
+
     def test_containers_kill(self):
         containers = self.mgr.kill(CONTAINER1['id'], signal)
         expect = [
@@ -593,6 +707,26 @@ class ContainerManagerTest(testtools.TestCase):
         self.assertEqual(expect, self.api.calls)
         self.assertIsNone(containers)
 
+    def test_containers_bulk(self):
+        results = self.mgr.bulk('stop', [CONTAINER1['id'], CONTAINER2['id']],
+                                concurrency=2, timeout=timeout)
+        expect = [
+            ('POST', '/v1/containers/%s/stop?timeout=10' % CONTAINER1['id'],
+             {'Content-Length': '0'}, None),
+            ('POST', '/v1/containers/%s/stop?timeout=10' % CONTAINER2['id'],
+             {'Content-Length': '0'}, None)
+        ]
+        self.assertEqual(sorted(expect), sorted(self.api.calls))
+        self.assertEqual([CONTAINER1['id'], CONTAINER2['id']],
+                         [result.id for result in results])
+        self.assertIsNone(results[0].error)
+        # No response is faked for the second container
+        self.assertIsInstance(results[1].error, KeyError)
+
+    def test_containers_bulk_invalid_action(self):
+        self.assertRaises(exceptions.InvalidAttribute, self.mgr.bulk,
+                          'commit', [CONTAINER1['id']])
+
     def test_container_run(self):
         containers = self.mgr.run(**CREATE_CONTAINER1)
         expect = [
@@ -675,6 +809,53 @@ class ContainerManagerTest(testtools.TestCase):
         self.assertEqual(expect, self.api.calls)
         self.assertTrue(response)
 
+    def test_containers_get_archive_stream(self):
+        url = '/v1/containers/%s/get_archive?%s' % (
+            CONTAINER1['id'], parse.urlencode({'path': path}))
+        self.api.responses[url]['GET'] = (
+            {}, {'data': zun_utils.encode_file_data(b'tar data')})
+        chunks = list(self.mgr.get_archive_stream(CONTAINER1['id'], path,
+                                                  chunk_size=3))
+        expect = [
+            ('GET', '/v1/containers/%s/get_archive?%s'
+             % (CONTAINER1['id'], parse.urlencode({'path': path})),
+             {'Content-Length': '0'}, None)
+        ]
+        self.assertEqual(expect, self.api.calls)
+        self.assertTrue(all(len(chunk) <= 3 for chunk in chunks))
+        self.assertEqual(b'tar data', b''.join(chunks))
+
+    def test_containers_put_archive_stream(self):
+        response = self.mgr.put_archive_stream(CONTAINER1['id'], path,
+                                               io.BytesIO(b'tar data'),
+                                               chunk_size=4)
+        expect = [
+            ('POST', '/v1/containers/%s/put_archive?%s'
+             % (CONTAINER1['id'], parse.urlencode({'path': path})),
+             {'Content-Length': '0'},
+             {'data': zun_utils.encode_file_data(b'tar data')})
+        ]
+        self.assertEqual(expect, self.api.calls)
+        self.assertTrue(response)
+
+    def test_containers_copy_archive(self):
+        responses = self.mgr.copy_archive(
+            CONTAINER1['id'], path,
+            [(CONTAINER1['id'], path), (CONTAINER2['id'], path)])
+        expect = [
+            ('GET', '/v1/containers/%s/get_archive?%s'
+             % (CONTAINER1['id'], parse.urlencode({'path': path})),
+             {'Content-Length': '0'}, None),
+            ('POST', '/v1/containers/%s/put_archive?%s'
+             % (CONTAINER1['id'], parse.urlencode({'path': path})),
+             {'Content-Length': '0'}, {'data': data}),
+            ('POST', '/v1/containers/%s/put_archive?%s'
+             % (CONTAINER2['id'], parse.urlencode({'path': path})),
+             {'Content-Length': '0'}, {'data': data}),
+        ]
+        self.assertEqual(expect, self.api.calls)
+        self.assertThat(responses, matchers.HasLength(2))
+
     def test_containers_commit(self):
         containers = self.mgr.commit(CONTAINER1['id'], repo, tag)
         expect = [
@@ -752,3 +933,80 @@ class ContainerManagerTest(testtools.TestCase):
              {'Content-Length': '0'}, None)
         ]
         self.assertEqual(expect, self.api.calls)
+
+
+class ContainerManagerBindMountTest(testtools.TestCase):
+
+    def setUp(self):
+        super(ContainerManagerBindMountTest, self).setUp()
+        created = copy.deepcopy(CONTAINER1)
+        created['status'] = 'Created'
+        self.api = utils.FakeAPI({
+            '/v1/containers': {'POST': ({}, copy.deepcopy(CONTAINER1))},
+            '/v1/containers?run=true': {
+                'POST': ({}, copy.deepcopy(CONTAINER1))},
+            '/v1/containers/%s' % CONTAINER1['uuid']: {
+                'GET': ({}, created)},
+            '/v1/containers/%s/put_archive?%s' % (
+                CONTAINER1['uuid'], parse.urlencode({'path': '/etc'})): {
+                'POST': ({}, None)},
+            '/v1/containers/%s/start' % CONTAINER1['uuid']: {
+                'POST': ({}, None)},
+        })
+        self.mgr = containers.ContainerManager(self.api)
+
+    def test_create_inline_bind_mount(self):
+        mounts = [{'type': 'bind', 'source': b'small',
+                   'destination': '/etc/conf'}]
+        self.mgr.create(image='cirros', mounts=mounts)
+        body = self.api.calls[0][3]
+        self.assertEqual([{'type': 'bind',
+                           'source': zun_utils.encode_file_data(b'small'),
+                           'destination': '/etc/conf'}], body['mounts'])
+        # The caller's mounts are left untouched so they can be reused
+        self.assertEqual(b'small', mounts[0]['source'])
+        self.assertThat(self.api.calls, matchers.HasLength(1))
+
+    def test_create_copied_bind_mount(self):
+        mounts = [{'type': 'bind', 'source': b'copied content',
+                   'destination': '/etc/conf', 'copy': True}]
+        self.mgr.create(image='cirros', mounts=mounts)
+        self.assertEqual(
+            ['POST', 'GET', 'POST'], [call[0] for call in self.api.calls])
+        self.assertEqual([], self.api.calls[0][3]['mounts'])
+        data = self.api.calls[2][3]['data']
+        archive = zun_utils.decode_file_data(data)
+        tar = tarfile.open(fileobj=io.BytesIO(archive))
+        self.assertEqual(b'copied content', tar.extractfile('conf').read())
+        # A second container gets the very same cached archive
+        self.mgr.create(image='cirros', mounts=mounts)
+        self.assertIs(data, self.api.calls[5][3]['data'])
+
+    def test_create_directory_mount_not_copied(self):
+        mounts = [{'type': 'bind', 'source': b'archive', 'directory': True,
+                   'destination': '/etc/conf.d'}]
+        self.assertRaises(exceptions.InvalidAttribute, self.mgr.create,
+                          image='cirros', mounts=mounts)
+        self.assertEqual([], self.api.calls)
+
+    def test_create_copied_bind_mount_old_api(self):
+        self.api.api_version = api_versions.APIVersion('1.24')
+        mounts = [{'type': 'bind', 'source': b'copied content',
+                   'destination': '/etc/conf', 'copy': True}]
+        self.assertRaises(exceptions.InvalidAttribute, self.mgr.create,
+                          image='cirros', mounts=mounts)
+        self.assertEqual([], self.api.calls)
+
+    def test_run_copied_directory_mount(self):
+        mounts = [{'type': 'bind', 'source': b'archive', 'directory': True,
+                   'destination': '/etc/conf.d', 'copy': True}]
+        self.mgr.run(image='cirros', mounts=mounts)
+        self.assertEqual(
+            [('POST', '/v1/containers'),
+             ('GET', '/v1/containers/%s' % CONTAINER1['uuid']),
+             ('POST', '/v1/containers/%s/put_archive?path=%%2Fetc'
+              % CONTAINER1['uuid']),
+             ('POST', '/v1/containers/%s/start' % CONTAINER1['uuid'])],
+            [call[:2] for call in self.api.calls])
+        self.assertEqual({'data': zun_utils.encode_file_data(b'archive')},
+                         self.api.calls[2][3])
@@ -15,7 +15,9 @@ from unittest import mock
 from zunclient.common.apiclient import exceptions as apiexec
 from zunclient.common import utils as zun_utils
 from zunclient.common.websocketclient import exceptions
+from zunclient import exceptions as exc
 from zunclient.tests.unit.v1 import shell_test_base
+from zunclient.v1 import containers
 from zunclient.v1 import containers_shell
 
 
@@ -182,6 +184,27 @@ class ShellTest(shell_test_base.TestCommandLineArgument):
                           self.shell,
                           'run -i x ')
 
+    @mock.patch('zunclient.common.websocketclient.websocketclient.do_attach')
+    @mock.patch('zunclient.v1.containers.ContainerManager.attach')
+    @mock.patch('time.sleep')
+    @mock.patch('zunclient.v1.containers.ContainerManager.get')
+    @mock.patch('zunclient.v1.containers_shell._show_container')
+    @mock.patch('zunclient.v1.containers.ContainerManager.run')
+    def test_zun_container_run_interactive_attach(self, mock_run,
+                                                  mock_show_container,
+                                                  mock_get_container,
+                                                  mock_sleep, mock_attach,
+                                                  mock_do_attach):
+        mock_run.return_value = mock.MagicMock(uuid='fake_uuid')
+        mock_get_container.side_effect = [mock.Mock(status='Creating'),
+                                          mock.Mock(status='Running')]
+        mock_attach.return_value = 'ws://h/attach'
+        self._test_arg_success('run -i x')
+        self.assertEqual(1, mock_sleep.call_count)
+        mock_do_attach.assert_called_once_with(
+            mock.ANY, 'ws://h/attach', 'fake_uuid', '~', 0.5,
+            started=mock.ANY)
+
     @mock.patch('zunclient.v1.containers_shell._show_container')
     @mock.patch('zunclient.v1.containers.ContainerManager.run')
     def test_zun_container_run_success_with_runtime(
@@ -245,3 +268,149 @@ class ShellTest(shell_test_base.TestCommandLineArgument):
         mock_show.assert_called_once_with('container')
         mock_run.assert_called_with(
             **_get_container_args(image='x', hostname='testhost'))
+
+    @mock.patch('zunclient.v1.containers.ContainerManager.copy_archive')
+    def test_zun_container_cp_between_containers(self, mock_copy_archive):
+        self._test_arg_success('cp c1:/src c2:/dst c3:/dst')
+        mock_copy_archive.assert_called_once_with(
+            'c1', '/src', [('c2', '/dst'), ('c3', '/dst')])
+
+    @mock.patch('zunclient.v1.containers.ContainerManager.get_archive')
+    @mock.patch('zunclient.v1.containers.ContainerManager.copy_archive')
+    def test_zun_container_cp_multiple_local_destinations(
+            self, mock_copy_archive, mock_get_archive):
+        stdout, _ = self.shell('cp c1:/src /tmp/a c2:/dst')
+        self.assertIn('Please check the parameters', stdout)
+        self.assertFalse(mock_copy_archive.called)
+        self.assertFalse(mock_get_archive.called)
+
+    @mock.patch('sys.stdout')
+    def test_zun_container_cp_to_stdout(self, mock_stdout):
+        cs = mock.Mock()
+        cs.containers.get_archive_stream.return_value = iter([b'ab', b'c'])
+        args = mock.Mock(source='c1:/src', destination=['-'])
+        containers_shell.do_cp(cs, args)
+        cs.containers.get_archive_stream.assert_called_once_with(
+            'c1', '/src')
+        mock_stdout.buffer.write.assert_has_calls(
+            [mock.call(b'ab'), mock.call(b'c')])
+        mock_stdout.buffer.flush.assert_called_once_with()
+
+    @mock.patch('sys.stdin')
+    def test_zun_container_cp_from_stdin(self, mock_stdin):
+        cs = mock.Mock()
+        args = mock.Mock(source='-', destination=['c1:/app'])
+        containers_shell.do_cp(cs, args)
+        cs.containers.put_archive_stream.assert_called_once_with(
+            'c1', '/app', mock_stdin.buffer)
+
+    @mock.patch('zunclient.common.utils.write_stream')
+    @mock.patch('zunclient.v1.containers.ContainerManager.stream_logs')
+    def test_zun_container_logs_follow(self, mock_stream_logs,
+                                       mock_write_stream):
+        self._test_arg_success('logs --follow x')
+        mock_stream_logs.assert_called_once_with(
+            id='x', stdout=False, stderr=False, timestamps=False,
+            tail='all')
+        mock_write_stream.assert_called_once_with(
+            mock_stream_logs.return_value)
+
+    @mock.patch('zunclient.v1.containers.ContainerManager.merged_logs')
+    def test_zun_container_logs_multiple(self, mock_merged_logs):
+        mock_merged_logs.return_value = iter(['c1 | a\n'])
+        self._test_arg_success('logs c1 c2')
+        mock_merged_logs.assert_called_once_with(
+            ['c1', 'c2'], prefixes={}, stdout=False, stderr=False,
+            timestamps=False, tail='all')
+
+    @mock.patch('zunclient.v1.containers.ContainerManager.merged_logs')
+    @mock.patch('zunclient.v1.containers.ContainerManager.list_all')
+    def test_zun_container_logs_by_label(self, mock_list, mock_merged_logs):
+        web = mock.Mock(uuid='uuid1', labels={'app': 'web'})
+        web.name = 'web'
+        db = mock.Mock(uuid='uuid2', labels={'app': 'db'})
+        mock_list.return_value = [web, db]
+        mock_merged_logs.return_value = iter([])
+        self._test_arg_success('logs --label app=web')
+        mock_merged_logs.assert_called_once_with(
+            ['uuid1'], prefixes={'uuid1': 'web'}, stdout=False,
+            stderr=False, timestamps=False, tail='all')
+
+    @mock.patch('sys.stdin')
+    @mock.patch('sys.stdout')
+    @mock.patch('zunclient.common.utils.write_stream')
+    @mock.patch('zunclient.v1.containers.ContainerManager.execute_stream')
+    def test_zun_container_exec_stream(self, mock_execute_stream,
+                                       mock_write_stream, mock_stdout,
+                                       mock_stdin):
+        mock_stdin.isatty.return_value = False
+        mock_execute_stream.return_value.exit_code = 2
+        cs = mock.Mock()
+        cs.containers.execute_stream = mock_execute_stream
+        args = mock.Mock(container='x', command=['cat'], stream=True,
+                         interactive=False)
+        self.assertEqual(2, containers_shell.do_exec(cs, args))
+        mock_execute_stream.assert_called_once_with(
+            'x', '"cat"', stdin=mock_stdin.buffer)
+        mock_write_stream.assert_called_once_with(
+            mock_execute_stream.return_value, output=mock_stdout.buffer)
+
+    def test_zun_container_exec_stream_interactive(self):
+        self.assertRaisesRegex(
+            exc.CommandError, 'mutually exclusive',
+            self.shell, 'exec --stream -i x ls')
+
+    @mock.patch('zunclient.common.websocketclient.websocketclient.'
+                'do_attach_many')
+    @mock.patch('zunclient.v1.containers.ContainerManager.attach')
+    def test_zun_container_attach_many(self, mock_attach, mock_attach_many):
+        mock_attach.side_effect = ['ws://h/c1', 'ws://h/c2']
+        self._test_arg_success('attach --broadcast c1 c2')
+        mock_attach_many.assert_called_once_with(
+            mock.ANY, [('c1', 'ws://h/c1'), ('c2', 'ws://h/c2')], '~', 0.5,
+            broadcast=True)
+
+    @mock.patch('zunclient.common.websocketclient.websocketclient.do_attach')
+    @mock.patch('zunclient.v1.containers.ContainerManager.attach')
+    def test_zun_container_attach_record_input(self, mock_attach,
+                                               mock_do_attach):
+        mock_attach.return_value = 'ws://h/c1'
+        self._test_arg_success('attach --record s.cast --record-input c1')
+        mock_do_attach.assert_called_once_with(
+            mock.ANY, 'ws://h/c1', 'c1', '~', 0.5, record='s.cast',
+            record_input=True)
+
+    def test_zun_container_record_input_without_record(self):
+        self.assertRaisesRegex(
+            exc.CommandError, '--record-input requires --record',
+            self.shell, 'attach --record-input c1')
+        self.assertRaisesRegex(
+            exc.CommandError, '--record-input requires --record',
+            self.shell, 'exec -i --record-input c1 sh')
+
+    def test_zun_container_logs_follow_multiple(self):
+        self.assertRaisesRegex(
+            exc.CommandError, '--follow requires a single container',
+            self.shell, 'logs --follow c1 c2')
+
+    @mock.patch('zunclient.v1.containers.ContainerManager.list_all')
+    def test_zun_container_logs_no_container(self, mock_list):
+        self.assertRaisesRegex(
+            exc.CommandError, 'arguments are required: <container>',
+            self.shell, 'logs')
+        self.assertFalse(mock_list.called)
+
+    @mock.patch('zunclient.v1.containers.ContainerManager.bulk')
+    def test_zun_container_stop_concurrency(self, mock_bulk):
+        mock_bulk.return_value = [
+            containers.BulkResult('c1', None, None),
+            containers.BulkResult('c2', None, Exception('boom'))]
+        self._test_arg_success('stop --concurrency 4 c1 c2')
+        mock_bulk.assert_called_once_with('stop', ['c1', 'c2'],
+                                          concurrency=4, timeout=10)
+
+    @mock.patch('zunclient.v1.containers.ContainerManager.bulk')
+    def test_zun_container_stop_concurrency_invalid(self, mock_bulk):
+        self._test_arg_failure('stop --concurrency 0 c1',
+                               ['.*invalid concurrency value: 0'])
+        self.assertFalse(mock_bulk.called)
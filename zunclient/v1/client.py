@@ -17,6 +17,7 @@ from keystoneauth1 import loading
 from keystoneauth1 import session as ksa_session
 
 from zunclient.common import httpclient
+from zunclient.common import transports
 from zunclient.v1 import actions
 from zunclient.v1 import availability_zones as az
 from zunclient.v1 import capsules
@@ -40,7 +41,9 @@ class Client(object):
                  project_id=None, project_name=None, region_name=None,
                  service_name=None, service_type='container', session=None,
                  user_domain_id=None, user_domain_name=None,
-                 username=None, cacert=None, cert=None, key=None, **kwargs):
+                 username=None, cacert=None, cert=None, key=None,
+                 rate_limiter=None, transport=None, compress_requests=False,
+                 **kwargs):
         """Initialization of Client object.
 
         :param api_version: Container API version
@@ -64,6 +67,14 @@ class Client(object):
         :param str user_id: User ID
         :param str username: Username
         :param str cacert: CA certificate
+        :param rate_limiter: Throttle the requests of the client
+        :type rate_limiter: zunclient.common.ratelimit.RateLimiter
+        :param transport: transport sending the requests of the client to
+            zun-api, or the name of a built in one. It is mounted on the
+            session of the client, a copy of session when one is given.
+        :type transport: requests.adapters.BaseAdapter or str
+        :param bool compress_requests: gzip large request bodies, for a
+            server which takes them; zun-api does not by itself
         """
         if endpoint_override and auth_token:
             auth_type = 'admin_token'
@@ -107,12 +118,19 @@ class Client(object):
             session = ksa_session.Session(auth=auth_plugin,
                                           verify=(cacert or not insecure),
                                           cert=cert)
+            transport = transport or 'requests'
+        elif transport:
+            # Leave the session of the caller alone
+            session = transports.private_session(session)
+        if transport and getattr(transport, 'whole_session', False):
+            # Mounted before the endpoint lookup, which may hit keystone
+            transports.mount(session, transport)
         client_kwargs = {}
         if not endpoint_override:
             try:
                 # Trigger an auth error so that we can throw the exception
                 # we always have
-                session.get_endpoint(
+                endpoint = session.get_endpoint(
                     service_name=service_name,
                     service_type=service_type,
                     interface=interface,
@@ -121,7 +139,14 @@ class Client(object):
             except Exception:
                 raise RuntimeError('Not authorized')
         else:
+            endpoint = endpoint_override
             client_kwargs = {'endpoint_override': endpoint_override}
+        if transport and not getattr(transport, 'whole_session', False):
+            transports.mount(session, transport, endpoint)
+        if rate_limiter:
+            client_kwargs['rate_limiter'] = rate_limiter
+        if compress_requests:
+            client_kwargs['compress_requests'] = compress_requests
 
         self.http_client = httpclient.SessionClient(service_type=service_type,
                                                     service_name=service_name,
@@ -12,11 +12,21 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+from concurrent import futures
+import heapq
+import io
+import os
+import time
 from urllib import parse
+import uuid
 
 from zunclient import api_versions
 from zunclient.common import base
 from zunclient.common import utils
+from zunclient.common import waiter
+from zunclient.common.websocketclient import exceptions as ws_exceptions
+from zunclient.common.websocketclient import websocketclient
 from zunclient import exceptions
 
 
@@ -29,6 +39,13 @@ CREATION_ATTRIBUTES = ['name', 'image', 'command', 'cpu', 'memory',
                        'exposed_ports', 'healthcheck', 'registry', 'tty',
                        'host', 'entrypoint']
 
+# Lifecycle actions which ContainerManager.bulk can run on many containers
+BULK_ACTIONS = ['start', 'stop', 'restart', 'pause', 'unpause', 'kill',
+                'delete', 'rebuild']
+BULK_CONCURRENCY = 8
+
+BulkResult = collections.namedtuple('BulkResult', ['id', 'result', 'error'])
+
 
 class Container(base.Resource):
     def __repr__(self):
@@ -37,6 +54,9 @@ class Container(base.Resource):
 
 class ContainerManager(base.Manager):
     resource_class = Container
+    # Seconds to wait for a container to be created before copying the
+    # bind mounts which have copy set.
+    deferred_mount_timeout = 600
 
     @staticmethod
     def _path(id=None):
@@ -88,6 +108,20 @@ class ContainerManager(base.Manager):
                                          "containers",
                                          limit=limit)
 
+    def list_all(self, all_projects=False, **kwargs):
+        """Retrieve every container, following the pagination links.
+
+        :param kwargs: Optional filters on container attributes, such as
+                       status.
+        """
+        filters = utils.common_filters(all_projects=all_projects)
+        if kwargs:
+            filters.append(parse.urlencode(sorted(kwargs.items())))
+        path = ''
+        if filters:
+            path += '?' + '&'.join(filters)
+        return self._list_pagination(self._path(path), "containers")
+
     def get(self, id, **kwargs):
         try:
             return self._list(self._path(id),
@@ -97,7 +131,7 @@ class ContainerManager(base.Manager):
 
     def create(self, **kwargs):
         self._process_command(kwargs)
-        self._process_mounts(kwargs)
+        deferred_mounts = self._process_mounts(kwargs)
         self._process_tty(kwargs)
 
         new = {}
@@ -107,7 +141,10 @@ class ContainerManager(base.Manager):
             else:
                 raise exceptions.InvalidAttribute(
                     "Key must be in %s" % ','.join(CREATION_ATTRIBUTES))
-        return self._create(self._path(), new)
+        container = self._create(self._path(), new)
+        if deferred_mounts:
+            self._put_deferred_mounts(container.uuid, deferred_mounts)
+        return container
 
     def _process_command(self, kwargs):
         cmd_microversion = api_versions.APIVersion("1.20")
@@ -117,11 +154,72 @@ class ContainerManager(base.Manager):
                 kwargs['command'] = utils.parse_command(command)
 
     def _process_mounts(self, kwargs):
+        """Encode bind mount payloads for the create request.
+
+        The mount dicts given by the caller are not modified, so the same
+        list can be reused to create many containers; identical payloads
+        are only encoded once.
+
+        A bind mount with ``copy`` set is not a mount: it is removed from
+        the request and returned as a (path, archive) tuple, which is
+        copied with put_archive into the root filesystem of the container
+        once created. Later changes of the source are not seen by the
+        container. Directory sources can only be copied.
+        """
         mounts = kwargs.get('mounts', None)
+        deferred = []
         if mounts:
+            processed = []
             for mount in mounts:
-                if mount.get('type') == 'bind':
-                    mount['source'] = utils.encode_file_data(mount['source'])
+                if mount.get('type') != 'bind':
+                    processed.append(mount)
+                    continue
+                mount = dict(mount)
+                copy = mount.pop('copy', False)
+                directory = mount.pop('directory', False)
+                if directory and not copy:
+                    raise exceptions.InvalidAttribute(
+                        "A directory bind mount of %s must be copied, set "
+                        "copy to True" % mount['destination'])
+                if not copy:
+                    mount['source'] = utils.encode_bind_mount_data(
+                        mount['source'])
+                    processed.append(mount)
+                    continue
+                if self.api_version < api_versions.APIVersion("1.25"):
+                    raise exceptions.InvalidAttribute(
+                        "Copying bind mounts into a container requires API "
+                        "version 1.25 or later")
+                destination = mount['destination'].rstrip('/')
+                dest_dir = os.path.dirname(destination) or '/'
+                if directory:
+                    deferred.append((dest_dir, mount['source']))
+                else:
+                    deferred.append((dest_dir, utils.pack_file_data(
+                        mount['source'], os.path.basename(destination))))
+            kwargs['mounts'] = processed
+        return deferred
+
+    def _put_deferred_mounts(self, id, deferred_mounts):
+        # The container is created asynchronously, archives can only be
+        # uploaded once it left the 'Creating' state.
+        try:
+            waiter.Waiter(timeout=self.deferred_mount_timeout).wait_for(
+                self.get, id,
+                lambda c: getattr(c, 'status', None) not in ('Creating',
+                                                             'Error'))
+        except exceptions.ResourceInErrorState:
+            raise exceptions.ClientException(
+                "Container %s failed to be created, bind mounts were "
+                "not uploaded" % id)
+        except exceptions.WaitTimeout:
+            raise exceptions.ClientException(
+                "Timed out waiting for container %s to be created" % id)
+        for path, archive in deferred_mounts:
+            # The archives are the same for every container created from
+            # one mount list, so is their encoding.
+            self._action(id, '/put_archive', qparams={'path': path},
+                         body={'data': utils.encode_bind_mount_data(archive)})
 
     def _process_tty(self, kwargs):
         tty_microversion = api_versions.APIVersion("1.36")
@@ -172,10 +270,143 @@ class ContainerManager(base.Manager):
         return self._action(id, '/logs', method='GET',
                             qparams=kwargs)[1]
 
+    def stream_logs(self, id, stdout=False, stderr=False, since=None,
+                    timestamps=False, tail='all', poll_interval=0.5,
+                    max_poll_interval=5):
+        """Follow the logs of a container.
+
+        The logs are polled with the ``since`` parameter so that each
+        request only returns the lines written since the previous one. The
+        poll interval doubles up to ``max_poll_interval`` while no output
+        arrives and is reset as soon as new lines show up. As ``since`` has
+        a one second precision, polls overlap; lines are deduplicated by
+        timestamp and content, so a line which arrives late with an older
+        timestamp than the last one returned is still shown.
+
+        This generator never returns on its own, it is up to the caller to
+        stop iterating.
+
+        :returns: an iterator yielding the new log text of each poll.
+        """
+        opts = {'stdout': stdout, 'stderr': stderr, 'timestamps': True,
+                'tail': tail}
+        if since is not None:
+            opts['since'] = since
+        last_timestamp = None
+        # (timestamp, line) of the lines already returned which the next
+        # poll may return again, those since the last whole second
+        seen = set()
+        interval = poll_interval
+        while True:
+            output = self.logs(id, **opts) or ''
+            new_lines = []
+            line_timestamp = None
+            for line in output.splitlines(True):
+                timestamp, message = utils.split_log_line(line)
+                if timestamp is None:
+                    # Continuation lines go with the previous line
+                    timestamp = line_timestamp
+                line_timestamp = timestamp
+                key = (timestamp, line)
+                if key in seen:
+                    continue
+                seen.add(key)
+                if timestamp is not None and (last_timestamp is None or
+                                              timestamp > last_timestamp):
+                    last_timestamp = timestamp
+                new_lines.append(line if timestamps else message)
+
+            if new_lines:
+                interval = poll_interval
+                yield ''.join(new_lines)
+            else:
+                interval = min(interval * 2, max_poll_interval)
+
+            opts['tail'] = 'all'
+            if last_timestamp is not None:
+                opts['since'] = last_timestamp // 10 ** 9
+                # Lines older than since are never returned again
+                cutoff = opts['since'] * 10 ** 9
+                seen = set(key for key in seen
+                           if key[0] is not None and key[0] >= cutoff)
+            time.sleep(interval)
+
+    def merged_logs(self, ids, stdout=False, stderr=False, since=None,
+                    timestamps=False, tail='all', prefixes=None,
+                    concurrency=8):
+        """Interleave the logs of several containers by timestamp.
+
+        The logs of all containers are fetched concurrently and merged
+        lazily with a k-way heap merge, so no combined copy of the output is
+        built. The API returns each log in a single body, so the full log
+        of every container is held in memory until the merge reaches its
+        end. Every line is prefixed with its container.
+
+        :param ids: a list of container IDs or names.
+        :param prefixes: optional dict mapping an item of ids to the prefix
+                         printed in front of its lines (default: the item).
+        :param concurrency: maximum number of logs requests in flight.
+        :returns: an iterator over the merged lines.
+        """
+        opts = {'stdout': stdout, 'stderr': stderr, 'timestamps': True,
+                'tail': tail}
+        if since is not None:
+            opts['since'] = since
+        prefixes = dict((id, str((prefixes or {}).get(id, id))) for id in ids)
+        width = max([len(prefix) for prefix in prefixes.values()] or [0])
+
+        def _fetch(id):
+            return self.logs(id, **opts) or ''
+
+        def _lines(id, output):
+            prefix = prefixes[id].ljust(width)
+            last_timestamp = 0
+            # Iterate without building a list of the lines of the body
+            for line in io.StringIO(output, newline=''):
+                timestamp, message = utils.split_log_line(line)
+                if timestamp is None:
+                    # Keep untimestamped lines next to the previous one
+                    timestamp = last_timestamp
+                last_timestamp = timestamp
+                text = line if timestamps else message
+                if not text.endswith('\n'):
+                    text += '\n'
+                yield timestamp, '%s | %s' % (prefix, text)
+
+        workers = max(1, min(concurrency, len(ids)))
+        with futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            outputs = list(executor.map(_fetch, ids))
+        merged = heapq.merge(*[_lines(id, output)
+                               for id, output in zip(ids, outputs)],
+                             key=lambda item: item[0])
+        return (text for _, text in merged)
+
     def execute(self, id, **kwargs):
         return self._action(id, '/execute',
                             qparams=kwargs)[1]
 
+    def execute_stream(self, id, command, stdin=None):
+        """Execute a command and stream its output.
+
+        Return a connected :class:`ExecStream` which yields the output as
+        it is produced and copies ``stdin``, if any, to the command. The
+        command runs on a pseudo-TTY in raw mode, its stdout and stderr are
+        merged; see :func:`websocketclient.stream_command` for what the
+        image must provide.
+        """
+        marker = 'zun-exec-%s' % uuid.uuid4().hex
+        response = self.execute(
+            id, command=websocketclient.stream_command(
+                command, marker, stdin=stdin is not None),
+            interactive=True, run=False)
+        url = response['proxy_url']
+        if not url.startswith(('ws://', 'wss://')):
+            raise ws_exceptions.InvalidWebSocketLink(id)
+        stream = websocketclient.ExecStream(None, url, response['exec_id'],
+                                            id, marker, stdin=stdin)
+        stream.connect()
+        return stream
+
     def execute_resize(self, id, exec_id, width, height):
         self._action(id, '/execute_resize',
                      qparams={'exec_id': exec_id, 'w': width, 'h': height})[1]
@@ -184,14 +415,47 @@ class ContainerManager(base.Manager):
         return self._action(id, '/kill',
                             qparams={'signal': signal})[1]
 
+    def bulk(self, action, ids, concurrency=BULK_CONCURRENCY, **params):
+        """Run a lifecycle action on several containers concurrently.
+
+        :param action: one of BULK_ACTIONS.
+        :param ids: a list of container IDs or names.
+        :param concurrency: maximum number of requests in flight.
+        :param params: keyword arguments passed on to the action, e.g.
+                       timeout for stop or signal for kill.
+        :returns: a list of BulkResult in the order of ids. The error of a
+                  container is the exception its request raised, if any.
+        """
+        if action not in BULK_ACTIONS:
+            raise exceptions.InvalidAttribute(
+                "Action must be in %s" % ','.join(BULK_ACTIONS))
+        method = getattr(self, action)
+
+        def _run(id):
+            try:
+                return BulkResult(id, method(id, **params), None)
+            except Exception as e:
+                return BulkResult(id, None, e)
+
+        workers = max(1, min(concurrency, len(ids)))
+        with futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(_run, ids))
+
     def run(self, **kwargs):
         self._process_command(kwargs)
-        self._process_mounts(kwargs)
+        deferred_mounts = self._process_mounts(kwargs)
         self._process_tty(kwargs)
 
         if not set(kwargs).issubset(CREATION_ATTRIBUTES):
             raise exceptions.InvalidAttribute(
                 "Key must be in %s" % ','.join(CREATION_ATTRIBUTES))
+        elif deferred_mounts:
+            # Copied bind mounts must be in place before the
+            # container starts, so create it, upload them, then start it.
+            container = self._create(self._path(), kwargs)
+            self._put_deferred_mounts(container.uuid, deferred_mounts)
+            self.start(container.uuid)
+            return container
         else:
             return self._create(self._path() + '?run=true', kwargs)
 
@@ -231,6 +495,53 @@ class ContainerManager(base.Manager):
                             qparams={'path': path},
                             body={'data': data})
 
+    def get_archive_stream(self, id, path,
+                           chunk_size=utils.ARCHIVE_CHUNK_SIZE):
+        """Retrieve an archive of a path and iterate over its raw bytes.
+
+        The request is issued immediately; the returned iterator yields the
+        tar stream in chunks of at most ``chunk_size`` bytes.
+        """
+        data = self._action(id, '/get_archive', method='GET',
+                            qparams={'path': path})[1]['data']
+        # API version 1.25 or later will return Base64-encoded data
+        if self.api_version >= api_versions.APIVersion("1.25"):
+            return utils.iter_decode_file_data(data, chunk_size)
+        data = data.encode()
+        return (data[i:i + chunk_size]
+                for i in range(0, len(data), chunk_size))
+
+    def put_archive_stream(self, id, path, fileobj,
+                           chunk_size=utils.ARCHIVE_CHUNK_SIZE):
+        """Upload a tar stream read from a binary file object."""
+        if self.api_version < api_versions.APIVersion("1.25"):
+            return self.put_archive(id, path, fileobj.read())
+        data = utils.encode_file_stream(fileobj, chunk_size)
+        return self._action(id, '/put_archive',
+                            qparams={'path': path},
+                            body={'data': data})
+
+    def copy_archive(self, id, path, destinations):
+        """Copy a path from one container into one or more containers.
+
+        The archive returned by the source container is handed to every
+        destination as it came off the wire: it is never written to local
+        disk and the (possibly Base64-encoded) payload is neither decoded
+        nor re-encoded, so only a single copy of it is held in memory.
+
+        :param id: ID or name of the source container.
+        :param path: the path to copy in the source container.
+        :param destinations: a list of (container, path) tuples.
+        :returns: a list with the put_archive result of each destination.
+        """
+        res = self._action(id, '/get_archive', method='GET',
+                           qparams={'path': path})[1]
+        data = res['data']
+        return [self._action(dest_id, '/put_archive',
+                             qparams={'path': dest_path},
+                             body={'data': data})
+                for dest_id, dest_path in destinations]
+
     def stats(self, id):
         return self._action(id, '/stats', method='GET')[1]
 
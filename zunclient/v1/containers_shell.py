@@ -16,6 +16,7 @@ import argparse
 from contextlib import closing
 import io
 import os
+import sys
 import tarfile
 import time
 import yaml
@@ -24,9 +25,16 @@ from oslo_serialization import jsonutils
 
 from zunclient.common import cliutils as utils
 from zunclient.common import utils as zun_utils
+from zunclient.common import waiter
 from zunclient.common.websocketclient import exceptions
 from zunclient.common.websocketclient import websocketclient
 from zunclient import exceptions as exc
+from zunclient.v1 import containers as containers_api
+
+
+_CONCURRENCY_ARGS, _CONCURRENCY_KWARGS = zun_utils.concurrency_arg(
+    containers_api.BULK_CONCURRENCY)
+concurrency_arg = utils.arg(*_CONCURRENCY_ARGS, **_CONCURRENCY_KWARGS)
 
 
 RENAME_DEPRECATION_MESSAGE = (
@@ -320,22 +328,19 @@ def do_list(cs, args):
            action="store_true",
            default=False,
            help='Delete container(s) in all projects by name.')
+@concurrency_arg
 def do_delete(cs, args):
     """Delete specified containers."""
-    for container in args.containers:
-        opts = {}
-        opts['id'] = container
-        opts['force'] = args.force
-        opts['stop'] = args.stop
-        opts['all_projects'] = args.all_projects
-        opts = zun_utils.remove_null_parms(**opts)
-        try:
-            cs.containers.delete(**opts)
-            print("Request to delete container %s has been accepted." %
-                  container)
-        except Exception as e:
-            print("Delete for container %(container)s failed: %(e)s" %
-                  {'container': container, 'e': e})
+    opts = {}
+    opts['force'] = args.force
+    opts['stop'] = args.stop
+    opts['all_projects'] = args.all_projects
+    opts = zun_utils.remove_null_parms(**opts)
+    results = cs.containers.bulk('delete', args.containers,
+                                 concurrency=args.concurrency, **opts)
+    zun_utils.print_bulk_results(
+        results, "Request to delete container %s has been accepted.",
+        "Delete for container %(container)s failed: %(e)s")
 
 
 @utils.arg('container',
@@ -382,22 +387,19 @@ def do_show(cs, args):
                 '"docker": pull the image from Docker Hub. '
                 '"glance": pull the image from Glance. '
                 'The default value is source container\'s image driver ')
+@concurrency_arg
 def do_rebuild(cs, args):
     """Rebuild specified containers."""
-    for container in args.containers:
-        opts = {}
-        opts['id'] = container
-        if args.image:
-            opts['image'] = args.image
-        if args.image_driver:
-            opts['image_driver'] = args.image_driver
-        try:
-            cs.containers.rebuild(**opts)
-            print("Request to rebuild container %s has been accepted." %
-                  container)
-        except Exception as e:
-            print("Rebuild for container %(container)s failed: %(e)s" %
-                  {'container': container, 'e': e})
+    opts = {}
+    if args.image:
+        opts['image'] = args.image
+    if args.image_driver:
+        opts['image_driver'] = args.image_driver
+    results = cs.containers.bulk('rebuild', args.containers,
+                                 concurrency=args.concurrency, **opts)
+    zun_utils.print_bulk_results(
+        results, "Request to rebuild container %s has been accepted.",
+        "Rebuild for container %(container)s failed: %(e)s")
 
 
 @utils.arg('containers',
@@ -408,16 +410,15 @@ def do_rebuild(cs, args):
            metavar='<timeout>',
            default=10,
            help='Seconds to wait for stop before restarting (container)s')
+@concurrency_arg
 def do_restart(cs, args):
     """Restart specified containers."""
-    for container in args.containers:
-        try:
-            cs.containers.restart(container, args.timeout)
-            print("Request to restart container %s has been accepted." %
-                  container)
-        except Exception as e:
-            print("Restart for container %(container)s failed: %(e)s" %
-                  {'container': container, 'e': e})
+    results = cs.containers.bulk('restart', args.containers,
+                                 concurrency=args.concurrency,
+                                 timeout=args.timeout)
+    zun_utils.print_bulk_results(
+        results, "Request to restart container %s has been accepted.",
+        "Restart for container %(container)s failed: %(e)s")
 
 
 @utils.arg('containers',
@@ -428,69 +429,69 @@ def do_restart(cs, args):
            metavar='<timeout>',
            default=10,
            help='Seconds to wait for stop before killing (container)s')
+@concurrency_arg
 def do_stop(cs, args):
     """Stop specified containers."""
-    for container in args.containers:
-        try:
-            cs.containers.stop(container, args.timeout)
-            print("Request to stop container %s has been accepted." %
-                  container)
-        except Exception as e:
-            print("Stop for container %(container)s failed: %(e)s" %
-                  {'container': container, 'e': e})
+    results = cs.containers.bulk('stop', args.containers,
+                                 concurrency=args.concurrency,
+                                 timeout=args.timeout)
+    zun_utils.print_bulk_results(
+        results, "Request to stop container %s has been accepted.",
+        "Stop for container %(container)s failed: %(e)s")
 
 
 @utils.arg('containers',
            metavar='<container>',
            nargs='+',
            help='ID of the (container)s to start.')
+@concurrency_arg
 def do_start(cs, args):
     """Start specified containers."""
-    for container in args.containers:
-        try:
-            cs.containers.start(container)
-            print("Request to start container %s has been accepted." %
-                  container)
-        except Exception as e:
-            print("Start for container %(container)s failed: %(e)s" %
-                  {'container': container, 'e': e})
+    results = cs.containers.bulk('start', args.containers,
+                                 concurrency=args.concurrency)
+    zun_utils.print_bulk_results(
+        results, "Request to start container %s has been accepted.",
+        "Start for container %(container)s failed: %(e)s")
 
 
 @utils.arg('containers',
            metavar='<container>',
            nargs='+',
            help='ID or name of the (container)s to pause.')
+@concurrency_arg
 def do_pause(cs, args):
     """Pause specified containers."""
-    for container in args.containers:
-        try:
-            cs.containers.pause(container)
-            print("Request to pause container %s has been accepted." %
-                  container)
-        except Exception as e:
-            print("Pause for container %(container)s failed: %(e)s" %
-                  {'container': container, 'e': e})
+    results = cs.containers.bulk('pause', args.containers,
+                                 concurrency=args.concurrency)
+    zun_utils.print_bulk_results(
+        results, "Request to pause container %s has been accepted.",
+        "Pause for container %(container)s failed: %(e)s")
 
 
 @utils.arg('containers',
            metavar='<container>',
            nargs='+',
            help='ID or name of the (container)s to unpause.')
+@concurrency_arg
 def do_unpause(cs, args):
     """Unpause specified containers."""
-    for container in args.containers:
-        try:
-            cs.containers.unpause(container)
-            print("Request to unpause container %s has been accepted." %
-                  container)
-        except Exception as e:
-            print("Unpause for container %(container)s failed: %(e)s" %
-                  {'container': container, 'e': e})
+    results = cs.containers.bulk('unpause', args.containers,
+                                 concurrency=args.concurrency)
+    zun_utils.print_bulk_results(
+        results, "Request to unpause container %s has been accepted.",
+        "Unpause for container %(container)s failed: %(e)s")
 
 
-@utils.arg('container',
+@utils.arg('containers',
            metavar='<container>',
-           help='ID or name of the container to get logs for.')
+           nargs='*',
+           help='ID or name of the container(s) to get logs for. The logs '
+                'of several containers are interleaved by timestamp.')
+@utils.arg('--label',
+           metavar='<KEY=VALUE>',
+           action='append', default=[],
+           help='Get the logs of all the containers with this label. '
+                'May be used multiple times.')
 @utils.arg('--stdout',
            action='store_true',
            help='Only stdout logs of container.')
@@ -511,16 +512,43 @@ def do_unpause(cs, args):
            metavar='<tail>',
            default='all',
            help='Number of lines to show from the end of the logs.')
+@utils.arg('-f', '--follow',
+           action='store_true',
+           default=False,
+           help='Follow log output.')
 def do_logs(cs, args):
-    """Get logs of a container."""
+    """Get logs of one or more containers."""
     opts = {}
-    opts['id'] = args.container
     opts['stdout'] = args.stdout
     opts['stderr'] = args.stderr
     opts['since'] = args.since
     opts['timestamps'] = args.timestamps
     opts['tail'] = args.tail
     opts = zun_utils.remove_null_parms(**opts)
+    if not args.containers and not args.label:
+        raise exc.CommandError(
+            "the following arguments are required: <container> (or "
+            "--label)")
+    if args.label or len(args.containers) != 1:
+        if args.follow:
+            raise exc.CommandError("--follow requires a single container")
+        ids = list(args.containers)
+        prefixes = {}
+        if args.label:
+            labels = zun_utils.format_args(args.label)
+            for container in zun_utils.filter_by_labels(
+                    cs.containers.list_all(), labels):
+                ids.append(container.uuid)
+                prefixes[container.uuid] = container.name or container.uuid
+        if not ids:
+            raise exc.CommandError("No container matches the request")
+        sys.stdout.writelines(cs.containers.merged_logs(
+            ids, prefixes=prefixes, **opts))
+        return
+    opts['id'] = args.containers[0]
+    if args.follow:
+        zun_utils.write_stream(cs.containers.stream_logs(**opts))
+        return
     logs = cs.containers.logs(**opts)
     print(logs)
 
@@ -537,10 +565,38 @@ def do_logs(cs, args):
            action='store_true',
            default=False,
            help='Keep STDIN open and allocate a pseudo-TTY for interactive')
+@utils.arg('--stream',
+           dest='stream',
+           action='store_true',
+           default=False,
+           help='Stream the output of the command as it is produced, '
+                'sending it STDIN when it is not a terminal. stdout and '
+                'stderr are merged. The image must provide sh and stty, '
+                'and sed and base64 to send STDIN.')
+@utils.arg('--record',
+           metavar='<file>',
+           help='Record the interactive session to <file> in the asciicast '
+                'v2 format.')
+@utils.arg('--record-input',
+           action='store_true',
+           default=False,
+           help='Also record the input typed in the session, passwords '
+                'included. Requires --record.')
 def do_exec(cs, args):
     """Execute command in a running container."""
+    if args.record_input and not args.record:
+        raise exc.CommandError("--record-input requires --record")
     opts = {}
     opts['command'] = zun_utils.parse_command(args.command)
+    if args.stream:
+        if args.interactive:
+            raise exc.CommandError("--stream and --interactive are "
+                                   "mutually exclusive")
+        stdin = None if sys.stdin.isatty() else sys.stdin.buffer
+        stream = cs.containers.execute_stream(args.container,
+                                              opts['command'], stdin=stdin)
+        zun_utils.write_stream(stream, output=sys.stdout.buffer)
+        return stream.exit_code
     if args.interactive:
         opts['interactive'] = True
         opts['run'] = False
@@ -548,7 +604,9 @@ def do_exec(cs, args):
     if args.interactive:
         exec_id = response['exec_id']
         url = response['proxy_url']
-        websocketclient.do_exec(cs, url, args.container, exec_id, "~", 0.5)
+        websocketclient.do_exec(cs, url, args.container, exec_id, "~", 0.5,
+                                record=args.record,
+                                record_input=args.record_input)
     else:
         output = response['output']
         exit_code = response['exit_code']
@@ -564,22 +622,17 @@ def do_exec(cs, args):
            metavar='<signal>',
            default=None,
            help='The signal to kill')
+@concurrency_arg
 def do_kill(cs, args):
     """Kill one or more running container(s)."""
-    for container in args.containers:
-        opts = {}
-        opts['id'] = container
-        opts['signal'] = args.signal
-        opts = zun_utils.remove_null_parms(**opts)
-        try:
-            cs.containers.kill(**opts)
-            print(
-                "Request to kill signal to container %s has been accepted." %
-                container)
-        except Exception as e:
-            print(
-                "kill signal for container %(container)s failed: %(e)s" %
-                {'container': container, 'e': e})
+    opts = {}
+    opts['signal'] = args.signal
+    opts = zun_utils.remove_null_parms(**opts)
+    results = cs.containers.bulk('kill', args.containers,
+                                 concurrency=args.concurrency, **opts)
+    zun_utils.print_bulk_results(
+        results, "Request to kill signal to container %s has been accepted.",
+        "kill signal for container %(container)s failed: %(e)s")
 
 
 @utils.exclusive_arg(
@@ -768,25 +821,20 @@ def do_run(cs, args):
     if args.privileged:
         opts['privileged'] = True
     opts = zun_utils.remove_null_parms(**opts)
+    started = time.monotonic()
     container = cs.containers.run(**opts)
     _show_container(container)
     container_uuid = getattr(container, 'uuid', None)
     if args.interactive:
-        ready_for_attach = False
-        while True:
-            container = cs.containers.get(container_uuid)
-            if zun_utils.check_container_status(container, 'Running'):
-                ready_for_attach = True
-                break
-            if zun_utils.check_container_status(container, 'Error'):
-                raise exceptions.ContainerStateError(container_uuid)
-            print("Waiting for container start")
-            time.sleep(1)
-        if ready_for_attach is True:
-            response = cs.containers.attach(container_uuid)
-            websocketclient.do_attach(cs, response, container_uuid, "~", 0.5)
-        else:
-            raise exceptions.InvalidWebSocketLink(container_uuid)
+        try:
+            waiter.Waiter(max_interval=1).wait_for_status(
+                cs.containers.get, container_uuid, ['Running'],
+                on_wait=lambda: print("Waiting for container start"))
+        except exc.ResourceInErrorState:
+            raise exceptions.ContainerStateError(container_uuid)
+        response = cs.containers.attach(container_uuid)
+        websocketclient.do_attach(cs, response, container_uuid, "~", 0.5,
+                                  started=started)
 
 
 @utils.arg('container',
@@ -840,13 +888,40 @@ def do_rename(cs, args):
     cs.containers.rename(args.container, args.name)
 
 
-@utils.arg('container',
+@utils.arg('containers',
            metavar='<container>',
-           help='ID or name of the container to be attached to.')
+           nargs='+',
+           help='ID or name of the container(s) to be attached to. The '
+                'output of several containers is prefixed by their name.')
+@utils.arg('--broadcast',
+           action='store_true',
+           default=False,
+           help='When attached to several containers, send each line of '
+                'input to all of them.')
+@utils.arg('--record',
+           metavar='<file>',
+           help='Record the session to <file> in the asciicast v2 format.')
+@utils.arg('--record-input',
+           action='store_true',
+           default=False,
+           help='Also record the input typed in the session, passwords '
+                'included. Requires --record.')
 def do_attach(cs, args):
-    """Attach to a running container."""
-    response = cs.containers.attach(args.container)
-    websocketclient.do_attach(cs, response, args.container, "~", 0.5)
+    """Attach to one or more running container(s)."""
+    if args.record_input and not args.record:
+        raise exc.CommandError("--record-input requires --record")
+    if len(args.containers) == 1:
+        container = args.containers[0]
+        response = cs.containers.attach(container)
+        websocketclient.do_attach(cs, response, container, "~", 0.5,
+                                  record=args.record,
+                                  record_input=args.record_input)
+        return
+    if args.record:
+        raise exc.CommandError("--record requires a single container")
+    urls = [(c, cs.containers.attach(c)) for c in args.containers]
+    websocketclient.do_attach_many(cs, urls, "~", 0.5,
+                                   broadcast=args.broadcast)
 
 
 @utils.arg('container',
@@ -882,35 +957,54 @@ def do_top(cs, args):
                 'The format of this parameter is [container:]src_path.')
 @utils.arg('destination',
            metavar='<destination>',
+           nargs='+',
            help='The directory destination where save the source. '
-                'The format of this parameter is [container:]dest_path.')
+                'The format of this parameter is [container:]dest_path. '
+                'When copying between containers, more than one container '
+                'destination may be given.')
 def do_cp(cs, args):
-    """Copy files/tars between a container and the local filesystem."""
-    if ':' in args.source:
-        source_parts = args.source.split(':', 1)
-        container_id = source_parts[0]
-        container_path = source_parts[1]
+    """Copy files/tars between containers and the local filesystem."""
+    source = zun_utils.parse_container_path(args.source)
+    destinations = [zun_utils.parse_container_path(dest)
+                    for dest in args.destination]
+    is_remote_dest = [container is not None for container, _ in destinations]
+
+    if source[0] is not None and all(is_remote_dest):
+        cs.containers.copy_archive(source[0], source[1], destinations)
+
+    elif source[0] is not None and destinations == [(None, '-')]:
+        # Stream the tar archive to stdout, e.g. "cp c:/var/log - | tar x"
+        stdout = sys.stdout.buffer
+        for chunk in cs.containers.get_archive_stream(*source):
+            stdout.write(chunk)
+        stdout.flush()
+
+    elif source == (None, '-') and len(destinations) == 1 and \
+            is_remote_dest[0]:
+        # Read a tar archive from stdin, e.g. "tar c . | cp - c:/app"
+        dest_id, dest_path = destinations[0]
+        cs.containers.put_archive_stream(dest_id, dest_path,
+                                         sys.stdin.buffer)
+
+    elif len(destinations) == 1 and source[0] is not None:
         opts = {}
-        opts['id'] = container_id
-        opts['path'] = container_path
+        opts['id'] = source[0]
+        opts['path'] = source[1]
 
         res = cs.containers.get_archive(**opts)
-        dest_path = args.destination
+        dest_path = destinations[0][1]
         tardata = io.BytesIO(res['data'])
         with closing(tarfile.open(fileobj=tardata)) as tar:
             tar.extractall(dest_path)  # nosec
 
-    elif ':' in args.destination:
-        dest_parts = args.destination.split(':', 1)
-        container_id = dest_parts[0]
-        container_path = dest_parts[1]
-        filename = os.path.split(args.source)[1]
+    elif len(destinations) == 1 and is_remote_dest[0]:
+        filename = os.path.split(source[1])[1]
         opts = {}
-        opts['id'] = container_id
-        opts['path'] = container_path
+        opts['id'] = destinations[0][0]
+        opts['path'] = destinations[0][1]
         tardata = io.BytesIO()
         with closing(tarfile.open(fileobj=tardata, mode='w')) as tar:
-            tar.add(args.source, arcname=filename)
+            tar.add(source[1], arcname=filename)
         opts['data'] = tardata.getvalue()
         cs.containers.put_archive(**opts)
 
@@ -919,6 +1013,8 @@ def do_cp(cs, args):
         print("Usage:")
         print("zun cp container:src_path dest_path|-")
         print("zun cp src_path|- container:dest_path")
+        print("zun cp container:src_path container:dest_path "
+              "[container:dest_path ...]")
 
 
 @utils.arg('container',